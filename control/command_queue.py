@@ -0,0 +1,322 @@
+import concurrent.futures
+import contextlib
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import tinytuya
+
+try:
+    from tracing import span
+except ImportError:
+    # utils/ isn't on the path (only entry scripts put it there): run untraced
+    if os.environ.get('VACUUM_TRACE'):
+        print("⚠ VACUUM_TRACE is set but utils/tracing.py can't be imported; "
+              f"{__name__} runs untraced", file=sys.stderr)
+    def span(name, **args):
+        return contextlib.nullcontext()
+
+# Lower number = served first
+PRIORITY_SAFETY = 0     # stop, pause, return to dock
+PRIORITY_CONTROL = 1    # other commands
+PRIORITY_STATUS = 2     # status polling
+PRIORITY_MAP = 3        # map requests and push reads
+
+# Commands that must never wait behind map or status traffic
+SAFETY_COMMANDS = {
+    ('1', False),        # stop
+    ('2', True),         # pause
+    ('4', 'chargego'),   # return to dock
+    ('4', 'stop'),
+}
+
+# Minimum spacing between frames; the firmware drops the connection when
+# it is sent requests back to back
+DEFAULT_MIN_INTERVAL = 0.25
+
+# Keepalive and reconnect defaults (overridden by the "network" config keys)
+DEFAULT_HEARTBEAT_INTERVAL = 10.0
+DEFAULT_TIMEOUT = 5
+DEFAULT_RETRY_ATTEMPTS = 3
+RECONNECT_BASE_DELAY = 0.2
+
+# A push wait is split into reads this short, each queued separately, so
+# a safety command submitted meanwhile waits behind at most one of them
+PUSH_READ_TIMEOUT = 0.25
+
+# How long set_value_acked() waits for the device to report the new value
+DEFAULT_ACK_TIMEOUT = 5.0
+# Pause between confirmation reads (frames are also spaced by min_interval)
+ACK_POLL_INTERVAL = 0.1
+
+# tinytuya error codes that mean the socket is gone
+NETWORK_ERRORS = {str(tinytuya.ERR_CONNECT), str(tinytuya.ERR_TIMEOUT), str(tinytuya.ERR_OFFLINE)}
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def _reports(response, expect):
+    """True if a status/set_value response shows every expected DPS value"""
+    if not isinstance(response, dict) or not isinstance(response.get('dps'), dict):
+        return False
+    dps = response['dps']
+    return all(key in dps and dps[key] == value for key, value in expect.items())
+
+
+class DeviceCommandQueue:
+    """
+    Serializes all traffic to one Tuya device over one persistent socket.
+
+    A single worker thread owns the tinytuya.Device and executes requests
+    in priority order (safety commands first), spaced by min_interval.
+    Status reads that are already queued are shared: callers asking for
+    status while one is pending get the same response.
+
+    While idle, the worker sends a heartbeat every heartbeat_interval so a
+    dead socket is noticed before the next command needs it. A network
+    error (from a heartbeat or a command) closes the socket and reconnects
+    with exponential backoff, up to retry_attempts; the failed command is
+    then retried once on the fresh connection.
+
+    Exposes status(), set_value(), get_value() and receive() with the same
+    signatures as tinytuya.Device, so it can stand in for self.vacuum.
+    """
+
+    def __init__(self, device, min_interval=DEFAULT_MIN_INTERVAL,
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+                 timeout=DEFAULT_TIMEOUT, retry_attempts=DEFAULT_RETRY_ATTEMPTS):
+        self.device = device
+        self.min_interval = min_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.timeout = timeout
+        self.retry_attempts = retry_attempts
+        self.connected = True
+        self.reconnects = 0
+
+        # We do our own backoff; tinytuya's default is 5 retries 5 s apart
+        device.set_socketTimeout(timeout)
+        device.set_socketRetryLimit(1)
+        device.set_socketRetryDelay(0)
+
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._pending_status = None
+        self._lock = threading.Lock()
+        self._last_sent = 0.0
+        self._running = True
+        self._worker = threading.Thread(target=self._run, name='tuya-command-queue', daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def for_device(cls, dev_id, address, local_key, version=3.3, **options):
+        """
+        Shared queue per device id, so every script in a process uses one connection.
+
+        options are passed to the constructor (min_interval,
+        heartbeat_interval, timeout, retry_attempts).
+        """
+        with _queues_lock:
+            existing = _queues.get(dev_id)
+            if existing is not None and existing._running:
+                return existing
+
+            device = tinytuya.Device(dev_id=dev_id, address=address,
+                                     local_key=local_key, version=version)
+            device.set_socketPersistent(True)
+            _queues[dev_id] = cls(device, **options)
+            return _queues[dev_id]
+
+    def submit(self, operation, priority=PRIORITY_CONTROL):
+        """Queue operation(device) and return a Future for its result"""
+        if not self._running:
+            raise RuntimeError("Command queue is stopped")
+        future = Future()
+        self._queue.put((priority, next(self._counter), operation, future))
+        return future
+
+    def _run(self):
+        while True:
+            try:
+                priority, _, operation, future = self._queue.get(timeout=self.heartbeat_interval)
+            except queue.Empty:
+                self._heartbeat()
+                continue
+
+            if operation is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(self._execute(operation))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _send(self, operation):
+        """Run one operation, rate limited; returns (result, network_failed)"""
+        # Push reads send nothing, so they neither wait for nor delay frames
+        sends = getattr(operation, 'sends', True)
+        wait = self._last_sent + self.min_interval - time.monotonic()
+        if sends and wait > 0:
+            time.sleep(wait)
+        try:
+            with span('device.round_trip'):
+                result = operation(self.device)
+        except (OSError, ConnectionError) as e:
+            return e, True
+        finally:
+            if sends:
+                self._last_sent = time.monotonic()
+        failed = isinstance(result, dict) and str(result.get('Err')) in NETWORK_ERRORS
+        return result, failed
+
+    def _execute(self, operation):
+        result, failed = self._send(operation)
+        if failed and self._reconnect():
+            result, failed = self._send(operation)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _heartbeat(self):
+        """Keep an idle connection alive and notice when it has died"""
+        if time.monotonic() - self._last_sent < self.heartbeat_interval:
+            return
+        _, failed = self._send(lambda d: d.heartbeat(nowait=False))
+        if failed:
+            print("Heartbeat failed, reconnecting...")
+            self._reconnect()
+
+    def _reconnect(self):
+        """Drop the dead socket and reconnect with exponential backoff"""
+        with span('device.reconnect'):
+            return self._reconnect_with_backoff()
+
+    def _reconnect_with_backoff(self):
+        self.connected = False
+        for attempt in range(self.retry_attempts):
+            self.device.close()
+            time.sleep(min(RECONNECT_BASE_DELAY * (2 ** attempt), self.timeout))
+            _, failed = self._send(lambda d: d.heartbeat(nowait=False))
+            if not failed:
+                self.connected = True
+                self.reconnects += 1
+                return True
+        print(f"Device unreachable after {self.retry_attempts} reconnect attempts")
+        return False
+
+    def _read_status(self, device):
+        # Later callers stop attaching to this request once it is running
+        with self._lock:
+            self._pending_status = None
+        return device.status()
+
+    def status_async(self):
+        """Future for the device status, shared with any status read already queued"""
+        with self._lock:
+            if self._pending_status is None:
+                self._pending_status = self.submit(self._read_status, PRIORITY_STATUS)
+            return self._pending_status
+
+    def status(self, timeout=None):
+        """Blocking status() through the queue"""
+        with span('device.status'):
+            return self.status_async().result(timeout)
+
+    def set_value(self, index, value, priority=None, timeout=None):
+        """Blocking set_value(); safety commands jump the queue automatically"""
+        if priority is None:
+            priority = PRIORITY_SAFETY if (str(index), value) in SAFETY_COMMANDS else PRIORITY_CONTROL
+        with span('device.set_value', dps=index, value=value):
+            return self.submit(lambda d: d.set_value(index, value), priority).result(timeout)
+
+    def set_value_acked(self, index, value, timeout=DEFAULT_ACK_TIMEOUT, expect=None, priority=None):
+        """
+        set_value() that returns once the device reports the new value.
+
+        The set_value() reply is checked first (most firmware echoes the
+        changed DPS); otherwise status is re-read until it shows the value
+        or timeout seconds have passed since the command was queued.
+
+        Args:
+            expect: {dps: value} to wait for instead of {index: value}, e.g.
+                    {'5': 'goto_charge'} for a command that changes another DPS.
+
+        Returns:
+            dict with dps, value, acked (False on timeout), latency_ms and
+            result (the raw set_value() reply).
+        """
+        expect = {str(index): value} if expect is None else {str(k): v for k, v in expect.items()}
+        start = time.monotonic()
+        result = None
+        acked = False
+
+        with span('device.set_value_acked', dps=index, value=value):
+            try:
+                result = self.set_value(index, value, priority, timeout)
+                acked = _reports(result, expect)
+                while not acked:
+                    remaining = timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        break
+                    acked = _reports(self.status(remaining), expect)
+                    if not acked:
+                        time.sleep(min(ACK_POLL_INTERVAL, max(timeout - (time.monotonic() - start), 0)))
+            except concurrent.futures.TimeoutError:
+                acked = False
+
+        return {
+            'dps': str(index),
+            'value': value,
+            'acked': acked,
+            'latency_ms': round((time.monotonic() - start) * 1000, 1),
+            'result': result,
+        }
+
+    def get_value(self, index, priority=PRIORITY_STATUS, timeout=None):
+        """Blocking get_value() through the queue"""
+        with span('device.get_value', dps=index):
+            return self.submit(lambda d: d.get_value(index), priority).result(timeout)
+
+    def _read_push(self, device):
+        device.set_socketTimeout(PUSH_READ_TIMEOUT)
+        try:
+            return device.receive()
+        finally:
+            device.set_socketTimeout(self.timeout)
+    _read_push.sends = False
+
+    def receive(self, priority=PRIORITY_MAP, timeout=None):
+        """
+        Blocking receive() of an async push, lowest priority.
+
+        Waits up to timeout seconds (default: the socket timeout, as
+        tinytuya does) in PUSH_READ_TIMEOUT reads queued one after another,
+        so commands queued meanwhile run between them instead of waiting
+        for the whole receive. Returns None if nothing arrived.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with span('device.receive'):
+            while True:
+                result = self.submit(self._read_push, priority).result()
+                if result is not None or time.monotonic() >= deadline:
+                    return result
+
+    def stop(self):
+        """Finish queued work, then stop the worker and close the socket"""
+        if not self._running:
+            return
+        self._running = False
+        # Sorts after every real request
+        self._queue.put((float('inf'), next(self._counter), None, None))
+        self._worker.join()
+        self.device.close()
+        with _queues_lock:
+            for dev_id, q in list(_queues.items()):
+                if q is self:
+                    del _queues[dev_id]
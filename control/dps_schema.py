@@ -0,0 +1,215 @@
+import os
+import re
+import sys
+
+# Registry of the DPS table in docs/PROTOCOL.md (run this file to check
+# the two still agree): dps, name, type, default, display format
+DPS_TABLE = (
+    ('1', 'power', 'boolean', False, None),
+    ('2', 'pause', 'boolean', False, None),
+    ('3', 'mode', 'string', 'unknown', None),
+    ('4', 'command', 'string', 'unknown', None),
+    ('5', 'status', 'string', 'unknown', None),
+    ('26', 'battery', 'integer', 0, '{}%'),
+    ('102', 'error_code', 'integer', 0, None),
+    ('9', 'suction_mode', 'string', 'unknown', None),
+    ('10', 'water_level', 'string', 'unknown', None),
+    ('103', 'auto_boost', 'boolean', False, None),
+    ('7', 'side_brush_life', 'integer', 0, '{}%'),
+    ('8', 'filter_life', 'integer', 0, '{}%'),
+    ('29', 'main_brush_life', 'integer', 0, '{} cycles'),
+    ('17', 'cleaning_time', 'integer', 0, '{}s'),
+    ('21', 'cleaning_area', 'integer', 0, None),
+    ('30', 'total_cleanings', 'integer', 0, None),
+    ('31', 'total_area', 'integer', 0, '{}m²'),
+    ('25', 'find_robot', 'boolean', False, None),
+    ('27', 'dnd_mode', 'boolean', False, None),
+    ('15', 'map_data', 'string', '', None),
+    ('106', 'map_request', 'string', '', None),
+    ('121', 'request', 'string', '', None),
+    ('122', 'request_alt', 'string', '', None),
+    ('199', 'map_id', 'string', '0', None),
+)
+
+# Robot status (DPS 5) and error codes (DPS 102) from docs/PROTOCOL.md
+STATUS_CODES = {
+    'standby': 'Standby', 'cleaning': 'Cleaning', 'charging': 'Charging',
+    'paused': 'Paused', 'goto_charge': 'Returning', 'locating': 'Locating',
+    'docking': 'Docking', 'full': 'Full', 'sleep': 'Sleep',
+}
+ERROR_CODES = {
+    0: 'No error', 1: 'Wheel stuck', 2: 'Side brush stuck', 3: 'Main brush stuck',
+    4: 'Cliff sensor', 5: 'Bumper stuck', 6: 'Low battery', 7: 'Dustbin missing',
+    8: 'Filter dirty', 9: 'Wheel suspended', 10: 'Magnetic strip',
+}
+
+# Fields get_status() has always returned, in this order
+STATUS_FIELDS = (
+    'power', 'status', 'command', 'battery', 'suction_mode', 'water_level',
+    'side_brush_life', 'filter_life', 'main_brush_life', 'cleaning_time',
+    'cleaning_area', 'total_cleanings', 'total_area', 'error_code',
+    'auto_boost', 'dnd_mode', 'map_id',
+)
+
+PYTHON_TYPES = {'boolean': bool, 'integer': int, 'string': str}
+
+
+class DpsField:
+    """One DPS from the protocol table"""
+
+    __slots__ = ('dps', 'name', 'type', 'default', 'fmt')
+
+    def __init__(self, dps, name, type, default, fmt):
+        self.dps = dps
+        self.name = name
+        self.type = type
+        self.default = default
+        self.fmt = fmt
+
+    def __repr__(self):
+        return f"DpsField({self.dps!r}, {self.name!r}, {self.type!r})"
+
+
+DPS_SCHEMA = {row[0]: DpsField(*row) for row in DPS_TABLE}
+FIELDS_BY_NAME = {field.name: field for field in DPS_SCHEMA.values()}
+
+
+def _format_area_cm2(value):
+    # DPS 21 is reported in cm²
+    return f"{value / 10000:.2f}m²"
+
+
+def _format_error(value):
+    return f"{value} ({ERROR_CODES.get(value, 'Unknown error')})" if value else '0'
+
+
+# Formatters that need more than a format string
+FORMATTERS = {
+    'cleaning_area': _format_area_cm2,
+    'error_code': _format_error,
+}
+
+# Precompiled decode tables for StatusSnapshot
+_KEYS = [FIELDS_BY_NAME[name].dps for name in STATUS_FIELDS]
+_DEFAULTS = [FIELDS_BY_NAME[name].default for name in STATUS_FIELDS]
+_TYPES = [PYTHON_TYPES[FIELDS_BY_NAME[name].type] for name in STATUS_FIELDS]
+
+
+def _coerce(value, kind):
+    if kind is bool and isinstance(value, str):
+        return value.lower() in ('true', '1')
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class StatusSnapshot:
+    """
+    One decoded status response.
+
+    from_dps() reads every schema field in one C-level pass
+    (map(dps.get, keys, defaults)) and checks all types with a single list
+    comparison; only values of the wrong type are converted. Fields are read as
+    attributes (snapshot.battery), display strings are built only when
+    formatted() is first called, and diff() compares two snapshots without
+    building dicts when nothing changed.
+    """
+
+    __slots__ = ('_values', '_formatted')
+
+    def __init__(self, values):
+        self._values = values
+        self._formatted = None
+
+    @classmethod
+    def from_dps(cls, dps):
+        values = list(map(dps.get, _KEYS, _DEFAULTS))
+        if list(map(type, values)) != _TYPES:
+            values = [value if type(value) is kind else _coerce(value, kind)
+                      for value, kind in zip(values, _TYPES)]
+        return cls(values)
+
+    def as_dict(self):
+        """The dict get_status() returns"""
+        return dict(zip(STATUS_FIELDS, self._values))
+
+    def diff(self, previous):
+        """{name: (old, new)} for every field that changed since previous (None = all new)"""
+        if previous is None:
+            return {name: (None, value) for name, value in zip(STATUS_FIELDS, self._values)}
+        if self._values == previous._values:
+            return {}
+        return {name: (old, new)
+                for name, old, new in zip(STATUS_FIELDS, previous._values, self._values)
+                if old != new}
+
+    def formatted(self, name=None):
+        """Display string for one field, or a dict of all of them; built on first use"""
+        if self._formatted is None:
+            strings = {}
+            for field_name, value in zip(STATUS_FIELDS, self._values):
+                formatter = FORMATTERS.get(field_name)
+                fmt = FIELDS_BY_NAME[field_name].fmt
+                if formatter is not None:
+                    strings[field_name] = formatter(value)
+                elif fmt is not None:
+                    strings[field_name] = fmt.format(value)
+                else:
+                    strings[field_name] = str(value)
+            self._formatted = strings
+        return self._formatted if name is None else self._formatted[name]
+
+    @property
+    def status_text(self):
+        return STATUS_CODES.get(self.status, self.status)
+
+    def __eq__(self, other):
+        return isinstance(other, StatusSnapshot) and self._values == other._values
+
+    def __repr__(self):
+        return f"StatusSnapshot({self.as_dict()!r})"
+
+
+# Field accessors: snapshot.battery reads slot _values at a fixed index
+for _i, _name in enumerate(STATUS_FIELDS):
+    setattr(StatusSnapshot, _name, property(lambda self, i=_i: self._values[i]))
+del _i, _name
+
+
+def read_protocol_table(path):
+    """DPS rows (dps, name, type) from the tables in docs/PROTOCOL.md"""
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            match = re.match(r'\|\s*(\d+)\s*\|\s*(\w+)\s*\|\s*(\w+)\s*\|', line)
+            if match and match.group(3) in PYTHON_TYPES:
+                rows.append(match.groups())
+    return rows
+
+
+def check_protocol(path):
+    """Differences between DPS_TABLE and PROTOCOL.md; empty list when in sync"""
+    documented = {dps: (name, kind) for dps, name, kind in read_protocol_table(path)}
+    problems = []
+    for dps, (name, kind) in documented.items():
+        field = DPS_SCHEMA.get(dps)
+        if field is None:
+            problems.append(f"DPS {dps} ({name}) is documented but not in DPS_TABLE")
+        elif (field.name, field.type) != (name, kind):
+            problems.append(f"DPS {dps}: table says {name}/{kind}, "
+                            f"DPS_TABLE says {field.name}/{field.type}")
+    for dps, field in DPS_SCHEMA.items():
+        if dps not in documented:
+            problems.append(f"DPS {dps} ({field.name}) is in DPS_TABLE but not documented")
+    return problems
+
+
+# Usage: python dps_schema.py [../docs/PROTOCOL.md]
+if __name__ == "__main__":
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docs', 'PROTOCOL.md')
+    problems = check_protocol(sys.argv[1] if len(sys.argv) > 1 else default)
+    for problem in problems:
+        print(problem)
+    print("✓ DPS_TABLE matches PROTOCOL.md" if not problems else f"{len(problems)} mismatches")
+    sys.exit(1 if problems else 0)
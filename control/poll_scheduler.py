@@ -0,0 +1,251 @@
+import concurrent.futures
+import heapq
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+
+# Seconds between polls for each DPS 5 state (see docs/PROTOCOL.md)
+STATE_INTERVALS = {
+    'cleaning': 2.0,
+    'locating': 2.0,
+    'goto_charge': 3.0,
+    'docking': 3.0,
+    'paused': 10.0,
+    'charging': 30.0,
+    'standby': 60.0,
+    'full': 300.0,
+    'sleep': 300.0,
+}
+# Before the first response, or for a state not in the table
+UNKNOWN_INTERVAL = 5.0
+# At or below this battery level an idle or running robot is polled quickly,
+# since it is about to head back to the dock
+LOW_BATTERY = 20
+LOW_BATTERY_INTERVAL = 5.0
+# Failed polls back off by doubling, up to this
+MAX_INTERVAL = 300.0
+
+# Each interval is stretched or shrunk by up to this fraction so devices
+# that started together drift apart
+DEFAULT_JITTER = 0.1
+# Fleet-wide request budget (token bucket): sustained rate and burst size
+DEFAULT_MAX_RATE = 2.0
+DEFAULT_BURST = 4
+# Polls running at once
+DEFAULT_WORKERS = 4
+
+
+def interval_for(status, battery=None):
+    """Seconds until the next poll of a robot last seen in status with battery %"""
+    interval = STATE_INTERVALS.get(status, UNKNOWN_INTERVAL)
+    if battery is not None:
+        if status == 'charging' and battery >= 100:
+            interval = STATE_INTERVALS['full']
+        elif status in ('cleaning', 'paused', 'standby') and battery <= LOW_BATTERY:
+            interval = min(interval, LOW_BATTERY_INTERVAL)
+    return interval
+
+
+class _Device:
+    __slots__ = ('device_id', 'poll', 'status', 'battery', 'failures', 'due',
+                 'generation', 'busy')
+
+    def __init__(self, device_id, poll):
+        self.device_id = device_id
+        self.poll = poll
+        self.status = None
+        self.battery = None
+        self.failures = 0
+        self.due = 0.0
+        self.generation = 0
+        self.busy = False
+
+    def interval(self):
+        if self.failures:
+            return min(UNKNOWN_INTERVAL * 2 ** self.failures, MAX_INTERVAL)
+        return interval_for(self.status, self.battery)
+
+
+class PollScheduler:
+    """
+    Poll many devices, each at a rate that suits what it is doing.
+
+    After every response the device's next poll is set from its DPS 5
+    status and DPS 26 battery (interval_for()): every 2 s while cleaning,
+    every few minutes while docked and full. Each interval gets +/- jitter
+    so a fleet does not poll in lockstep, and all polls share one token
+    bucket of max_rate requests per second (burst at most burst), so adding
+    robots slows polling down instead of flooding the network.
+
+    poll is a callable returning a status response ({'dps': {...}}), e.g.
+    DeviceCommandQueue.status. on_status(device_id, dps) is called with
+    every successful response. Push updates received elsewhere can be
+    passed to observe() so a robot that starts cleaning is polled fast at
+    once rather than after its idle interval.
+    """
+
+    def __init__(self, max_rate=DEFAULT_MAX_RATE, burst=DEFAULT_BURST,
+                 jitter=DEFAULT_JITTER, workers=DEFAULT_WORKERS, on_status=None,
+                 clock=time.monotonic, rng=None):
+        self.max_rate = max_rate
+        self.burst = burst
+        self.jitter = jitter
+        self.on_status = on_status
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.devices = {}
+        self.polls = 0
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._tokens = float(burst)
+        self._refilled = clock()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='poll')
+
+    def add(self, device_id, poll):
+        """Start polling a device; the first poll is spread over the unknown interval"""
+        with self._cond:
+            device = self.devices[device_id] = _Device(device_id, poll)
+            self._schedule(device, self.clock() + self.rng.uniform(0, UNKNOWN_INTERVAL))
+
+    def remove(self, device_id):
+        with self._cond:
+            device = self.devices.pop(device_id, None)
+            if device is not None:
+                device.generation += 1
+
+    def observe(self, device_id, dps):
+        """
+        Record a status or partial push for a device; if its new state wants
+        faster polling than currently scheduled, the next poll moves up.
+        """
+        with self._cond:
+            device = self.devices.get(device_id)
+            if device is None:
+                return
+            if '5' in dps:
+                device.status = dps['5']
+            if '26' in dps:
+                device.battery = dps['26']
+            device.failures = 0
+            if not device.busy:
+                due = self.clock() + self._jittered(device.interval())
+                if due < device.due:
+                    self._schedule(device, due)
+
+    def interval(self, device_id):
+        """Current (unjittered) polling interval of a device"""
+        with self._cond:
+            return self.devices[device_id].interval()
+
+    def _jittered(self, interval):
+        return interval * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _schedule(self, device, due):
+        # Older heap entries for the device are skipped by generation
+        device.generation += 1
+        device.due = due
+        heapq.heappush(self._heap, (due, next(self._seq), device.device_id, device.generation))
+        self._cond.notify()
+
+    def _token_wait(self, now):
+        """Take a request token; returns 0, or seconds until one is available"""
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.max_rate)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.max_rate
+
+    def _next_ready(self):
+        """Block until a device is due and a token is free; None once stopped"""
+        with self._cond:
+            while not self._stop.is_set():
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, _, device_id, generation = self._heap[0]
+                device = self.devices.get(device_id)
+                if device is None or device.generation != generation:
+                    heapq.heappop(self._heap)
+                    continue
+                now = self.clock()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                wait = self._token_wait(now)
+                if wait:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                device.busy = True
+                return device
+        return None
+
+    def _poll(self, device):
+        try:
+            response = device.poll()
+        except Exception as e:
+            print(f"Poll error ({device.device_id}): {e}", file=sys.stderr)
+            response = None
+        dps = response.get('dps') if isinstance(response, dict) else None
+
+        if isinstance(dps, dict) and self.on_status is not None:
+            self.on_status(device.device_id, dps)
+        with self._cond:
+            self.polls += 1
+            device.busy = False
+            if isinstance(dps, dict):
+                device.status = dps.get('5', device.status)
+                device.battery = dps.get('26', device.battery)
+                device.failures = 0
+            else:
+                device.failures += 1
+            if self.devices.get(device.device_id) is device:
+                self._schedule(device, self.clock() + self._jittered(device.interval()))
+
+    def run(self):
+        """Poll until stop() is called"""
+        while True:
+            device = self._next_ready()
+            if device is None:
+                return
+            self._executor.submit(self._poll, device)
+
+    def start(self):
+        threading.Thread(target=self.run, name='poll-scheduler', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+
+
+# Usage: python poll_scheduler.py [config.json ...]
+#        Prints one NDJSON status line per poll (pipe into session_detector.py)
+if __name__ == "__main__":
+    from vacuum_controller import EurekaLVACVoiceProController
+
+    lock = threading.Lock()
+
+    def print_status(device_id, dps):
+        with lock:
+            print(json.dumps({'device': device_id, 't': time.time(), 'dps': dps}), flush=True)
+
+    scheduler = PollScheduler(on_status=print_status)
+    for config_path in sys.argv[1:] or [None]:
+        vacuum = EurekaLVACVoiceProController(config_path).vacuum
+        scheduler.add(vacuum.device.id, vacuum.status)
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        scheduler.stop()
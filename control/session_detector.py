@@ -0,0 +1,182 @@
+import json
+import sys
+import time
+
+# DPS 5 values while a run is in progress (see docs/PROTOCOL.md)
+ACTIVE_STATES = {'cleaning', 'paused', 'goto_charge', 'docking', 'locating'}
+# DPS 5 values that end a run
+IDLE_STATES = {'charging', 'standby', 'sleep', 'full'}
+
+# A run with no updates for this long is closed as timed out
+DEFAULT_STALE_AFTER = 30 * 60
+# Distinct DPS 102 codes kept per session
+MAX_ERRORS = 8
+
+
+def _error_code(dps):
+    """DPS 102 as an int, 0 when absent or no error"""
+    try:
+        return int(dps.get('102') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class _DeviceState:
+    """Everything remembered about one device: a fixed set of scalars"""
+
+    __slots__ = ('status', 'battery', 'last_update', 'active', 'partial', 'start',
+                 'battery_start', 'battery_min', 'cleaning_time', 'area', 'pauses', 'errors')
+
+    def __init__(self):
+        self.status = None
+        self.battery = None
+        self.last_update = None
+        self.active = False
+
+    def begin(self, timestamp, partial):
+        self.active = True
+        self.partial = partial
+        self.start = timestamp
+        self.battery_start = self.battery
+        self.battery_min = self.battery
+        self.cleaning_time = 0
+        self.area = 0
+        self.pauses = 0
+        self.errors = ()
+
+
+class SessionDetector:
+    """
+    Turn a stream of DPS updates into cleaning-session records.
+
+    feed() takes each update as it arrives (a full status or a partial push
+    with only the changed DPS) and returns a finished session record when
+    the robot goes from an active state (cleaning, paused, returning) back
+    to an idle one (charging, standby, sleep), or None otherwise.
+
+    Per device only a handful of scalars is kept (see _DeviceState), so
+    memory does not grow with run length and one detector can sit inline on
+    a feed from many robots.
+
+    Records contain: device, start, end, duration_s, cleaning_time_s
+    (DPS 17), area_m2 (DPS 21, cm²), battery_start, battery_end,
+    battery_used, pauses, errors (DPS 102 codes), end_reason and partial
+    (True when the detector joined mid-run, so start is approximate).
+    """
+
+    def __init__(self, stale_after=DEFAULT_STALE_AFTER, clock=time.time):
+        self.stale_after = stale_after
+        self.clock = clock
+        self.devices = {}
+
+    def feed(self, device_id, dps, timestamp=None):
+        """Consume one update; returns a finished session (dict) or None"""
+        timestamp = self.clock() if timestamp is None else timestamp
+        state = self.devices.get(device_id)
+        if state is None:
+            state = self.devices[device_id] = _DeviceState()
+
+        finished = None
+        # A long silence means we missed the end of the run
+        if (state.active and state.last_update is not None
+                and timestamp - state.last_update > self.stale_after):
+            finished = self._finish(device_id, state, state.last_update, 'timeout')
+        state.last_update = timestamp
+
+        if '26' in dps:
+            state.battery = dps['26']
+        status = dps.get('5', state.status)
+
+        if state.active:
+            if '17' in dps:
+                state.cleaning_time = max(state.cleaning_time, dps['17'] or 0)
+            if '21' in dps:
+                state.area = max(state.area, dps['21'] or 0)
+            if state.battery is not None:
+                state.battery_min = (state.battery if state.battery_min is None
+                                     else min(state.battery_min, state.battery))
+            code = _error_code(dps)
+            if code and code not in state.errors and len(state.errors) < MAX_ERRORS:
+                state.errors += (code,)
+            if status == 'paused' and state.status != 'paused':
+                state.pauses += 1
+
+        if status in ACTIVE_STATES and not state.active:
+            # Joining mid-run unless we saw the robot idle first
+            state.begin(timestamp, partial=state.status not in IDLE_STATES)
+            state.cleaning_time = dps.get('17') or 0
+            state.area = dps.get('21') or 0
+            code = _error_code(dps)
+            if code:
+                state.errors = (code,)
+        elif status in IDLE_STATES and state.active:
+            finished = self._finish(device_id, state, timestamp, status)
+
+        state.status = status
+        return finished
+
+    def _finish(self, device_id, state, timestamp, reason):
+        state.active = False
+        used = None
+        if state.battery_start is not None and state.battery_min is not None:
+            used = max(state.battery_start - state.battery_min, 0)
+        return {
+            'device': device_id,
+            'start': state.start,
+            'end': timestamp,
+            'duration_s': round(timestamp - state.start, 1),
+            'cleaning_time_s': state.cleaning_time,
+            'area_m2': round(state.area / 10000, 2),
+            'battery_start': state.battery_start,
+            'battery_end': state.battery,
+            'battery_used': used,
+            'pauses': state.pauses,
+            'errors': list(state.errors),
+            'end_reason': reason,
+            'partial': state.partial,
+        }
+
+    def expire(self, now=None, reason='timeout'):
+        """Close runs that have gone quiet for longer than stale_after; returns their records"""
+        now = self.clock() if now is None else now
+        return [self._finish(device_id, state, state.last_update, reason)
+                for device_id, state in self.devices.items()
+                if state.active and now - state.last_update > self.stale_after]
+
+
+def iter_sessions(updates, stale_after=DEFAULT_STALE_AFTER):
+    """Yield sessions from an iterable of (device_id, timestamp, dps) in time order"""
+    detector = SessionDetector(stale_after)
+    for device_id, timestamp, dps in updates:
+        session = detector.feed(device_id, dps, timestamp)
+        if session is not None:
+            yield session
+    # Runs still open when the log ends
+    yield from detector.expire(float('inf'), 'end_of_log')
+
+
+def read_status_log(lines):
+    """
+    Parse an NDJSON status log into (device_id, timestamp, dps) tuples.
+
+    Each line is a status response ({"dps": {...}}) with optional
+    "device"/"devId" and "t"/"timestamp" keys; lines without dps are skipped.
+    """
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get('dps'), dict):
+            continue
+        device_id = record.get('device', record.get('devId', 'default'))
+        timestamp = record.get('t', record.get('timestamp'))
+        yield device_id, float(timestamp) if timestamp is not None else time.time(), record['dps']
+
+
+# Usage: python session_detector.py status_log.ndjson   (or pipe a live feed on stdin)
+if __name__ == "__main__":
+    source = open(sys.argv[1]) if len(sys.argv) > 1 else sys.stdin
+    with source:
+        for session in iter_sessions(read_status_log(source)):
+            print(json.dumps(session), flush=True)
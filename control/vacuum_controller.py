@@ -1,7 +1,18 @@
-import tinytuya
 import json
-import time
+import threading
 import os
+import sys
+
+if __name__ == "__main__":
+    # Run as a script: put utils/ on the path before command_queue is
+    # imported, so VACUUM_TRACE records the device-call spans
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+from command_queue import DeviceCommandQueue, DEFAULT_ACK_TIMEOUT
+from dps_schema import StatusSnapshot
+
+# How long find_robot() lets the robot beep before switching it off
+FIND_BEEP_SECONDS = 2
 
 class EurekaLVACVoiceProController:
     def __init__(self, config_path=None):
@@ -28,61 +39,64 @@ class EurekaLVACVoiceProController:
             config = json.load(f)
 
         device_config = config.get('device', {})
+        network_config = config.get('network', {})
 
-        # Initialize device
-        self.vacuum = tinytuya.Device(
+        # Initialize device (shared, serialized connection)
+        self.vacuum = DeviceCommandQueue.for_device(
             dev_id=device_config.get('dev_id'),
             address=device_config.get('address'),
             local_key=device_config.get('local_key'),
-            version=device_config.get('version', 3.3)
+            version=device_config.get('version', 3.3),
+            timeout=network_config.get('timeout', 5),
+            retry_attempts=network_config.get('retry_attempts', 3)
         )
-        self.vacuum.set_socketPersistent(True)
+        self.ack_timeout = network_config.get('ack_timeout', DEFAULT_ACK_TIMEOUT)
+    
+    def get_snapshot(self):
+        """Current status as a StatusSnapshot, or None if the read failed"""
+        status = self.vacuum.status()
+        if isinstance(status, dict) and 'dps' in status:
+            return StatusSnapshot.from_dps(status['dps'])
+        return None
     
     def get_status(self):
         """Get current vacuum status"""
         status = self.vacuum.status()
         if 'dps' in status:
-            dps = status['dps']
-            return {
-                'power': dps.get('1', False),
-                'status': dps.get('5', 'unknown'),
-                'command': dps.get('4', 'unknown'),
-                'battery': dps.get('26', 0),
-                'suction_mode': dps.get('9', 'unknown'),
-                'water_level': dps.get('10', 'unknown'),
-                'side_brush_life': dps.get('7', 0),
-                'filter_life': dps.get('8', 0),
-                'main_brush_life': dps.get('29', 0),
-                'cleaning_time': dps.get('17', 0),
-                'cleaning_area': dps.get('21', 0),
-                'total_cleanings': dps.get('30', 0),
-                'total_area': dps.get('31', 0),
-                'error_code': dps.get('102', 0),
-                'auto_boost': dps.get('103', False),
-                'dnd_mode': dps.get('27', False),
-                'map_id': dps.get('199', '0')
-            }
+            return StatusSnapshot.from_dps(status['dps']).as_dict()
         return status
     
+    def send_command(self, index, value, expect=None):
+        """
+        Send a command and wait until the device reports it (or ack_timeout passes).
+        Returns the ack dict from DeviceCommandQueue.set_value_acked().
+        """
+        ack = self.vacuum.set_value_acked(index, value, self.ack_timeout, expect)
+        if ack['acked']:
+            print(f"✓ Acknowledged in {ack['latency_ms']:.0f} ms")
+        else:
+            print(f"⚠ Not acknowledged within {self.ack_timeout}s")
+        return ack
+    
     def start_cleaning(self):
         """Start automatic cleaning"""
         print("Starting cleaning...")
-        return self.vacuum.set_value('1', True)
+        return self.send_command('1', True)
     
     def stop_cleaning(self):
         """Stop cleaning"""
         print("Stopping...")
-        return self.vacuum.set_value('1', False)
+        return self.send_command('1', False)
     
     def pause_cleaning(self):
         """Pause cleaning"""
         print("Pausing...")
-        return self.vacuum.set_value('2', True)
+        return self.send_command('2', True)
     
     def return_to_dock(self):
         """Return to charging dock"""
         print("Returning to dock...")
-        return self.vacuum.set_value('4', 'chargego')
+        return self.send_command('4', 'chargego')
     
     def set_suction_mode(self, mode):
         """
@@ -94,7 +108,7 @@ class EurekaLVACVoiceProController:
             print(f"Invalid mode. Choose from: {valid_modes}")
             return
         print(f"Setting suction to {mode}...")
-        return self.vacuum.set_value('9', mode)
+        return self.send_command('9', mode)
     
     def set_water_level(self, level):
         """
@@ -106,68 +120,71 @@ class EurekaLVACVoiceProController:
             print(f"Invalid level. Choose from: {valid_levels}")
             return
         print(f"Setting water level to {level}...")
-        return self.vacuum.set_value('10', level)
+        return self.send_command('10', level)
     
     def find_robot(self):
         """Make robot beep to locate it"""
         print("Finding robot (beeping)...")
-        self.vacuum.set_value('25', True)
-        time.sleep(2)
-        return self.vacuum.set_value('25', False)
+        ack = self.send_command('25', True)
+        # Switch the beep off in the background instead of blocking the caller
+        timer = threading.Timer(FIND_BEEP_SECONDS, self.vacuum.set_value, args=('25', False))
+        timer.daemon = True
+        timer.start()
+        return ack
     
     def set_dnd_mode(self, enabled):
         """Enable/disable Do Not Disturb mode"""
         print(f"Setting DND mode: {enabled}")
-        return self.vacuum.set_value('27', enabled)
+        return self.send_command('27', enabled)
     
     def set_auto_boost(self, enabled):
         """Enable/disable auto carpet boost"""
         print(f"Setting auto boost: {enabled}")
-        return self.vacuum.set_value('103', enabled)
+        return self.send_command('103', enabled)
     
     def get_maintenance_status(self):
         """Get maintenance information"""
-        status = self.vacuum.status()
-        if 'dps' in status:
-            dps = status['dps']
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
             return {
-                'side_brush': f"{dps.get('7', 0)}% life remaining",
-                'filter': f"{dps.get('8', 0)}% life remaining",
-                'main_brush': f"{dps.get('29', 0)} cycles remaining"
+                'side_brush': f"{snapshot.formatted('side_brush_life')} life remaining",
+                'filter': f"{snapshot.formatted('filter_life')} life remaining",
+                'main_brush': f"{snapshot.formatted('main_brush_life')} remaining"
             }
         return {}
     
     def print_status(self):
         """Print formatted status"""
-        status = self.get_status()
+        status = self.vacuum.status()
         print("\n" + "="*50)
         print("VACUUM STATUS")
         print("="*50)
 
-        # Check if we got a valid parsed status or raw response
-        if not isinstance(status, dict) or 'power' not in status:
+        # Check if we got a valid status or an error response
+        if not isinstance(status, dict) or 'dps' not in status:
             print("Unable to retrieve status. Raw response:")
             print(json.dumps(status, indent=2))
             print("="*50 + "\n")
             return
 
-        print(f"Power:          {status['power']}")
-        print(f"Status:         {status['status']}")
-        print(f"Command:        {status['command']}")
-        print(f"Battery:        {status['battery']}%")
-        print(f"Suction Mode:   {status['suction_mode']}")
-        print(f"Water Level:    {status['water_level']}")
-        print(f"DND Mode:       {status['dnd_mode']}")
-        print(f"Auto Boost:     {status['auto_boost']}")
+        text = StatusSnapshot.from_dps(status['dps']).formatted()
+        print(f"Power:          {text['power']}")
+        print(f"Status:         {text['status']}")
+        print(f"Command:        {text['command']}")
+        print(f"Battery:        {text['battery']}")
+        print(f"Suction Mode:   {text['suction_mode']}")
+        print(f"Water Level:    {text['water_level']}")
+        print(f"DND Mode:       {text['dnd_mode']}")
+        print(f"Auto Boost:     {text['auto_boost']}")
         print("\nMAINTENANCE:")
-        print(f"Side Brush:     {status['side_brush_life']}%")
-        print(f"Filter:         {status['filter_life']}%")
-        print(f"Main Brush:     {status['main_brush_life']} cycles")
+        print(f"Side Brush:     {text['side_brush_life']}")
+        print(f"Filter:         {text['filter_life']}")
+        print(f"Main Brush:     {text['main_brush_life']}")
         print("\nSTATISTICS:")
-        print(f"Current Clean:  {status['cleaning_time']}s / {status['cleaning_area']}m²")
-        print(f"Total Cleans:   {status['total_cleanings']}")
-        print(f"Total Area:     {status['total_area']}m²")
-        print(f"Error Code:     {status['error_code']}")
+        print(f"Current Clean:  {text['cleaning_time']} / {text['cleaning_area']}")
+        print(f"Total Cleans:   {text['total_cleanings']}")
+        print(f"Total Area:     {text['total_area']}")
+        print(f"Error Code:     {text['error_code']}")
         print("="*50 + "\n")
 
 # Interactive Menu
@@ -197,25 +214,20 @@ def main():
             controller.print_status()
         elif choice == '2':
             controller.start_cleaning()
-            time.sleep(2)
             controller.print_status()
         elif choice == '3':
             controller.stop_cleaning()
-            time.sleep(2)
             controller.print_status()
         elif choice == '4':
             controller.return_to_dock()
-            time.sleep(2)
             controller.print_status()
         elif choice == '5':
             mode = input("Enter mode (gentle/normal/max): ").strip()
             controller.set_suction_mode(mode)
-            time.sleep(2)
             controller.print_status()
         elif choice == '6':
             level = input("Enter level (low/medium/high): ").strip()
             controller.set_water_level(level)
-            time.sleep(2)
             controller.print_status()
         elif choice == '7':
             controller.find_robot()
@@ -0,0 +1,417 @@
+import base64
+import contextlib
+import io
+import json
+import os
+import queue
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Rendering happens off-screen
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'control'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'mapping'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'utils'))
+
+from poll_scheduler import interval_for
+from session_detector import SessionDetector
+from vacuum_controller import EurekaLVACVoiceProController
+from map_reassembly import MapReassembler
+from map_store import MapStore, content_hash
+from map_tiles import TileCache, TileRenderer
+from map_visualizer_v2 import TuyaRoomMapDecoder
+from tuya_decoder import TuyaMapDecoder
+from tracing import span, traced
+
+DEFAULT_PORT = 8080
+# None = adaptive: poll_scheduler.interval_for() the robot's last status and battery
+DEFAULT_POLL_INTERVAL = None
+# Rendered map versions kept in memory
+RENDER_CACHE_SIZE = 8
+# Events buffered per browser before it is considered stuck and dropped
+CLIENT_QUEUE_SIZE = 64
+SSE_KEEPALIVE = 15.0
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Vacuum Dashboard</title>
+<style>
+  body { font-family: sans-serif; margin: 2em; }
+  #status td { padding: 2px 12px 2px 0; }
+  #viewer { position: relative; width: 768px; height: 512px; overflow: hidden;
+            border: 1px solid #ccc; cursor: grab; }
+  #viewer img { position: absolute; width: 256px; height: 256px; }
+</style>
+</head>
+<body>
+<h1>Vacuum Dashboard</h1>
+<table id="status"></table>
+<p id="session">No cleaning run finished yet</p>
+<p id="map-info">Waiting for map...</p>
+<p><button id="zoom-in">+</button> <button id="zoom-out">-</button>
+   <a id="full-map" href="#">Full image</a></p>
+<div id="viewer"></div>
+<script>
+// Tile viewer: centre is kept as a fraction of the world square
+let tiles = null, zoom = 0, cx = 0.5, cy = 0.5, stamp = 0;
+const viewer = document.getElementById('viewer');
+function draw() {
+  if (!tiles) return;
+  const n = 1 << zoom, size = 256, w = viewer.clientWidth, h = viewer.clientHeight;
+  const left = cx * n * size - w / 2, top = cy * n * size - h / 2;
+  let html = '';
+  for (let x = Math.max(0, Math.floor(left / size)); x < Math.min(n, Math.ceil((left + w) / size)); x++)
+    for (let y = Math.max(0, Math.floor(top / size)); y < Math.min(n, Math.ceil((top + h) / size)); y++)
+      html += `<img src="/tiles/${tiles.version}/${zoom}/${x}/${y}.png?${stamp}" ` +
+              `style="left:${x * size - left}px;top:${y * size - top}px">`;
+  viewer.innerHTML = html;
+}
+document.getElementById('zoom-in').onclick = () => { zoom = Math.min(zoom + 1, tiles.max_zoom); draw(); };
+document.getElementById('zoom-out').onclick = () => { zoom = Math.max(zoom - 1, 0); draw(); };
+let drag = null;
+viewer.onmousedown = e => { drag = [e.clientX, e.clientY]; e.preventDefault(); };
+window.onmouseup = () => { drag = null; };
+window.onmousemove = e => {
+  if (!drag || !tiles) return;
+  const scale = (1 << zoom) * 256;
+  cx -= (e.clientX - drag[0]) / scale; cy -= (e.clientY - drag[1]) / scale;
+  drag = [e.clientX, e.clientY];
+  draw();
+};
+
+const events = new EventSource('/events');
+events.addEventListener('status', e => {
+  const dps = JSON.parse(e.data);
+  document.getElementById('status').innerHTML = Object.entries(dps)
+    .map(([k, v]) => `<tr><td>DPS ${k}</td><td>${v}</td></tr>`).join('');
+});
+events.addEventListener('session', e => {
+  const run = JSON.parse(e.data);
+  document.getElementById('session').textContent =
+    `Last run: ${Math.round(run.duration_s / 60)} min, ${run.area_m2} m², ` +
+    `${run.battery_used}% battery, ended ${run.end_reason}` +
+    (run.errors.length ? `, errors ${run.errors.join(', ')}` : '');
+});
+events.addEventListener('map', e => {
+  const map = JSON.parse(e.data);
+  document.getElementById('map-info').textContent =
+    `Map ${map.version}: ${map.rooms} rooms`;
+  document.getElementById('full-map').href = map.url;
+  // Same tile version means only the path moved; keep the current view
+  if (!tiles || tiles.version !== map.tiles.version) { zoom = 0; cx = cy = 0.5; }
+  tiles = map.tiles;
+  stamp++;
+  draw();
+});
+</script>
+</body>
+</html>
+"""
+
+
+class DashboardHub:
+    """
+    One device connection fanned out to any number of browsers.
+
+    A single poller thread reads the robot's status, publishes status
+    changes and new map versions as events, and every connected browser
+    gets its own bounded event queue. Map images are rendered at most once
+    per map version, on first request, and kept in a small LRU cache.
+
+    The zoomable view is served as tiles from a TileRenderer. While the
+    rooms stay the same, a new push only updates the path, so just the
+    tiles its changed segments cross are re-rendered.
+
+    With poll_interval=None the poll rate follows the robot's state (fast
+    while cleaning, slow while docked); a number polls at that fixed rate.
+
+    Decoded maps are kept in a MapStore per DPS 199 map id: when the robot
+    switches floors the stored map is shown at once instead of waiting for
+    the next push, and a push whose content hash is already stored is not
+    decoded again. Rendered PNGs are saved next to the map they belong to.
+    """
+
+    def __init__(self, controller, poll_interval=DEFAULT_POLL_INTERVAL, store=None):
+        self.controller = controller
+        self.poll_interval = poll_interval
+        self.device_id = controller.vacuum.device.id
+        self.store = store if store is not None else MapStore()
+        self.map_id = None
+        self.reassembler = MapReassembler()
+        self.sessions = SessionDetector()
+        self.last_session = None
+        self.clients = set()
+        self.clients_lock = threading.Lock()
+        self.status = {}
+        self.map_version = None
+        self.maps = {}
+        self.renders = OrderedDict()
+        self.tile_cache = TileCache()
+        self.tiles = None
+        # map_version, maps and tiles change together under this lock
+        self.map_lock = threading.Lock()
+        self.render_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def subscribe(self):
+        """Register a browser; returns its event queue primed with the current state"""
+        client = queue.Queue(CLIENT_QUEUE_SIZE)
+        # Set when the browser is dropped; its handler then ends the stream
+        client.closed = False
+        if self.status:
+            client.put(('status', self.status))
+        if self.last_session:
+            client.put(('session', self.last_session))
+        # Registered before the lock is released, so a map shown after this
+        # snapshot is published to it
+        with self.map_lock:
+            if self.map_version:
+                client.put(('map', self.map_event(self.map_version)))
+            with self.clients_lock:
+                self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self.clients_lock:
+            self.clients.discard(client)
+
+    def publish(self, event, data):
+        with self.clients_lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.put_nowait((event, data))
+            except queue.Full:
+                # Slow browser: close its stream so EventSource reconnects
+                # and gets a fresh snapshot
+                client.closed = True
+                self.unsubscribe(client)
+
+    def map_event(self, version):
+        return {'version': version, 'rooms': len(self.maps[version]),
+                'url': f'/map/{version}.png',
+                'tiles': {'version': self.tiles.version, 'max_zoom': self.tiles.max_zoom}}
+
+    @traced('dashboard.poll')
+    def poll_once(self):
+        """One status round trip; publishes whatever changed"""
+        response = self.controller.vacuum.status()
+        if not isinstance(response, dict) or 'dps' not in response:
+            return
+
+        dps = dict(response['dps'])
+        session = self.sessions.feed(self.device_id, dps)
+        if session is not None:
+            self.last_session = session
+            self.publish('session', session)
+
+        switched, entry = self.store.observe(self.device_id, dps)
+        if switched:
+            self.map_id = self.store.active[self.device_id]
+            # A half-received push belongs to the previous map
+            self.reassembler = MapReassembler()
+            if entry is not None:
+                self.show_map(entry['hash'], entry['rooms'], entry['path'])
+
+        map_data = dps.pop('15', None)
+        if dps != self.status:
+            self.status = dps
+            self.publish('status', dps)
+
+        if map_data:
+            payload = self.reassembler.feed(base64.b64decode(map_data))
+            if payload is not None:
+                self.update_map(payload)
+
+    def update_map(self, payload):
+        """Decode a complete map payload if it is a new version"""
+        version = content_hash(payload)
+        if version == self.map_version:
+            return
+        entry = self.store.get(self.device_id, self.map_id) if self.map_id else None
+        if entry is not None and entry['hash'] == version:
+            # Stored from an earlier run: no need to decode it again
+            self.show_map(version, entry['rooms'], entry['path'])
+            return
+        with span('dashboard.decode', size=len(payload)), contextlib.redirect_stdout(io.StringIO()):
+            rooms = TuyaRoomMapDecoder.from_bytes(payload).decode_rooms()
+            path = TuyaMapDecoder.from_bytes(payload).decode().get('coordinates', [])
+        if self.map_id:
+            self.store.put(self.device_id, self.map_id, payload, rooms, path)
+        self.show_map(version, rooms, path)
+
+    def show_map(self, version, rooms, path):
+        """Make a decoded map the current one and tell the browsers"""
+        if version == self.map_version:
+            return
+        # Tiles first, so the version never goes out with the old pyramid
+        old_tiles = self.tiles
+        if old_tiles is not None and old_tiles.rooms == rooms:
+            # Same rooms: keep the tiles, re-render only where the path changed
+            old_tiles.update_path(path)
+            tiles = old_tiles
+        else:
+            tiles = TileRenderer(version, rooms=rooms, path=path, cache=self.tile_cache)
+
+        with self.map_lock:
+            # Only the current version needs its rooms; rendered PNGs live in the cache
+            self.maps = {version: rooms}
+            self.map_version = version
+            self.tiles = tiles
+            event = self.map_event(version)
+        if old_tiles is not None and old_tiles is not tiles:
+            self.tile_cache.clear(old_tiles.version)
+        self.publish('map', event)
+
+    def tile(self, version, z, x, y):
+        """PNG bytes for one tile of the current map, or None"""
+        tiles = self.tiles
+        if tiles is None or tiles.version != version:
+            return None
+        try:
+            return tiles.tile(z, x, y)
+        except ValueError:
+            return None
+
+    def render(self, version):
+        """PNG bytes for a map version, rendered once and cached"""
+        with self.render_lock:
+            if version in self.renders:
+                self.renders.move_to_end(version)
+                return self.renders[version]
+            rooms = self.maps.get(version)
+            if not rooms:
+                return None
+
+            png = self.store.get_artifact(self.device_id, self.map_id, 'map.png', version) if self.map_id else None
+            if png is None:
+                buf = io.BytesIO()
+                with span('dashboard.render'), contextlib.redirect_stdout(io.StringIO()):
+                    TuyaRoomMapDecoder.from_bytes(b'').visualize_rooms(rooms, output_file=buf)
+                png = buf.getvalue()
+                if self.map_id:
+                    self.store.put_artifact(self.device_id, self.map_id, 'map.png', png, version)
+            self.renders[version] = png
+            while len(self.renders) > RENDER_CACHE_SIZE:
+                self.renders.popitem(last=False)
+            return self.renders[version]
+
+    def run(self):
+        """Poll the device until stop() is called"""
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Poll error: {e}")
+            self._stop.wait(self.next_interval())
+
+    def next_interval(self):
+        if self.poll_interval is not None:
+            return self.poll_interval
+        return interval_for(self.status.get('5'), self.status.get('26'))
+
+    def start(self):
+        threading.Thread(target=self.run, name='dashboard-poller', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    hub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/':
+            self._send(200, 'text/html; charset=utf-8', PAGE.encode())
+        elif self.path == '/status':
+            self._send(200, 'application/json', json.dumps(self.hub.status).encode())
+        elif self.path == '/events':
+            self.stream_events()
+        elif self.path.startswith('/map/') and self.path.endswith('.png'):
+            png = self.hub.render(self.path[len('/map/'):-len('.png')])
+            if png is None:
+                self._send(404, 'text/plain', b'Unknown map version')
+            else:
+                self._send(200, 'image/png', png)
+        elif self.path.startswith('/tiles/'):
+            self.send_tile()
+        else:
+            self._send(404, 'text/plain', b'Not found')
+
+    def send_tile(self):
+        """/tiles/<version>/<z>/<x>/<y>.png"""
+        parts = self.path.split('?')[0][len('/tiles/'):].split('/')
+        png = None
+        if len(parts) == 4 and parts[3].endswith('.png'):
+            try:
+                z, x, y = int(parts[1]), int(parts[2]), int(parts[3][:-len('.png')])
+            except ValueError:
+                pass
+            else:
+                png = self.hub.tile(parts[0], z, x, y)
+        if png is None:
+            self._send(404, 'text/plain', b'Unknown tile')
+        else:
+            self._send(200, 'image/png', png)
+
+    def stream_events(self):
+        """Server-Sent Events: one long-lived response per browser"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        client = self.hub.subscribe()
+        try:
+            while not client.closed:
+                try:
+                    event, data = client.get(timeout=SSE_KEEPALIVE)
+                    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                except queue.Empty:
+                    message = ": keepalive\n\n"
+                self.wfile.write(message.encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.hub.unsubscribe(client)
+
+
+def serve(port=DEFAULT_PORT, config_path=None, poll_interval=DEFAULT_POLL_INTERVAL):
+    controller = EurekaLVACVoiceProController(config_path)
+    hub = DashboardHub(controller, poll_interval)
+    hub.start()
+
+    DashboardHandler.hub = hub
+    server = ThreadingHTTPServer(('', port), DashboardHandler)
+    server.daemon_threads = True
+    print(f"Dashboard running on http://localhost:{port}/")
+    print("Press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping dashboard")
+    finally:
+        hub.stop()
+        server.server_close()
+
+
+# Usage: python web_dashboard.py [port]
+if __name__ == "__main__":
+    serve(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT)
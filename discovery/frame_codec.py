@@ -0,0 +1,246 @@
+import json
+import struct
+import sys
+import time
+import zlib
+
+try:
+    # Only needed for encrypted payloads; framing works without it
+    from tinytuya import AESCipher
+except ImportError:
+    AESCipher = None
+
+# Tuya v3.x framing (docs/PROTOCOL.md):
+#   prefix 0x000055AA | seq | cmd | length | payload | crc32 | suffix 0x0000AA55
+# length counts everything after the header (payload + crc + suffix), and
+# the CRC32 covers header and payload.
+PREFIX = 0x000055AA
+SUFFIX = 0x0000AA55
+PREFIX_BYTES = PREFIX.to_bytes(4, 'big')
+HEADER = struct.Struct('>4I')
+FOOTER = struct.Struct('>2I')
+HEADER_SIZE = HEADER.size
+FOOTER_SIZE = FOOTER.size
+# Larger length fields are corruption, not frames (map pushes stay well below)
+MAX_LENGTH = 1 << 20
+
+COMMANDS = {
+    7: 'control',
+    8: 'status',
+    9: 'heart_beat',
+    10: 'dp_query',
+    13: 'control_new',
+    16: 'dp_query_new',
+    18: 'updatedps',
+}
+
+# v3.3 puts '3.3' + 12 zero bytes in front of encrypted payloads, except on
+# queries and heartbeats
+VERSION = b'3.3'
+VERSION_HEADER = VERSION + bytes(12)
+NO_VERSION_HEADER = {9, 10, 16, 18}
+
+
+class Frame:
+    """One decoded frame; payload is the raw (possibly encrypted) body"""
+
+    __slots__ = ('seq', 'cmd', 'payload', 'retcode')
+
+    def __init__(self, seq, cmd, payload, retcode=None):
+        self.seq = seq
+        self.cmd = cmd
+        self.payload = payload
+        self.retcode = retcode
+
+    @property
+    def command(self):
+        return COMMANDS.get(self.cmd, f'0x{self.cmd:02x}')
+
+    def data(self, cipher=None):
+        """Plaintext payload: version header stripped, decrypted when cipher is given"""
+        body = self.payload
+        if body[:3] == VERSION:
+            body = body[len(VERSION_HEADER):]
+        if cipher is None or not body or body[:1] == b'{':
+            return bytes(body)
+        return cipher.decrypt(bytes(body), False, False)
+
+    def json(self, cipher=None):
+        """Payload as a dict (None if empty or not JSON)"""
+        try:
+            return json.loads(self.data(cipher))
+        except ValueError:
+            return None
+
+    def __repr__(self):
+        return f"Frame(seq={self.seq}, cmd={self.command}, payload={len(self.payload)} bytes)"
+
+
+def make_cipher(local_key):
+    """AES cipher for a device's local_key (needs tinytuya)"""
+    if AESCipher is None:
+        raise RuntimeError("Encrypted payloads need tinytuya: pip install tinytuya")
+    return AESCipher(local_key.encode() if isinstance(local_key, str) else local_key)
+
+
+def encode_frame(seq, cmd, payload=b'', cipher=None):
+    """
+    Bytes of one frame.
+
+    payload may be bytes or a dict (sent as compact JSON). With a cipher the
+    payload is encrypted, with the v3.3 version header where the command
+    needs one.
+    """
+    if isinstance(payload, dict):
+        payload = json.dumps(payload, separators=(',', ':')).encode()
+    if cipher is not None:
+        payload = cipher.encrypt(payload, False)
+        if cmd not in NO_VERSION_HEADER:
+            payload = VERSION_HEADER + payload
+    frame = bytearray(HEADER_SIZE + len(payload) + FOOTER_SIZE)
+    HEADER.pack_into(frame, 0, PREFIX, seq, cmd, len(payload) + FOOTER_SIZE)
+    frame[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+    FOOTER.pack_into(frame, HEADER_SIZE + len(payload),
+                     zlib.crc32(memoryview(frame)[:HEADER_SIZE + len(payload)]), SUFFIX)
+    return bytes(frame)
+
+
+class FrameEncoder:
+    """Frames with increasing sequence numbers, for simulators and replays"""
+
+    def __init__(self, local_key=None, seq=1):
+        self.cipher = make_cipher(local_key) if local_key else None
+        self.seq = seq
+
+    def encode(self, cmd, payload=b''):
+        frame = encode_frame(self.seq, cmd, payload, self.cipher)
+        self.seq += 1
+        return frame
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for a TCP byte stream (or any run of datagrams).
+
+    feed() takes whatever recv() returned and gives back every frame that
+    is complete so far; a frame split across reads is kept until the rest
+    arrives, and several frames in one read all come out at once. Each
+    feed() walks the buffer once with struct.unpack_from and CRCs over
+    memoryview slices, so nothing but the payloads is copied, and consumed
+    bytes are dropped in one go at the end.
+
+    Bytes that don't start a frame, lengths out of range, bad CRCs and
+    missing suffixes are skipped by searching for the next prefix;
+    `dropped` counts the skipped bytes and `errors` the rejected frames.
+    """
+
+    def __init__(self, max_length=MAX_LENGTH):
+        self.max_length = max_length
+        self.buffer = bytearray()
+        self.frames = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def feed(self, data):
+        """Frames completed by data (list, possibly empty)"""
+        self.buffer += data
+        frames = []
+        buffer = self.buffer
+        size = len(buffer)
+        pos = 0
+        with memoryview(buffer) as view:
+            while size - pos >= HEADER_SIZE + FOOTER_SIZE:
+                prefix, seq, cmd, length = HEADER.unpack_from(buffer, pos)
+                if prefix != PREFIX:
+                    pos = self._resync(pos + 1)
+                    continue
+                if not FOOTER_SIZE <= length <= self.max_length:
+                    self.errors += 1
+                    pos = self._resync(pos + 1)
+                    continue
+                end = pos + HEADER_SIZE + length
+                if end > size:
+                    break
+                body_end = end - FOOTER_SIZE
+                crc, suffix = FOOTER.unpack_from(buffer, body_end)
+                if suffix != SUFFIX or crc != zlib.crc32(view[pos:body_end]):
+                    self.errors += 1
+                    pos = self._resync(pos + 1)
+                    continue
+
+                start = pos + HEADER_SIZE
+                retcode = None
+                # Replies from the device start with a 4-byte return code;
+                # JSON, the version header and ciphertext never start with 3 zeros
+                if body_end - start >= 4 and buffer[start:start + 3] == b'\0\0\0':
+                    retcode = buffer[start + 3]
+                    start += 4
+                frames.append(Frame(seq, cmd, bytes(view[start:body_end]), retcode))
+                pos = end
+        if pos:
+            del buffer[:pos]
+        self.frames += len(frames)
+        return frames
+
+    def _resync(self, pos):
+        """Position of the next prefix at or after pos (or where one could still start)"""
+        found = self.buffer.find(PREFIX_BYTES, pos)
+        if found < 0:
+            # Keep a tail that may be the start of a prefix split across reads
+            found = max(pos, len(self.buffer) - len(PREFIX_BYTES) + 1)
+        self.dropped += found - pos + 1
+        return found
+
+    @property
+    def pending(self):
+        """Bytes waiting for the rest of a frame"""
+        return len(self.buffer)
+
+
+def decode_frames(data, max_length=MAX_LENGTH):
+    """Every valid frame in one complete buffer (a datagram or a capture)"""
+    return FrameDecoder(max_length).feed(data)
+
+
+def benchmark(frames=100000, payload_size=64, chunk=1460):
+    """Frames per second through FrameDecoder, fed in TCP-sized reads"""
+    frame = encode_frame(1, 8, bytes(range(256)) * (payload_size // 256) + bytes(payload_size % 256))
+    stream = frame * frames
+    decoder = FrameDecoder()
+    started = time.perf_counter()
+    count = 0
+    for offset in range(0, len(stream), chunk):
+        count += len(decoder.feed(stream[offset:offset + chunk]))
+    elapsed = time.perf_counter() - started
+    return count, elapsed
+
+
+# Usage: python frame_codec.py capture.bin [local_key]   -> decode a raw TCP stream dump
+#        python frame_codec.py --bench                   -> decoder throughput
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python frame_codec.py <capture.bin> [local_key] | --bench")
+        sys.exit(1)
+
+    if sys.argv[1] == '--bench':
+        for size in (64, 1024):
+            count, elapsed = benchmark(payload_size=size)
+            print(f"{size:>5}-byte payloads: {count} frames in {elapsed:.2f}s "
+                  f"({count / elapsed:,.0f} frames/s)")
+        sys.exit(0)
+
+    cipher = make_cipher(sys.argv[2]) if len(sys.argv) > 2 else None
+    decoder = FrameDecoder()
+    with open(sys.argv[1], 'rb') as f:
+        # Read in socket-sized pieces, as a live stream would arrive
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                break
+            for frame in decoder.feed(chunk):
+                retcode = '' if frame.retcode is None else f" ret={frame.retcode}"
+                print(f"#{frame.seq:<6} {frame.command:<12}{retcode} {len(frame.payload):>6} bytes")
+                if cipher is not None or frame.payload[:1] == b'{':
+                    print(f"        {frame.data(cipher)[:200]}")
+    print(f"\n{decoder.frames} frames, {decoder.errors} rejected, "
+          f"{decoder.dropped} bytes skipped, {decoder.pending} bytes incomplete")
@@ -1,7 +1,13 @@
+import hashlib
 import socket
-import struct
 from datetime import datetime
 
+from frame_codec import AESCipher, PREFIX_BYTES, decode_frames, make_cipher
+
+# v3.3 broadcasts are encrypted with a fixed key shared by all devices
+UDP_KEY = hashlib.md5(b'yGAdlopoPVldABfn').digest()
+BROADCAST_CIPHER = make_cipher(UDP_KEY) if AESCipher is not None else None
+
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.bind(('', 6667))
 
@@ -16,20 +22,18 @@ try:
         print(f"[{timestamp}] Packet from {addr[0]}:{addr[1]}")
         print(f"Length: {len(data)} bytes")
         
-        # Look for magic bytes
-        if data[0:2] == b'\x00\x00' and data[2:4] == b'\x55\xaa':
-            print("✓ Magic header found: 0x55aa")
-            
-            # Try to parse header
-            if len(data) >= 16:
-                packet_type = struct.unpack('>H', data[10:12])[0]
-                length = struct.unpack('>H', data[14:16])[0]
-                print(f"  Packet type: 0x{packet_type:04x} ({packet_type})")
-                print(f"  Payload length: {length}")
-        
-        # Check for magic footer
-        if data[-4:-2] == b'\xaa\x55':
-            print("✓ Magic footer found: 0xaa55")
+        # Parse complete 55AA frames (header, CRC32 and footer all checked)
+        frames = decode_frames(data)
+        for frame in frames:
+            print("✓ Valid 55AA frame (CRC and footer OK)")
+            print(f"  Sequence: {frame.seq}")
+            print(f"  Packet type: 0x{frame.cmd:04x} ({frame.command})")
+            print(f"  Payload length: {len(frame.payload)}")
+            info = frame.json(BROADCAST_CIPHER)
+            if info:
+                print(f"  Device: {info.get('gwId')} at {info.get('ip')}, version {info.get('version')}")
+        if not frames and data[0:4] == PREFIX_BYTES:
+            print("✗ Magic header found but frame is truncated or fails its CRC")
         
         # Print hex dump
         print("\nHex dump:")
@@ -1,19 +1,30 @@
-import tinytuya
+import os
+import sys
 import json
 import base64
 import time
-import struct
+
+# Device access goes through the shared command queue in control/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'control'))
+from command_queue import DeviceCommandQueue
+
+from bitmap_decoder import BitmapDecoder, write_pgm
+from map_reassembly import MapReassembler
+from map_stream import detect_compression, decompress_payload, iter_b64decode, iter_payload, iter_points, DEFAULT_CHUNK_POINTS
+
+# Payloads up to this size are analyzed whole; of larger ones only the head
+ANALYZE_HEAD_BYTES = 64 * 1024
 
 class VacuumMapper:
     def __init__(self):
         # TODO: Replace with your device credentials
-        self.vacuum = tinytuya.Device(
+        self.vacuum = DeviceCommandQueue.for_device(
             dev_id="YOUR_DEVICE_ID_HERE",
             address="YOUR_VACUUM_IP_HERE",
             local_key="YOUR_LOCAL_KEY_HERE",
             version=3.3
         )
-        self.vacuum.set_socketPersistent(True)
+        self.reassembler = MapReassembler()
     
     def request_map(self, request_type="get_both"):
         """
@@ -44,11 +55,10 @@ class VacuumMapper:
                     print(f"Length: {len(str(result))}")
                     
                     if isinstance(result, str):
-                        # Try to decode base64
+                        # Try to decode base64, straight to disk
                         try:
-                            decoded = base64.b64decode(result)
-                            self.save_map_data(decoded, f'path_{dps}.bin')
-                            self.analyze_map_format(decoded)
+                            size, head = self.save_map_stream(result, f'path_{dps}.bin')
+                            self.analyze_map_head(head, size)
                         except:
                             print(f"Raw data: {result[:200]}...")
                     else:
@@ -75,14 +85,25 @@ class VacuumMapper:
                             # Try to decode
                             try:
                                 decoded = base64.b64decode(value)
-                                filename = f'map_dps_{key}_{int(time.time())}.bin'
-                                self.save_map_data(decoded, filename)
-                                self.analyze_map_format(decoded)
                             except:
                                 filename = f'map_dps_{key}_{int(time.time())}.txt'
                                 with open(filename, 'w') as f:
                                     f.write(value)
                                 print(f"Saved as text to {filename}")
+                                continue
+                            
+                            # Large maps arrive split over several pushes
+                            decoded = self.reassembler.feed(decoded)
+                            if decoded is None:
+                                print("Fragment buffered, waiting for the rest of the map")
+                                continue
+                            
+                            try:
+                                filename = f'map_dps_{key}_{int(time.time())}.bin'
+                                self.save_map_data(decoded, filename)
+                                self.analyze_map_format(decoded)
+                            except Exception as e:
+                                print(f"Analysis failed: {e}")
                 
                 time.sleep(0.5)
             except Exception as e:
@@ -95,6 +116,46 @@ class VacuumMapper:
             f.write(data)
         print(f"✓ Saved to {filename}")
     
+    def save_map_stream(self, base64_source, filename, inflate=False, head_bytes=ANALYZE_HEAD_BYTES):
+        """
+        Decode base64 map data piece by piece into a file.
+        
+        The file holds the payload exactly as the device sent it, like
+        save_map_data(); with inflate=True compressed payloads are stored
+        inflated instead (give that a different filename). Returns the size
+        written and its first head_bytes bytes, for analyze_map_head().
+        """
+        pieces = iter_payload(base64_source) if inflate else iter_b64decode(base64_source)
+        size = 0
+        head = b''
+        with open(filename, 'wb') as f:
+            for piece in pieces:
+                f.write(piece)
+                if len(head) < head_bytes:
+                    head += piece[:head_bytes - len(head)]
+                size += len(piece)
+        print(f"✓ Saved {size} bytes to {filename}")
+        return size, head
+    
+    def iter_path_points(self, base64_source, chunk_points=DEFAULT_CHUNK_POINTS):
+        """Path points as fixed-size (chunk_points, 2) int32 arrays (map_stream.iter_points)"""
+        return iter_points(base64_source, chunk_points)
+    
+    def analyze_map_head(self, head, size):
+        """Analyze a payload of size bytes from its head; only a complete payload is decoded"""
+        if len(head) >= size:
+            self.analyze_map_format(head)
+            return
+        
+        print("\n=== Map Data Analysis ===")
+        print(f"Total size: {size} bytes (analyzing the first {len(head)})")
+        print(f"Header (hex): {head[:16].hex()}")
+        fmt = detect_compression(head)
+        if fmt:
+            print(f"✓ Format: {fmt} compressed")
+        print("Too large to analyze in memory: decode the saved file with "
+              "tuya_decoder.py or map_stream.iter_points()")
+    
     def analyze_map_format(self, data):
         """Analyze map data format"""
         print("\n=== Map Data Analysis ===")
@@ -125,41 +186,39 @@ class VacuumMapper:
                 except:
                     pass
             
+            # Check for gzip/zlib - inflate in memory and analyze the contents
+            elif detect_compression(data):
+                fmt = detect_compression(data)
+                try:
+                    inflated = decompress_payload(data, fmt)
+                    print(f"✓ Format: {fmt} compressed, {len(inflated)} bytes inflated")
+                    self.analyze_map_format(inflated)
+                except Exception as e:
+                    print(f"Decompression failed: {e}")
+            
             # Check for Tuya's proprietary format
             else:
                 # Try to parse as structured data
                 try:
-                    # Common structure: [header][width][height][data]
+                    # Common structure: [header][grid bytes], layout detected from the data
                     if len(data) >= 8:
-                        width = struct.unpack('<I', data[0:4])[0]
-                        height = struct.unpack('<I', data[4:8])[0]
-                        print(f"Possible dimensions: {width}x{height}")
-                        
-                        if width < 10000 and height < 10000:  # Sanity check
-                            print("✓ Likely a bitmap grid map")
-                            self.decode_bitmap_map(data, width, height)
-                except:
-                    print("Unknown format - saved as binary")
+                        self.decode_bitmap_map(data)
+                except Exception as e:
+                    print(f"Unknown format - saved as binary ({e})")
     
-    def decode_bitmap_map(self, data, width, height):
-        """Try to decode as bitmap grid map"""
-        try:
-            # Skip header (usually 8-16 bytes)
-            offset = 16
-            map_data = data[offset:]
-            
-            expected_size = width * height
-            print(f"Expected map size: {expected_size} bytes")
-            print(f"Actual data size: {len(map_data)} bytes")
-            
-            # Save as PGM (Portable Gray Map) - ROS compatible!
-            if len(map_data) >= expected_size:
-                with open('map.pgm', 'wb') as f:
-                    f.write(f'P5\n{width} {height}\n255\n'.encode())
-                    f.write(map_data[:expected_size])
-                print("✓ Saved as map.pgm (ROS-compatible format)")
-        except Exception as e:
-            print(f"Bitmap decode failed: {e}")
+    def decode_bitmap_map(self, data):
+        """Detect the bitmap layout and save the grid as PGM"""
+        grid, layout = BitmapDecoder(data).decode()
+        if layout is None:
+            print("No plausible bitmap layout found")
+            return None
+        
+        print(f"✓ Likely a bitmap grid map: {layout.width}x{layout.height} "
+              f"(header {layout.offset} bytes, from {layout.source}, score {layout.score:.2f})")
+        
+        # Save as PGM (Portable Gray Map) - ROS compatible!
+        write_pgm(grid, 'map.pgm')
+        return grid
 
 # Usage
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+import argparse
+import contextlib
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Workers render off-screen
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from map_visualizer_v2 import TuyaRoomMapDecoder
+from tuya_decoder import TuyaMapDecoder
+
+# Files written by VacuumMapper (banthi_get_map.py)
+DEFAULT_PATTERNS = ['map_dps_*.bin', 'path_*.bin']
+DEFAULT_OUTPUT = 'batch_results.ndjson'
+
+
+def find_payloads(root, patterns=DEFAULT_PATTERNS):
+    """Walk root and yield every file matching one of the patterns"""
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if any(fnmatch.fnmatch(name, p) for p in patterns):
+                yield os.path.join(dirpath, name)
+
+
+def file_sha256(path):
+    """Content hash used to skip payloads that were already processed"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_processed(output_file):
+    """Hashes of every payload already recorded in the NDJSON output"""
+    seen = set()
+    if not os.path.exists(output_file):
+        return seen
+    with open(output_file) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'sha256' in record and 'error' not in record:
+                seen.add(record['sha256'])
+    return seen
+
+
+def process_payload(path, sha256, render_dir=None):
+    """Decode (and optionally render) one payload; runs in a worker process"""
+    record = {'file': path, 'sha256': sha256}
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        record['size'] = len(data)
+
+        # The decoders are chatty; keep their output out of the NDJSON stream
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = TuyaMapDecoder.from_bytes(data).decode()
+            room_decoder = TuyaRoomMapDecoder.from_bytes(data)
+            rooms = room_decoder.decode_rooms()
+        record['type'] = result.get('type')
+        record['points'] = result.get('point_count', 0)
+        record['rooms'] = len(rooms)
+        record['decode_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+        if render_dir and rooms:
+            render_start = time.perf_counter()
+            image = os.path.join(render_dir, os.path.basename(path) + '.png')
+            with contextlib.redirect_stdout(io.StringIO()):
+                room_decoder.visualize_rooms(rooms, output_file=image)
+            record['image'] = image
+            record['render_ms'] = round((time.perf_counter() - render_start) * 1000, 2)
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+
+    record['total_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return record
+
+
+def run_batch(root, output_file=None, render_dir=None, workers=None,
+              patterns=DEFAULT_PATTERNS, out=sys.stdout):
+    """
+    Decode every payload under root across a process pool.
+
+    Each result is written as one NDJSON line, both to out and appended to
+    output_file, as soon as its worker finishes. Payloads whose content hash
+    already appears in output_file are skipped.
+    """
+    output_file = output_file or os.path.join(root, DEFAULT_OUTPUT)
+    seen = load_processed(output_file)
+    if render_dir:
+        os.makedirs(render_dir, exist_ok=True)
+
+    summary = {'processed': 0, 'skipped': 0, 'failed': 0}
+    batch_start = time.perf_counter()
+
+    with open(output_file, 'a') as log, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for path in find_payloads(root, patterns):
+            sha256 = file_sha256(path)
+            if sha256 in seen:
+                summary['skipped'] += 1
+                continue
+            seen.add(sha256)
+            futures.append(pool.submit(process_payload, path, sha256, render_dir))
+
+        for future in as_completed(futures):
+            record = future.result()
+            line = json.dumps(record)
+            out.write(line + '\n')
+            out.flush()
+            log.write(line + '\n')
+            log.flush()
+            summary['failed' if 'error' in record else 'processed'] += 1
+
+    summary['elapsed_s'] = round(time.perf_counter() - batch_start, 2)
+    return summary
+
+
+# Usage: python batch_decode.py captures/ --render renders/ --workers 8
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-decode captured map payloads")
+    parser.add_argument('directory', help="Directory to search for captured payloads")
+    parser.add_argument('--output', help=f"NDJSON results file (default: <directory>/{DEFAULT_OUTPUT})")
+    parser.add_argument('--render', metavar='DIR', help="Render room maps as PNG into DIR")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument('--pattern', action='append',
+                        help=f"Filename glob, repeatable (default: {' '.join(DEFAULT_PATTERNS)})")
+    args = parser.parse_args()
+
+    summary = run_batch(args.directory, args.output, args.render, args.workers,
+                        args.pattern or DEFAULT_PATTERNS)
+    print(f"Processed {summary['processed']}, skipped {summary['skipped']}, "
+          f"failed {summary['failed']} in {summary['elapsed_s']}s", file=sys.stderr)
@@ -0,0 +1,247 @@
+import struct
+import sys
+
+import numpy as np
+
+# Search limits for the brute-force layout scan
+MIN_WIDTH = 16
+MAX_WIDTH = 2048
+MAX_HEADER = 64
+
+# A width must stand out from neighbouring lags by this much to count as a row period
+MIN_PROMINENCE = 0.02
+# Widths scoring within this margin of the best are treated as ties (multiples)
+WIDTH_TIE = 0.05
+
+
+class BitmapLayout:
+    """Winning bitmap layout: header offset, dimensions and score"""
+
+    def __init__(self, offset, width, height, score, source):
+        self.offset = offset
+        self.width = width
+        self.height = height
+        self.score = score
+        self.source = source
+
+    def __repr__(self):
+        return (f"BitmapLayout(offset={self.offset}, width={self.width}, "
+                f"height={self.height}, score={self.score:.3f}, source='{self.source}')")
+
+
+class BitmapDecoder:
+    """
+    Detect the layout of a raw occupancy-grid payload without rendering.
+
+    All candidate widths are scored at once from the normalized
+    autocorrelation of the byte stream (one FFT): the true row width is the
+    lag where every byte lines up with the one below it. All header offsets
+    are then scored at once by top-edge continuity: header bytes don't
+    continue into the row below them, map bytes do. Width/height fields
+    found in the header win ties, and are used on their own when the grid
+    is too smooth (or too small) for the autocorrelation to show a width.
+    """
+
+    def __init__(self, data, min_width=MIN_WIDTH, max_width=MAX_WIDTH, max_header=MAX_HEADER):
+        self.data = bytes(data)
+        self.raw = np.frombuffer(self.data, dtype=np.uint8)
+        self.min_width = min_width
+        self.max_width = max_width
+        self.max_header = max_header
+
+    def header_candidates(self):
+        """(offset, width, height) guesses from uint16/uint32 fields in the header"""
+        data = self.data
+        candidates = set()
+        for fmt in ('<HH', '>HH', '<II', '>II'):
+            size = struct.calcsize(fmt)
+            for pos in range(0, min(self.max_header, len(data) - size) + 1, 2):
+                width, height = struct.unpack_from(fmt, data, pos)
+                if not (self.min_width <= width <= self.max_width and height > 1):
+                    continue
+                if width * height > len(data):
+                    continue
+                # Grid right after the fields, or flush with the end of the payload
+                for offset in (pos + size, len(data) - width * height):
+                    if 0 <= offset <= self.max_header and offset + width * height <= len(data):
+                        candidates.add((offset, width, height))
+        return sorted(candidates)
+
+    def width_scores(self, max_lag):
+        """Score every lag in [min_width, max_lag] as a row width"""
+        x = self.raw.astype(np.float64)
+        x -= x.mean()
+        n = len(x)
+
+        n_fft = 1 << int(np.ceil(np.log2(2 * n)))
+        spectrum = np.fft.rfft(x, n=n_fft)
+        acov = np.fft.irfft(spectrum * np.conj(spectrum), n=n_fft)[:max_lag + 3]
+
+        # Unbiased estimate: lag k only has (n - k) overlapping samples
+        acov /= (n - np.arange(max_lag + 3))
+        corr = acov / (acov[0] or 1.0)
+
+        # Smooth maps correlate at every lag near the true width, so score
+        # the peak relative to its shoulders rather than its raw height
+        lags = np.arange(self.min_width, max_lag + 1)
+        peak = corr[lags]
+        prominence = peak - 0.5 * (corr[lags - 2] + corr[lags + 2])
+        return lags, np.where(prominence > MIN_PROMINENCE, peak + prominence, -np.inf)
+
+    def offset_costs(self, width):
+        """
+        Continuity cost of every header offset for a given width.
+
+        Byte k is "broken" when it differs sharply from byte k + width. The
+        header is the run of broken bytes at the start, so offset o costs
+        the continuous bytes before o plus the broken bytes in the first row.
+        """
+        limit = min(self.max_header, len(self.raw) - 2 * width)
+        if limit < 0:
+            return np.zeros(1)
+
+        x = self.raw.astype(np.int16)
+        diff = np.abs(x[:-width] - x[width:])
+        tau = max(float(np.percentile(diff, 75)), 16.0)
+        broken = (diff[:limit + width] > tau).astype(np.int64)
+
+        cum = np.r_[0, np.cumsum(broken)]
+        offsets = np.arange(limit + 1)
+        continuous_before = offsets - cum[offsets]
+        broken_in_row = cum[offsets + width] - cum[offsets]
+        return continuous_before + broken_in_row
+
+    def continuity(self, layout):
+        """1 minus the mean change between vertically adjacent bytes (0..1)"""
+        rows = self.grid(layout).astype(np.int16)
+        return 1.0 - float(np.abs(rows[1:] - rows[:-1]).mean()) / 255
+
+    def header_layout(self, full=False):
+        """
+        Best header candidate by row continuity alone, or None.
+
+        Ties go to the candidate covering more of the payload; with full,
+        only grids that run to the end of the payload are considered.
+        """
+        best = None
+        for offset, width, height in self.header_candidates():
+            if full and offset + width * height != len(self.raw):
+                continue
+            layout = BitmapLayout(offset, width, height, 0, 'header')
+            layout.score = self.continuity(layout)
+            key = (round(layout.score, 6), width * height, -offset)
+            if best is None or key > best[0]:
+                best = (key, layout)
+        return best[1] if best else None
+
+    def detect(self):
+        """Score every layout and return the best BitmapLayout (or None)"""
+        n = len(self.raw)
+        max_lag = min(self.max_width, n // 2 - 2)
+        if max_lag < self.min_width:
+            return self.header_layout()
+
+        lags, scores = self.width_scores(max_lag)
+        if not np.isfinite(scores).any():
+            # No row period stands out (smooth or near-uniform grid)
+            return self.header_layout()
+
+        # Multiples of the row width score almost as well; keep the smallest
+        good = np.flatnonzero(scores >= scores.max() - WIDTH_TIE)
+        width = int(lags[good[0]])
+        score = float(scores[good[0]])
+
+        costs = self.offset_costs(width)
+        offset = int(np.argmin(costs))
+        best = BitmapLayout(offset, width, (n - offset) // width, score, 'scan')
+
+        # Prefer explicit header dimensions when they are at least as continuous
+        for h_offset, h_width, h_height in self.header_candidates():
+            if h_width != width or h_offset >= len(costs):
+                continue
+            if costs[h_offset] <= costs[offset] + 1:
+                return BitmapLayout(h_offset, h_width, h_height, score, 'header')
+
+        # A smooth grid can peak one lag off its width; a header whose grid
+        # fills the payload and lines up at least as well wins
+        header = self.header_layout(full=True)
+        if header is not None and header.score >= self.continuity(best):
+            return header
+        return best
+
+    def grid(self, layout):
+        """Zero-copy (height, width) uint8 view of the payload"""
+        return self.raw[layout.offset:layout.offset + layout.width * layout.height] \
+            .reshape(layout.height, layout.width)
+
+    def decode(self):
+        """Detect the layout and return (grid, layout), or (None, None)"""
+        layout = self.detect()
+        if layout is None:
+            return None, None
+        return self.grid(layout), layout
+
+
+def write_pgm(grid, filename):
+    """Save a uint8 grid as binary PGM (ROS map_server compatible)"""
+    height, width = grid.shape
+    with open(filename, 'wb') as f:
+        f.write(f'P5\n{width} {height}\n255\n'.encode())
+        f.write(np.ascontiguousarray(grid, dtype=np.uint8).tobytes())
+    print(f"✓ Saved {width}x{height} grid to {filename}")
+
+
+def write_png(grid, filename):
+    """Save a uint8 grid as grayscale PNG (needs matplotlib)"""
+    import matplotlib.pyplot as plt
+    plt.imsave(filename, grid, cmap='gray', vmin=0, vmax=255)
+    print(f"✓ Saved {grid.shape[1]}x{grid.shape[0]} grid to {filename}")
+
+
+def check_header_fallback():
+    """
+    Uniform and near-uniform grids behind a correct '<II' width/height header
+    must decode with that header's layout; returns the layouts found.
+    """
+    layouts = []
+    for width, height in ((200, 150), (100, 100), (333, 120)):
+        for kind in ('uniform', 'room'):
+            # Unknown space (205) everywhere, or with one free (254) room
+            grid = np.full((height, width), 205, dtype=np.uint8)
+            if kind == 'room':
+                grid[height // 4:3 * height // 4, width // 5:4 * width // 5] = 254
+            payload = struct.pack('<II', width, height) + grid.tobytes()
+            layout = BitmapDecoder(payload).detect()
+            if layout is None or (layout.offset, layout.width, layout.height) != (8, width, height):
+                raise AssertionError(f"{width}x{height} {kind}: got {layout}")
+            layouts.append(layout)
+    return layouts
+
+
+# Usage: python bitmap_decoder.py map_dps_15_1700000000.bin [map.pgm|map.png]
+#        python bitmap_decoder.py --check    -> header fallback on smooth grids
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python bitmap_decoder.py <payload.bin> [output.pgm|output.png] | --check")
+        sys.exit(1)
+
+    if sys.argv[1] == '--check':
+        for layout in check_header_fallback():
+            print(layout)
+        print("✓ Header dimensions are used when no row width stands out")
+        sys.exit(0)
+
+    with open(sys.argv[1], 'rb') as f:
+        payload = f.read()
+
+    grid, layout = BitmapDecoder(payload).decode()
+    if layout is None:
+        print("No plausible bitmap layout found")
+        sys.exit(1)
+
+    print(f"Best layout: {layout}")
+    if len(sys.argv) > 2:
+        if sys.argv[2].endswith('.png'):
+            write_png(grid, sys.argv[2])
+        else:
+            write_pgm(grid, sys.argv[2])
@@ -0,0 +1,192 @@
+import json
+import sys
+
+import numpy as np
+
+# Coordinates outside +/-limit are not map points (same bound the old scans used)
+DEFAULT_LIMIT = 10000
+# Consecutive points are continuous when they are a short step apart in
+# any direction (a cleaning path) or a longer, axis-aligned step (a room
+# outline): at most max_step long with dx or dy within axis_tolerance
+DEFAULT_SMALL_STEP = 64
+DEFAULT_MAX_STEP = 2000
+DEFAULT_AXIS_TOLERANCE = 8
+# Shorter runs are indistinguishable from chance
+DEFAULT_MIN_POINTS = 4
+
+ENDIANS = {'little': '<i2', 'big': '>i2'}
+
+
+class CoordinateRun:
+    """A stretch of consecutive int16 (x, y) points at one byte alignment"""
+
+    def __init__(self, offset, endian, points, score):
+        self.offset = offset
+        self.endian = endian
+        self.points = points
+        self.score = score
+
+    @property
+    def end(self):
+        """Byte offset just past the run"""
+        return self.offset + 4 * len(self.points)
+
+    def __repr__(self):
+        return (f"CoordinateRun(offset={self.offset}, endian='{self.endian}', "
+                f"points={len(self.points)}, score={self.score:.2f})")
+
+
+class CoordinateScanner:
+    """
+    Find the real int16 coordinate pairs in a raw payload.
+
+    Stepping through a payload two bytes at a time and keeping every
+    in-range pair mixes real points with misaligned garbage. Instead, the
+    int16 at every byte offset is decoded at once for both byte orders, and
+    every point (x at o, y at o + 2) is checked against the next one at
+    o + 4: both in bounds and a continuous step (shorter than small_step in
+    any direction, or up to max_step along an axis).
+
+    Consecutive plausible steps form runs along each of the 8 alignments
+    (4 byte phases x 2 byte orders). Real data gives long runs at one
+    alignment; garbage breaks up within a step or two.
+    """
+
+    def __init__(self, data, limit=DEFAULT_LIMIT, small_step=DEFAULT_SMALL_STEP,
+                 max_step=DEFAULT_MAX_STEP, axis_tolerance=DEFAULT_AXIS_TOLERANCE,
+                 min_points=DEFAULT_MIN_POINTS):
+        self.raw = np.frombuffer(bytes(data), dtype=np.uint8)
+        self.limit = limit
+        self.small_step = small_step
+        self.max_step = max_step
+        self.axis_tolerance = axis_tolerance
+        self.min_points = min_points
+
+    def values(self, endian):
+        """int16 starting at every byte offset (len(data) - 1 values)"""
+        if len(self.raw) < 2:
+            return np.empty(0, dtype=np.int32)
+        pairs = np.lib.stride_tricks.sliding_window_view(self.raw, 2)
+        return np.ascontiguousarray(pairs).view(ENDIANS[endian]).ravel().astype(np.int32)
+
+    def step_ok(self, endian):
+        """good[o]: point at byte o and point at o + 4 are a plausible step"""
+        v = self.values(endian)
+        if len(v) < 7:
+            return np.zeros(0, dtype=bool)
+        x, y = v[:-2], v[2:]
+        inside = (np.abs(x) < self.limit) & (np.abs(y) < self.limit)
+        dx = np.abs(x[4:] - x[:-4])
+        dy = np.abs(y[4:] - y[:-4])
+        longest = np.maximum(dx, dy)
+        along_axis = (np.minimum(dx, dy) <= self.axis_tolerance) & (longest <= self.max_step)
+        return inside[:-4] & inside[4:] & ((longest <= self.small_step) | along_axis)
+
+    def candidates(self):
+        """Per alignment: (endian, phase, fraction of plausible steps, longest run in points)"""
+        rows = []
+        for endian in ENDIANS:
+            good = self.step_ok(endian)
+            for phase in range(4):
+                chain = good[phase::4]
+                starts, ends = _true_runs(chain)
+                # A run of k plausible steps joins k + 1 points
+                longest = int((ends - starts).max()) + 2 if len(starts) else 0
+                rows.append((endian, phase, float(chain.mean()) if len(chain) else 0.0, longest))
+        return rows
+
+    def all_runs(self):
+        """Every run of at least min_points points, at any alignment (may overlap)"""
+        runs = []
+        for endian in ENDIANS:
+            good = self.step_ok(endian)
+            if not len(good):
+                continue
+            v = self.values(endian)
+            for phase in range(4):
+                chain = good[phase::4]
+                starts, ends = _true_runs(chain)
+                # Steps start..end join the points start..end + 1
+                keep = ends - starts + 2 >= self.min_points
+                for start, end in zip(starts[keep], ends[keep]):
+                    offsets = phase + 4 * np.arange(start, end + 2)
+                    points = np.stack([v[offsets], v[offsets + 2]], axis=1)
+                    runs.append(CoordinateRun(int(offsets[0]), endian, points,
+                                              _run_score(points)))
+        return runs
+
+    def runs(self):
+        """
+        Non-overlapping runs, best first claimed, returned in payload order.
+
+        Records with short headers between them shift the alignment from
+        one record to the next, so a payload can hold real runs at several
+        phases; a byte only ever belongs to one run.
+        """
+        runs = sorted(self.all_runs(), key=lambda run: (len(run.points), run.score), reverse=True)
+        if not runs:
+            return []
+        endian = runs[0].endian
+        taken = np.zeros(len(self.raw), dtype=bool)
+        chosen = []
+        for run in runs:
+            # A payload uses one byte order throughout
+            if run.endian != endian or taken[run.offset:run.end].any():
+                continue
+            taken[run.offset:run.end] = True
+            chosen.append(run)
+        return sorted(chosen, key=lambda run: run.offset)
+
+    def best_run(self):
+        """Longest plausible run, or None"""
+        runs = self.all_runs()
+        if not runs:
+            return None
+        return max(runs, key=lambda run: (len(run.points), run.score))
+
+    def points(self):
+        """
+        (N, 2) int32 array of every point in runs(), in payload order.
+
+        The runs are joined end to end, so this is a point cloud, not a
+        path: draw or simplify each of runs() on its own instead.
+        """
+        runs = self.runs()
+        if not runs:
+            return np.empty((0, 2), dtype=np.int32)
+        return np.concatenate([run.points for run in runs])
+
+
+def _true_runs(mask):
+    """Start and end (inclusive) indices of each run of True in a 1-D mask"""
+    edges = np.diff(np.r_[0, mask.astype(np.int8), 0])
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+
+def _run_score(points):
+    """Share of steps along an axis (dx or dy == 0): 1.0 for room outlines"""
+    steps = np.abs(np.diff(points, axis=0))
+    return float(np.mean(steps.min(axis=1) == 0)) if len(steps) else 0.0
+
+
+# Usage: python coord_scan.py map_raw.bin [coords.json]
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python coord_scan.py <payload.bin> [output.json]")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'rb') as f:
+        scanner = CoordinateScanner(f.read())
+
+    for endian, phase, fraction, longest in scanner.candidates():
+        print(f"{endian:>6} phase {phase}: {fraction:6.1%} plausible steps, longest run {longest}")
+    runs = scanner.runs()
+    for run in runs:
+        print(run)
+    print(f"{sum(len(run.points) for run in runs)} points in {len(runs)} runs")
+    best = scanner.best_run()
+    if len(sys.argv) > 2 and best is not None:
+        # One polyline per file: the best-aligned run
+        with open(sys.argv[2], 'w') as f:
+            json.dump(best.points.tolist(), f, indent=2)
+        print(f"✓ Saved to {sys.argv[2]}")
@@ -0,0 +1,297 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+
+from map_tiles import encode_png, sample_segments
+from path_codec import PathArchive, load_json_points
+
+# Grid in the dock-origin frame from docs/PROTOCOL.md: the dock is (0, 0),
+# units are mm and paths stay within roughly +/-10 m
+DEFAULT_EXTENT_MM = 12800
+DEFAULT_CELL_MM = 50
+# Width of floor one pass cleans (main brush)
+DEFAULT_BRUSH_MM = 150
+# Half-life of the time-decayed layer
+DEFAULT_HALF_LIFE_DAYS = 7.0
+DEFAULT_ROOT = 'heatmaps'
+
+# Layers, each an .npy file memory-mapped with np.lib.format.open_memmap
+COUNTS_FILE = 'counts.npy'          # uint32 passes per cell, all time
+LAST_SEEN_FILE = 'last_seen.npy'    # uint32 epoch seconds of the last pass
+DECAYED_FILE = 'decayed.npy'        # float32 passes, decayed to meta['decay_time']
+META_FILE = 'meta.json'
+# Content hashes of the paths already added, so re-adding is a no-op
+MAX_SESSIONS = 4096
+
+DAY = 86400.0
+
+
+class CoverageHeatmap:
+    """
+    Persistent per-device count of how often each patch of floor was cleaned.
+
+    The grid covers [-extent_mm, extent_mm) on both axes in cells of
+    cell_mm; grid[row, col] is the square starting at
+    (-extent_mm + col * cell_mm, -extent_mm + row * cell_mm). Layers are
+    .npy files opened as memory maps, so only touched pages are read and
+    updates land on disk without rewriting the grid.
+
+    add_path() rasterizes a whole session's path in one vectorized pass:
+    each cell counts once per contiguous visit of the brush, so a cell
+    swept twice gets 2 however densely the path was sampled.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.cell_mm = self.meta['cell_mm']
+        self.extent_mm = self.meta['extent_mm']
+        self.half_life = self.meta['half_life_days'] * DAY
+        self.counts = np.lib.format.open_memmap(os.path.join(directory, COUNTS_FILE), mode='r+')
+        self.last_seen = np.lib.format.open_memmap(os.path.join(directory, LAST_SEEN_FILE), mode='r+')
+        self.decayed = np.lib.format.open_memmap(os.path.join(directory, DECAYED_FILE), mode='r+')
+
+    @classmethod
+    def open(cls, device_id, root=DEFAULT_ROOT, extent_mm=DEFAULT_EXTENT_MM,
+             cell_mm=DEFAULT_CELL_MM, brush_mm=DEFAULT_BRUSH_MM,
+             half_life_days=DEFAULT_HALF_LIFE_DAYS):
+        """Open the heatmap of one device, creating it on first use"""
+        directory = os.path.join(root, str(device_id))
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            os.makedirs(directory, exist_ok=True)
+            side = int(np.ceil(2 * extent_mm / cell_mm))
+            for name, dtype in ((COUNTS_FILE, np.uint32), (LAST_SEEN_FILE, np.uint32),
+                                (DECAYED_FILE, np.float32)):
+                grid = np.lib.format.open_memmap(os.path.join(directory, name), mode='w+',
+                                                 dtype=dtype, shape=(side, side))
+                grid.flush()
+                del grid
+            meta = {'device_id': str(device_id), 'extent_mm': extent_mm, 'cell_mm': cell_mm,
+                    'brush_mm': brush_mm, 'half_life_days': half_life_days,
+                    'decay_time': 0, 'sessions': [], 'points_outside': 0}
+            with open(os.path.join(directory, META_FILE), 'w') as f:
+                json.dump(meta, f, indent=2)
+        return cls(directory)
+
+    @property
+    def shape(self):
+        return self.counts.shape
+
+    def _save_meta(self):
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def path_cells(self, points):
+        """Flat indices of the cells a path cleans, one entry per pass"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 1:
+            points = np.repeat(points, 2, axis=0)
+        if len(points) < 2:
+            return np.empty(0, dtype=np.int64), 0
+
+        samples = sample_segments(points[:-1], points[1:], self.cell_mm / 2)
+        centre = np.floor((samples + self.extent_mm) / self.cell_mm).astype(np.int64)
+
+        # Widen to the brush: every cell within brush/2 of the centre line
+        radius = self.meta['brush_mm'] / 2 / self.cell_mm
+        reach = int(np.ceil(radius))
+        dr, dc = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+        disc = dr ** 2 + dc ** 2 <= radius ** 2
+        disc[reach, reach] = True
+        dr, dc = dr[disc], dc[disc]
+
+        # A cell's visit starts at the first sample whose brush covers it:
+        # offset (dr, dc) from this sample's cell is new unless it lies in
+        # the disc around the previous sample's cell. Counting visits
+        # rather than segments keeps sampling density out of the counts.
+        step = np.diff(centre, axis=0, prepend=centre[:1] + 2 * reach + 1)
+        prev_r = dr[None, :] + step[:, 1:2]
+        prev_c = dc[None, :] + step[:, 0:1]
+        near = (np.abs(prev_r) <= reach) & (np.abs(prev_c) <= reach)
+        covered = np.zeros_like(near)
+        covered[near] = disc[prev_r[near] + reach, prev_c[near] + reach]
+        rows = (centre[:, 1:2] + dr)[~covered]
+        cols = (centre[:, 0:1] + dc)[~covered]
+
+        side = self.shape[0]
+        inside = (rows >= 0) & (rows < side) & (cols >= 0) & (cols < side)
+        outside = int(np.count_nonzero(
+            (np.abs(points) >= self.extent_mm).any(axis=1)))
+        return rows[inside] * side + cols[inside], outside
+
+    def add_path(self, points, timestamp=None, session_id=None):
+        """
+        Accumulate one session's path; returns the number of cells touched.
+
+        session_id defaults to a hash of the points; a session that was
+        already added is skipped (returns 0).
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if session_id is None:
+            session_id = hashlib.sha256(np.round(points).astype(np.int32).tobytes()).hexdigest()
+        if session_id in self.meta['sessions']:
+            return 0
+        timestamp = time.time() if timestamp is None else timestamp
+
+        cells, outside = self.path_cells(points)
+        index, passes = np.unique(cells, return_counts=True)
+
+        counts = self.counts.reshape(-1)
+        counts[index] += passes.astype(np.uint32)
+        last_seen = self.last_seen.reshape(-1)
+        last_seen[index] = np.maximum(last_seen[index], np.uint32(timestamp))
+
+        # Bring the decayed layer to this session's time, then add it
+        decay_time = self.meta['decay_time']
+        if timestamp >= decay_time:
+            if decay_time:
+                self.decayed *= np.float32(0.5 ** ((timestamp - decay_time) / self.half_life))
+            self.meta['decay_time'] = timestamp
+            weights = passes
+        else:
+            # Older session added late: weight it as already decayed
+            weights = passes * 0.5 ** ((decay_time - timestamp) / self.half_life)
+        decayed = self.decayed.reshape(-1)
+        decayed[index] += weights.astype(np.float32)
+
+        self.counts.flush()
+        self.last_seen.flush()
+        self.decayed.flush()
+        self.meta['sessions'] = (self.meta['sessions'] + [session_id])[-MAX_SESSIONS:]
+        self.meta['points_outside'] += outside
+        self._save_meta()
+        return len(index)
+
+    def decayed_view(self, now=None):
+        """Passes per cell with older sessions faded by the half-life"""
+        now = time.time() if now is None else now
+        age = max(now - self.meta['decay_time'], 0)
+        return self.decayed * np.float32(0.5 ** (age / self.half_life))
+
+    def not_cleaned_since(self, days, now=None):
+        """Mask of visited cells whose last pass is older than days"""
+        now = time.time() if now is None else now
+        return (self.counts > 0) & (self.last_seen < now - days * DAY)
+
+    def coverage(self, decayed=False, now=None):
+        """(grid, x0, y0, cell_mm) for map_tiles.TileRenderer(coverage=...)"""
+        grid = self.decayed_view(now) if decayed else self.counts
+        return grid, -self.extent_mm, -self.extent_mm, self.cell_mm
+
+    def stats(self):
+        visited = self.counts > 0
+        return {
+            'sessions': len(self.meta['sessions']),
+            'cells_visited': int(np.count_nonzero(visited)),
+            'area_m2': round(float(np.count_nonzero(visited)) * self.cell_mm ** 2 / 1e6, 2),
+            'max_passes': int(self.counts.max()),
+            'points_outside': self.meta['points_outside'],
+        }
+
+    def heat_image(self, decayed=False, now=None, crop=True):
+        """RGBA uint8 heat image (north up), log-scaled, optionally cropped to visited cells"""
+        grid = np.asarray(self.decayed_view(now) if decayed else self.counts, dtype=np.float32)
+        rows, cols = np.nonzero(grid)
+        if crop and len(rows):
+            grid = grid[rows.min():rows.max() + 1, cols.min():cols.max() + 1]
+
+        heat = np.log1p(grid)
+        peak = heat.max()
+        if peak > 0:
+            heat /= peak
+
+        # Yellow (rare) to red (often); unvisited cells stay transparent
+        image = np.zeros(grid.shape + (4,), dtype=np.uint8)
+        image[..., 0] = 255
+        image[..., 1] = (220 * (1 - heat)).astype(np.uint8)
+        image[..., 3] = np.where(grid > 0, (80 + 175 * heat).astype(np.uint8), 0)
+        return image[::-1]
+
+    def export_png(self, filename, decayed=False, now=None):
+        """Write the heat image as PNG"""
+        image = self.heat_image(decayed, now)
+        with open(filename, 'wb') as f:
+            f.write(encode_png(image))
+        print(f"✓ Saved {image.shape[1]}x{image.shape[0]} heatmap to {filename}")
+
+
+def load_path(filename):
+    """Path points from .json (map_coords / map_decoded), .vpath or a raw .bin payload"""
+    ext = os.path.splitext(filename)[1]
+    if ext == '.json':
+        return load_json_points(filename)
+    if ext == '.vpath':
+        with PathArchive(filename) as archive:
+            return archive.read_all()
+
+    from tuya_decoder import TuyaMapDecoder
+    with open(filename, 'rb') as f:
+        data = f.read()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = TuyaMapDecoder.from_bytes(data).decode()
+    return result.get('payload', result).get('coordinates', [])
+
+
+def check_sampling_density(length_mm=3000, dense_step_mm=10):
+    """
+    max_passes of one straight pass (and of a there-and-back pass) must not
+    depend on how densely the path is sampled; returns the stats compared.
+    """
+    import tempfile
+
+    results = {}
+    for shape, waypoints in (('straight', [0, length_mm]), ('back_and_forth', [0, length_mm, 0])):
+        for sampling in ('sparse', 'dense'):
+            xs = np.asarray(waypoints, dtype=np.float64)
+            if sampling == 'dense':
+                pieces = [np.arange(a, b, dense_step_mm if b > a else -dense_step_mm)
+                          for a, b in zip(xs[:-1], xs[1:])]
+                xs = np.r_[np.concatenate(pieces), xs[-1]]
+            path = np.column_stack([xs - length_mm / 2, np.full(len(xs), 7.0)])
+            with tempfile.TemporaryDirectory() as root:
+                heatmap = CoverageHeatmap.open('check', root)
+                heatmap.add_path(path, timestamp=1)
+                results[shape, sampling] = (heatmap.stats()['max_passes'],
+                                            heatmap.stats()['cells_visited'])
+        if results[shape, 'sparse'] != results[shape, 'dense']:
+            raise AssertionError(f"{shape}: sparse {results[shape, 'sparse']} != "
+                                 f"dense {results[shape, 'dense']} (max_passes, cells)")
+    return results
+
+
+# Usage: python coverage_heatmap.py add path_107_*.bin --device abc123
+#        python coverage_heatmap.py export heat.png --device abc123 [--decayed]
+#        python coverage_heatmap.py check    -> pass counts don't depend on sampling density
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-session cleaning coverage heatmap")
+    parser.add_argument('command', choices=['add', 'export', 'stats', 'check'])
+    parser.add_argument('files', nargs='*', help="add: path files; export: output PNG")
+    parser.add_argument('--device', default='default', help="Device id (one heatmap per device)")
+    parser.add_argument('--root', default=DEFAULT_ROOT, help=f"Heatmap directory (default: {DEFAULT_ROOT})")
+    parser.add_argument('--decayed', action='store_true', help="Export the time-decayed view")
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        for (shape, sampling), (max_passes, cells) in check_sampling_density().items():
+            print(f"{shape:<15} {sampling:<7} max_passes {max_passes}, {cells} cells")
+        print("✓ Pass counts don't depend on sampling density")
+        raise SystemExit(0)
+
+    heatmap = CoverageHeatmap.open(args.device, args.root)
+    if args.command == 'add':
+        for filename in args.files:
+            # A capture's modification time is when that session happened
+            cells = heatmap.add_path(load_path(filename), timestamp=os.path.getmtime(filename))
+            print(f"{filename}: {cells} cells" if cells else f"{filename}: already added")
+    elif args.command == 'export':
+        heatmap.export_png(args.files[0] if args.files else 'coverage_heatmap.png', args.decayed)
+    print(json.dumps(heatmap.stats()))
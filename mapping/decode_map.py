@@ -2,6 +2,10 @@ import base64
 import struct
 import json
 
+from coord_scan import CoordinateScanner
+from map_export import export_npz
+from path_simplify import simplify_path, format_report, DEFAULT_TOLERANCE_MM
+
 # The map data from DPS 15
 map_data_b64 = 'qgABFxeqAAMpAQAqqgBcGwUABAEWAzIDlQMyA5UB2AEWAdgABAW+ArAHIAKwByAAxAW+AMQABP4q/+UAQP/lAED+vf4q/r0ABP+1/KECivyhAor6Bf+1+gUABADk/vUBrv71Aa7+KgDk/iqQqgACEwATqgADFQEAFg=='
 
@@ -46,28 +50,29 @@ print("\nSearching for patterns...")
 # Convert to hex string for pattern matching
 hex_data = decoded.hex()
 
-# Look for coordinate patterns (int16 or int32 values)
+# Look for coordinate patterns: score every int16 alignment and byte order
+# at once and keep only the runs of plausible, continuous points. Separate
+# runs are separate shapes, so only the best-aligned one is exported
 print("\nAttempting to extract coordinates...")
-coords = []
-for i in range(0, len(decoded) - 3, 2):
-    try:
-        x = struct.unpack('<h', decoded[i:i+2])[0]  # signed int16
-        y = struct.unpack('<h', decoded[i+2:i+4])[0]
-        
-        # Sanity check: coordinates usually in range -10000 to 10000
-        if -10000 < x < 10000 and -10000 < y < 10000:
-            coords.append((x, y))
-    except:
-        pass
+scanner = CoordinateScanner(decoded)
+for run in scanner.runs():
+    print(f"  {run}")
+best = scanner.best_run()
+coords = [tuple(point) for point in best.points.tolist()] if best is not None else []
 
 if coords:
     print(f"Found {len(coords)} potential coordinate pairs")
     print(f"Sample coordinates: {coords[:10]}")
     
+    # Simplify before export so long sessions don't produce huge files
+    simplified, report = simplify_path(coords, DEFAULT_TOLERANCE_MM)
+    print(format_report(report))
+    
     # Save as JSON for visualization
     with open('map_coords.json', 'w') as f:
-        json.dump(coords, f, indent=2)
+        json.dump(simplified.astype(int).tolist(), f, indent=2)
     print("✓ Saved to map_coords.json")
+    export_npz('map_coords.npz', coordinates=simplified, fmt='coords')
 
 # Try to identify sections
 print("\n" + "="*60)
@@ -1,21 +1,37 @@
-import tinytuya
+import os
+import sys
 import base64
 import json
 import time
+import multiprocessing
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 import matplotlib.patches as patches
 
+# Device access goes through the shared command queue in control/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'control'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from command_queue import DeviceCommandQueue
+from poll_scheduler import interval_for
+from tracing import span, traced
+
+from map_reassembly import MapReassembler
+from map_visualizer_v2 import TuyaRoomMapDecoder
+from shared_arrays import SharedArrayPublisher, SharedArrayReader, rooms_to_array, DEFAULT_CHANNEL
+
+# How often the render process checks shared memory for a new version (ms)
+SHARED_POLL_MS = 500
+
 class LiveMapMonitor:
     def __init__(self):
-        self.vacuum = tinytuya.Device(
+        self.vacuum = DeviceCommandQueue.for_device(
             dev_id="YOUR_DEVICE_ID_HERE",
             address="YOUR_VACUUM_IP_HERE",
             local_key="YOUR_LOCAL_KEY_HERE",
             version=3.3
         )
-        self.vacuum.set_socketPersistent(True)
         self.current_map = None
+        self.reassembler = MapReassembler()
         
     def request_full_map(self):
         """Request the complete map data"""
@@ -43,7 +59,15 @@ class LiveMapMonitor:
     def decode_map_data(self, base64_data):
         """Decode map data into rooms"""
         try:
-            data = base64.b64decode(base64_data)
+            return self.decode_map_bytes(base64.b64decode(base64_data))
+        except Exception as e:
+            print(f"Decode error: {e}")
+            return []
+    
+    @traced()
+    def decode_map_bytes(self, data):
+        """Decode a complete binary map payload into rooms"""
+        try:
             offset = 3  # Skip header
             
             rooms = []
@@ -84,52 +108,123 @@ class LiveMapMonitor:
         
         def update(frame):
             # Get current status
-            status = self.vacuum.status()
+            with span('map.fetch'):
+                status = self.vacuum.status()
             
             if 'dps' in status:
+                # Poll fast while cleaning, slowly while docked
+                ani.event_source.interval = 1000 * interval_for(
+                    status['dps'].get('5'), status['dps'].get('26'))
+
                 # Check for map data
                 if '15' in status['dps']:
-                    map_data = status['dps']['15']
-                    rooms = self.decode_map_data(map_data)
+                    with span('map.base64_decode', chars=len(status['dps']['15'])):
+                        push = base64.b64decode(status['dps']['15'])
+                    # Only decode once every fragment of a map has arrived
+                    payload = self.reassembler.feed(push)
+                    if payload is not None:
+                        self.current_map = self.decode_map_bytes(payload)
+                    rooms = self.current_map
                     
                     if rooms:
-                        ax.clear()
-                        
-                        # Plot rooms
-                        for room in rooms:
-                            width = room['max_x'] - room['min_x']
-                            height = room['max_y'] - room['min_y']
-                            
-                            rect = patches.Rectangle(
-                                (room['min_x'], room['min_y']),
-                                width, height,
-                                linewidth=2,
-                                edgecolor='blue',
-                                facecolor='lightblue',
-                                alpha=0.3
-                            )
-                            ax.add_patch(rect)
-                        
-                        # Show vacuum position if available
-                        vac_status = status['dps'].get('5', 'unknown')
-                        battery = status['dps'].get('26', 0)
-                        
-                        ax.set_title(f'Vacuum Map - Status: {vac_status} | Battery: {battery}%', 
-                                   fontweight='bold')
-                        ax.set_xlabel('X coordinate')
-                        ax.set_ylabel('Y coordinate')
-                        ax.grid(True, alpha=0.3)
-                        ax.set_aspect('equal')
+                        draw_rooms(ax, rooms_to_array(rooms), status['dps'].get('5', 'unknown'),
+                                   status['dps'].get('26', 0))
         
-        ani = FuncAnimation(fig, update, interval=2000)  # Update every 2 seconds
+        # First update after 2 seconds; update() then adapts the interval
+        ani = FuncAnimation(fig, update, interval=2000)
         plt.show()
 
+    def run_decoder(self, channel=DEFAULT_CHANNEL, stop=None):
+        """Poll and decode, publishing each new map or status to shared memory until stop is set"""
+        stop = stop or multiprocessing.Event()
+        published = None
+        with SharedArrayPublisher(channel) as publisher:
+            while not stop.is_set():
+                with span('map.fetch'):
+                    status = self.vacuum.status()
+                dps = status.get('dps', {}) if isinstance(status, dict) else {}
+                if '15' in dps:
+                    payload = self.reassembler.feed(base64.b64decode(dps['15']))
+                    if payload is not None:
+                        self.current_map = self.decode_map_bytes(payload)
+                state = (dps.get('5', 'unknown'), dps.get('26', 0))
+                if self.current_map and (published is None or published != (state, self.current_map)):
+                    with span('map.publish', rooms=len(self.current_map)):
+                        publisher.publish(meta={'status': state[0], 'battery': state[1]},
+                                          rooms=rooms_to_array(self.current_map))
+                    published = (state, self.current_map)
+                stop.wait(interval_for(dps.get('5'), dps.get('26')))
+
+
+def draw_rooms(ax, rooms, vac_status, battery):
+    """Draw rooms_to_array() rows (id, min_x, min_y, max_x, max_y)"""
+    with span('map.render', rooms=len(rooms)):
+        ax.clear()
+        
+        # Plot rooms
+        for _, min_x, min_y, max_x, max_y in rooms.tolist():
+            rect = patches.Rectangle(
+                (min_x, min_y),
+                max_x - min_x, max_y - min_y,
+                linewidth=2,
+                edgecolor='blue',
+                facecolor='lightblue',
+                alpha=0.3
+            )
+            ax.add_patch(rect)
+        
+        ax.set_title(f'Vacuum Map - Status: {vac_status} | Battery: {battery}%', 
+                   fontweight='bold')
+        ax.set_xlabel('X coordinate')
+        ax.set_ylabel('Y coordinate')
+        ax.grid(True, alpha=0.3)
+        ax.set_aspect('equal')
+
+
+def _decoder_process(channel, stop):
+    LiveMapMonitor().run_decoder(channel, stop)
+
+
+def monitor_shared(channel=DEFAULT_CHANNEL):
+    """
+    Live monitor with device polling and decoding in a separate process.
+
+    The decoder publishes room arrays through shared memory; this process
+    attaches to them without copying and only redraws when a new version
+    has been published, so the window stays responsive while decoding.
+    """
+    stop = multiprocessing.Event()
+    decoder = multiprocessing.Process(target=_decoder_process, args=(channel, stop), daemon=True)
+    decoder.start()
+    reader = SharedArrayReader(channel)
+    fig, ax = plt.subplots(figsize=(10, 10))
+    
+    def update(frame):
+        arrays = reader.poll()
+        if arrays is None:
+            # Same version as on screen: nothing to redraw
+            return
+        draw_rooms(ax, arrays['rooms'], reader.meta.get('status', 'unknown'),
+                   reader.meta.get('battery', 0))
+    
+    ani = FuncAnimation(fig, update, interval=SHARED_POLL_MS, cache_frame_data=False)
+    try:
+        plt.show()
+    finally:
+        # Let the decoder remove its shared memory before it exits
+        stop.set()
+        decoder.join(5)
+        if decoder.is_alive():
+            decoder.terminate()
+        reader.close()
+
 # Usage
 if __name__ == "__main__":
     print("Choose an option:")
     print("1. Decode current map data")
     print("2. Request and decode full map")
     print("3. Live monitor (experimental)")
+    print("4. Live monitor, decoding in a separate process")
     
     choice = input("Choice: ").strip()
     
@@ -151,3 +246,6 @@ if __name__ == "__main__":
     elif choice == "3":
         monitor = LiveMapMonitor()
         monitor.monitor_and_visualize()
+    
+    elif choice == "4":
+        monitor_shared()
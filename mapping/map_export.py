@@ -0,0 +1,190 @@
+import json
+import os
+import struct
+import sys
+import zipfile
+
+import numpy as np
+
+# Column names inside the .npz container
+PATH_COLUMN = 'path_xy'
+META_PREFIX = 'meta.'
+FORMAT_KEY = 'format'
+
+# zip local file header: signature ... name length, extra length
+ZIP_LOCAL_HEADER = struct.Struct('<4s22xHH')
+
+
+def _flatten(value, prefix, out):
+    """Flatten nested metadata into typed arrays keyed by dotted names"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(item, f"{prefix}{key}.", out)
+    elif value is not None:
+        out[prefix[:-1]] = np.asarray(value)
+
+
+def _unflatten(columns):
+    nested = {}
+    for key, array in columns.items():
+        parts = key.split('.')
+        node = nested
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = array.item() if array.ndim == 0 else array.tolist()
+    return nested
+
+
+def rooms_to_columns(rooms):
+    """Turn the decoders' list of room dicts into typed column arrays"""
+    bounds = [r['bounds'] for r in rooms]
+    return {
+        'room_id': np.array([r['id'] for r in rooms], dtype=np.int32),
+        'room_type': np.array([r.get('type', 'rectangle') for r in rooms], dtype='U16'),
+        'room_min_x': np.array([b['min_x'] for b in bounds], dtype=np.int32),
+        'room_max_x': np.array([b['max_x'] for b in bounds], dtype=np.int32),
+        'room_min_y': np.array([b['min_y'] for b in bounds], dtype=np.int32),
+        'room_max_y': np.array([b['max_y'] for b in bounds], dtype=np.int32),
+        'room_area': np.array([r['area'] for r in rooms], dtype=np.int64),
+        'room_corners': np.array([r['corners'] for r in rooms], dtype=np.int16).reshape(-1, 4, 2),
+    }
+
+
+def columns_to_rooms(columns):
+    """Rebuild room dicts (as produced by decode_rooms()) from columns"""
+    rooms = []
+    for i in range(len(columns['room_id'])):
+        rooms.append({
+            'id': int(columns['room_id'][i]),
+            'type': str(columns['room_type'][i]),
+            'bounds': {
+                'min_x': int(columns['room_min_x'][i]),
+                'max_x': int(columns['room_max_x'][i]),
+                'min_y': int(columns['room_min_y'][i]),
+                'max_y': int(columns['room_max_y'][i]),
+            },
+            'corners': np.asarray(columns['room_corners'][i]).tolist(),
+            'area': int(columns['room_area'][i]),
+        })
+    return rooms
+
+
+def export_npz(filename, coordinates=None, rooms=None, metadata=None, fmt='map'):
+    """
+    Save decoded map data as typed columns in an uncompressed .npz.
+
+    Members are stored uncompressed so load_columns() can memory-map them
+    straight out of the zip.
+
+    Args:
+        coordinates: (N, 2) path points (int16 range).
+        rooms: Room dicts from TuyaRoomMapDecoder.decode_rooms().
+        metadata: Dict of scalars (nested dicts are flattened).
+        fmt: Label of the JSON layout this came from, used by to_json().
+    """
+    columns = {FORMAT_KEY: np.asarray(fmt)}
+    if coordinates is not None:
+        columns[PATH_COLUMN] = np.asarray(coordinates, dtype=np.int16).reshape(-1, 2)
+    if rooms is not None:
+        columns.update(rooms_to_columns(rooms))
+    if metadata:
+        flat = {}
+        _flatten(metadata, '', flat)
+        columns.update({META_PREFIX + k: v for k, v in flat.items()})
+
+    np.savez(filename, **columns)
+    print(f"✓ Saved {len(columns)} columns to {filename}")
+
+
+def _read_npy_header(f, info):
+    """Skip a stored member's zip and .npy headers; returns (shape, fortran, dtype)"""
+    f.seek(info.header_offset)
+    signature, name_len, extra_len = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+    if signature != b'PK\x03\x04':
+        raise ValueError(f"Bad zip header for {info.filename}")
+    f.seek(name_len + extra_len, os.SEEK_CUR)
+
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    return np.lib.format.read_array_header_2_0(f)
+
+
+def load_columns(filename, mmap=True):
+    """
+    Load every column of an export_npz() file.
+
+    With mmap=True, array columns are np.memmap views into the file, so
+    nothing is read until it is touched. Scalars and compressed members
+    are read normally.
+    """
+    columns = {}
+    with zipfile.ZipFile(filename) as archive, open(filename, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if mmap and info.compress_type == zipfile.ZIP_STORED:
+                shape, fortran, dtype = _read_npy_header(f, info)
+                if shape and int(np.prod(shape)) > 0 and not dtype.hasobject:
+                    columns[name] = np.memmap(filename, dtype=dtype, mode='r', shape=shape,
+                                              order='F' if fortran else 'C', offset=f.tell())
+                    continue
+            with archive.open(info) as member:
+                columns[name] = np.lib.format.read_array(member)
+    return columns
+
+
+def from_json(json_file, npz_file):
+    """Convert map_coords.json, map_decoded.json or rooms_decoded.json to .npz"""
+    with open(json_file) as f:
+        data = json.load(f)
+
+    if isinstance(data, list):
+        export_npz(npz_file, coordinates=data, fmt='coords')
+        return
+
+    metadata = {k: v for k, v in data.items() if k not in ('coordinates', 'rooms')}
+    if 'rooms' in data:
+        export_npz(npz_file, rooms=data['rooms'], metadata=metadata, fmt='rooms')
+    else:
+        export_npz(npz_file, coordinates=data.get('coordinates'), metadata=metadata, fmt='map')
+
+
+def to_json(npz_file, json_file=None):
+    """Rebuild the original JSON layout from a .npz; returns the object"""
+    columns = load_columns(npz_file)
+    fmt = str(columns.get(FORMAT_KEY, np.asarray('map')))
+    meta = _unflatten({k[len(META_PREFIX):]: v for k, v in columns.items()
+                       if k.startswith(META_PREFIX)})
+
+    if fmt == 'coords':
+        data = np.asarray(columns[PATH_COLUMN]).tolist()
+    elif fmt == 'rooms':
+        data = dict(meta)
+        data['rooms'] = columns_to_rooms(columns) if 'room_id' in columns else []
+    else:
+        data = dict(meta)
+        if PATH_COLUMN in columns:
+            data['coordinates'] = np.asarray(columns[PATH_COLUMN]).tolist()
+
+    if json_file:
+        with open(json_file, 'w') as f:
+            json.dump(data, f, indent=2)
+        print(f"✓ Saved to {json_file}")
+    return data
+
+
+# Usage: python map_export.py map_decoded.json       -> map_decoded.npz
+#        python map_export.py map_decoded.npz        -> map_decoded.json
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python map_export.py <file.json|file.npz> [output]")
+        sys.exit(1)
+
+    source = sys.argv[1]
+    base, ext = os.path.splitext(source)
+    if ext == '.npz':
+        to_json(source, sys.argv[2] if len(sys.argv) > 2 else base + '.json')
+    else:
+        target = sys.argv[2] if len(sys.argv) > 2 else base + '.npz'
+        from_json(source, target)
+        print(f"JSON: {os.path.getsize(source)} bytes, NPZ: {os.path.getsize(target)} bytes")
@@ -0,0 +1,172 @@
+import struct
+import time
+import zlib
+from collections import OrderedDict
+
+# Multi-part map header (big-endian, like the AA 00 map frames):
+#   magic     b'\xaa\x01'  (single-push maps start with b'\xaa\x00')
+#   map_id    uint16       same for every fragment of one map
+#   seq       uint16       fragment number, 0-based
+#   count     uint16       total fragments in this map
+#   total_len uint32       size of the reassembled payload
+#   offset    uint32       where this fragment's bytes go
+# Adjust FRAGMENT_MAGIC/FRAGMENT_HEADER if your firmware differs.
+FRAGMENT_MAGIC = b'\xaa\x01'
+FRAGMENT_HEADER = struct.Struct('>2sHHHII')
+
+DEFAULT_TIMEOUT = 15.0
+# Largest reassembled map we are willing to allocate
+MAX_MAP_SIZE = 16 * 1024 * 1024
+# How many finished map ids to remember for dropping late duplicates
+COMPLETED_HISTORY = 32
+
+
+def parse_fragment(payload):
+    """Return (map_id, seq, count, total_len, offset, body) or None if not a fragment"""
+    if len(payload) < FRAGMENT_HEADER.size or payload[:2] != FRAGMENT_MAGIC:
+        return None
+    _, map_id, seq, count, total_len, offset = FRAGMENT_HEADER.unpack_from(payload, 0)
+    return map_id, seq, count, total_len, offset, memoryview(payload)[FRAGMENT_HEADER.size:]
+
+
+class _PendingMap:
+    """Buffer for one map that is still missing fragments"""
+
+    def __init__(self, count, total_len, now):
+        self.buffer = bytearray(total_len)
+        self.count = count
+        self.received = set()
+        # seq -> CRC32 of the fragment, to tell resends from new content
+        self.crcs = {}
+        self.started = now
+
+
+class _CompletedMap:
+    """A map already emitted: its fragment CRCs, and resends seen since"""
+
+    def __init__(self, crcs, now):
+        self.crcs = crcs
+        self.finished = now
+        # seq -> (offset, body) of the current run of fragments dropped as
+        # resends, in case they turn out to be the unchanged start of a new
+        # map. Fragments are sent in seq order, so a lower seq starts a new run
+        self.echoed = {}
+        self.last_echoed = -1
+
+
+class MapReassembler:
+    """
+    Gather multi-part DPS 15 pushes into complete map payloads.
+
+    feed() takes each decoded (binary) push and returns the full payload
+    exactly once when the last missing fragment arrives, or None while the
+    map is incomplete. Pushes without a fragment header are complete maps
+    and are returned unchanged. Fragments may arrive out of order or more
+    than once; maps that stay incomplete longer than timeout are dropped.
+
+    A fragment is a resend only if it is byte-identical (same CRC32) to
+    the one already received for that map and seq. A new map with the same
+    id, count and size arriving within timeout of the previous one is
+    reassembled, not dropped; fragments it shares with the previous map are
+    taken from the ones held back as possible resends (this relies on the
+    robot sending fragments in seq order, otherwise such a map times out).
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_size=MAX_MAP_SIZE, clock=time.monotonic):
+        self.timeout = timeout
+        self.max_size = max_size
+        self.clock = clock
+        self.pending = {}
+        self.completed = OrderedDict()
+        self.stats = {'fragments': 0, 'duplicates': 0, 'completed': 0,
+                      'timed_out': 0, 'rejected': 0}
+
+    def feed(self, payload):
+        """Add one push; returns the complete payload (bytes) or None"""
+        now = self.clock()
+        self.expire(now)
+
+        fragment = parse_fragment(payload)
+        if fragment is None:
+            return bytes(payload)
+
+        map_id, seq, count, total_len, offset, body = fragment
+        self.stats['fragments'] += 1
+
+        if not (0 < count and seq < count and 0 < total_len <= self.max_size
+                and offset + len(body) <= total_len):
+            self.stats['rejected'] += 1
+            print(f"Rejected fragment {seq}/{count} of map {map_id}: bad header")
+            return None
+
+        key = (map_id, count, total_len)
+        crc = zlib.crc32(payload)
+        pending = self.pending.get(key)
+        finished = self.completed.get(key)
+        if pending is None and finished is not None:
+            if finished.crcs.get(seq) == crc:
+                # Late resend of a map we already emitted
+                if seq <= finished.last_echoed:
+                    finished.echoed = {}
+                finished.echoed[seq] = (offset, bytes(body))
+                finished.last_echoed = seq
+                self.stats['duplicates'] += 1
+                return None
+            # Different content under the same header: a new map. The run of
+            # fragments held back as resends just before this one is its
+            # unchanged start
+            del self.completed[key]
+            pending = self.pending[key] = _PendingMap(count, total_len, now)
+            for echoed_seq, (echoed_offset, echoed_body) in finished.echoed.items():
+                if echoed_seq >= seq:
+                    continue
+                pending.buffer[echoed_offset:echoed_offset + len(echoed_body)] = echoed_body
+                pending.received.add(echoed_seq)
+                pending.crcs[echoed_seq] = finished.crcs[echoed_seq]
+        elif pending is None:
+            pending = self.pending[key] = _PendingMap(count, total_len, now)
+
+        if pending.crcs.get(seq) == crc:
+            self.stats['duplicates'] += 1
+            return None
+
+        # A changed fragment for a seq already held replaces it
+        pending.buffer[offset:offset + len(body)] = body
+        pending.received.add(seq)
+        pending.crcs[seq] = crc
+
+        if len(pending.received) < pending.count:
+            return None
+
+        del self.pending[key]
+        self.completed.pop(key, None)
+        self.completed[key] = _CompletedMap(pending.crcs, now)
+        while len(self.completed) > COMPLETED_HISTORY:
+            self.completed.popitem(last=False)
+        self.stats['completed'] += 1
+        return bytes(pending.buffer)
+
+    def expire(self, now=None):
+        """Drop maps that have been incomplete for longer than timeout"""
+        now = self.clock() if now is None else now
+        # Resends of a finished map stop arriving after timeout
+        for key in [key for key, c in self.completed.items() if now - c.finished > self.timeout]:
+            del self.completed[key]
+        expired = [key for key, p in self.pending.items() if now - p.started > self.timeout]
+        for key in expired:
+            pending = self.pending.pop(key)
+            self.stats['timed_out'] += 1
+            print(f"Map {key[0]} timed out with {len(pending.received)}/{pending.count} fragments")
+        return expired
+
+
+def split_payload(payload, fragment_size, map_id=0):
+    """Split a payload into fragments (for testing and simulation)"""
+    body_size = fragment_size - FRAGMENT_HEADER.size
+    if body_size <= 0:
+        raise ValueError("fragment_size must be larger than the fragment header")
+
+    count = max(1, -(-len(payload) // body_size))
+    return [FRAGMENT_HEADER.pack(FRAGMENT_MAGIC, map_id, seq, count, len(payload), seq * body_size)
+            + payload[seq * body_size:(seq + 1) * body_size]
+            for seq in range(count)]
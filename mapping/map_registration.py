@@ -0,0 +1,360 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from map_tiles import load_map_json, sample_segments
+from room_graph import room_bounds
+
+# Room outlines are sampled this densely to register them like a path (mm)
+OUTLINE_STEP = 50.0
+# Both maps are thinned to one point per voxel of this size first, so a
+# dense path costs no more than its shape needs
+VOXEL_MM = 50.0
+# Coarse search: rotation step and occupancy grid cell
+ANGLE_STEP_DEG = 3.0
+COARSE_CELL_MM = 100.0
+# Fine search around each coarse guess; it has to land closer than half
+# the spacing of neighbouring path rows so ICP can't lock onto the wrong one
+FINE_ANGLE_STEP_DEG = 1.0
+FINE_CELL_MM = 50.0
+# Rotations correlated per FFT batch (bounds memory)
+ANGLE_BATCH = 16
+# Coarse solutions refined with ICP (those with at least REFINE_OVERLAP of
+# the best overlap); the best refinement wins
+REFINE_CANDIDATES = 3
+REFINE_OVERLAP = 0.9
+# ICP: first match radius, floor for the adaptive radius, stopping rule
+MATCH_RADIUS_MM = 100.0
+MIN_RADIUS_MM = 50.0
+MAX_ITERATIONS = 50
+CONVERGED_MM = 0.5
+# Points this close to the reference after alignment count as inliers
+INLIER_MM = 50.0
+# ICP iterates on an even spread of this many source points; the final
+# residual is measured on all of them
+ICP_POINTS = 1024
+
+
+def outline_points(rooms, step=OUTLINE_STEP):
+    """Points along the walls of each decoded room rectangle"""
+    if not rooms:
+        return np.empty((0, 2))
+    corners = []
+    for room in rooms:
+        min_x, min_y, max_x, max_y = room_bounds(room)
+        corners.append([(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)])
+    corners = np.asarray(corners, dtype=np.float64)
+    starts = corners.reshape(-1, 2)
+    ends = np.roll(corners, -1, axis=1).reshape(-1, 2)
+    return sample_segments(starts, ends, step)
+
+
+def map_points(rooms=None, path=None, step=OUTLINE_STEP):
+    """Everything registration aligns for one map: room outlines plus path points"""
+    parts = [outline_points(rooms, step)]
+    if path is not None and len(path):
+        parts.append(np.asarray(path, dtype=np.float64).reshape(-1, 2))
+    return np.concatenate(parts)
+
+
+def voxel_downsample(points, size=VOXEL_MM):
+    """First point of every size x size voxel, in original order"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(points) or size <= 0:
+        return points
+    cells = np.floor(points / size).astype(np.int64)
+    _, first = np.unique(cells, axis=0, return_index=True)
+    return points[np.sort(first)]
+
+
+class GridIndex:
+    """
+    Nearest-neighbour lookup over a uniform grid (no scipy needed).
+
+    Points are bucketed into cell x cell squares and sorted by bucket; a
+    query checks its own bucket and the 8 around it, all queries at once,
+    so any neighbour closer than cell is found exactly.
+    """
+
+    def __init__(self, points, cell):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.cell = float(cell)
+        cells = np.floor(self.points / self.cell).astype(np.int64)
+        self.origin = cells.min(axis=0) - 1 if len(cells) else np.zeros(2, dtype=np.int64)
+        self.width = int(cells[:, 1].max() - self.origin[1] + 2) if len(cells) else 1
+        keys = self._keys(cells)
+        self.order = np.argsort(keys, kind='stable')
+        self.buckets, self.starts, self.counts = np.unique(
+            keys[self.order], return_index=True, return_counts=True)
+
+    def _keys(self, cells):
+        return (cells[:, 0] - self.origin[0]) * self.width + (cells[:, 1] - self.origin[1])
+
+    def query(self, queries):
+        """(distance, index) of the nearest point for each query; inf / -1 beyond cell"""
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 2)
+        best = np.full(len(queries), np.inf)
+        index = np.full(len(queries), -1, dtype=np.int64)
+        if not len(self.points):
+            return best, index
+
+        cells = np.floor(queries / self.cell).astype(np.int64)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                neighbour = cells + (dx, dy)
+                # Buckets outside the indexed range would alias other keys
+                inside = ((neighbour[:, 1] >= self.origin[1])
+                          & (neighbour[:, 1] < self.origin[1] + self.width)
+                          & (neighbour[:, 0] >= self.origin[0]))
+                keys = self._keys(neighbour)
+                pos = np.searchsorted(self.buckets, keys)
+                pos = np.minimum(pos, len(self.buckets) - 1)
+                hit = np.flatnonzero(inside & (self.buckets[pos] == keys))
+                if not len(hit):
+                    continue
+
+                counts = self.counts[pos[hit]]
+                owner = np.repeat(hit, counts)
+                within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                candidate = self.order[np.repeat(self.starts[pos[hit]], counts) + within]
+                d = np.hypot(*(queries[owner] - self.points[candidate]).T)
+
+                # Nearest candidate per query (candidates are grouped by query)
+                group = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+                nearest = np.minimum.reduceat(d, group)
+                at_min = np.flatnonzero(d == np.repeat(nearest, np.diff(np.r_[group, len(d)])))
+                first_min = at_min[np.r_[True, owner[at_min][1:] != owner[at_min][:-1]]]
+                q = owner[group]
+                closer = nearest < best[q]
+                best[q[closer]] = nearest[closer]
+                index[q[closer]] = candidate[first_min][closer]
+        return best, index
+
+
+def rigid_fit(source, target):
+    """Rotation matrix and translation minimising |R @ source + t - target|"""
+    src_mean = source.mean(axis=0)
+    dst_mean = target.mean(axis=0)
+    covariance = (source - src_mean).T @ (target - dst_mean)
+    u, _, vt = np.linalg.svd(covariance)
+    rotation = (u @ vt).T
+    if np.linalg.det(rotation) < 0:
+        # Reflection: flip the weakest axis
+        vt[-1] *= -1
+        rotation = (u @ vt).T
+    return rotation, dst_mean - rotation @ src_mean
+
+
+def _rotation(degrees):
+    theta = np.radians(degrees)
+    return np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+
+
+def _occupancy(cells, shape):
+    grid = np.zeros(shape, dtype=np.float32)
+    grid[cells[:, 1] % shape[0], cells[:, 0] % shape[1]] = 1
+    return grid
+
+
+def correlation_search(source, reference, angles, cell, keep=1):
+    """
+    Best (angle, translation, overlap) guesses over the given rotations.
+
+    Both maps become occupancy grids of cell-sized squares. For every
+    rotation of the source, one FFT cross-correlation scores every
+    translation at once: the value is the share of occupied source cells
+    that land on occupied reference cells. Occupancy, not point counts, so
+    dense stretches of path don't outvote the shape of the map. The grids
+    are deliberately not blurred: a cleaning path covers its rooms almost
+    solidly once widened, and the fine row structure is what tells
+    candidate alignments apart.
+    """
+    ref_low = reference.min(axis=0)
+    ref_cells = np.floor((reference - ref_low) / cell).astype(np.int64)
+    centre = source.mean(axis=0)
+    src = source - centre
+    radius = int(np.ceil(np.hypot(*src.T).max() / cell)) + 1
+
+    # Room for every shift that still overlaps, without wrap-around aliasing
+    ref_span = ref_cells.max(axis=0) + 1
+    # (powers of two keep the FFTs fast)
+    shape = tuple(1 << int(np.ceil(np.log2(n + 2 * radius + 2))) for n in (ref_span[1], ref_span[0]))
+    ref_spectrum = np.fft.rfft2(_occupancy(ref_cells, shape))
+
+    results = []
+    for batch in range(0, len(angles), ANGLE_BATCH):
+        chunk = angles[batch:batch + ANGLE_BATCH]
+        grids = np.empty((len(chunk),) + shape, dtype=np.float32)
+        occupied = []
+        for i, angle in enumerate(chunk):
+            cells = np.floor(src @ _rotation(angle).T / cell).astype(np.int64)
+            grids[i] = _occupancy(cells, shape)
+            occupied.append(grids[i].sum())
+        # corr[s] = sum over source cells k of reference[k + s]
+        corr = np.fft.irfft2(ref_spectrum * np.conj(np.fft.rfft2(grids)), s=shape)
+        for i, angle in enumerate(chunk):
+            peak = int(corr[i].argmax())
+            sy, sx = np.unravel_index(peak, shape)
+            # Shifts past the reference span are negative ones wrapped around
+            sx = sx - shape[1] if sx > ref_span[0] + radius else sx
+            sy = sy - shape[0] if sy > ref_span[1] + radius else sy
+            translation = ref_low + np.array([sx, sy]) * cell - _rotation(angle) @ centre
+            results.append((float(corr[i].flat[peak] / occupied[i]), float(angle), translation))
+
+    results.sort(key=lambda result: result[0], reverse=True)
+    return [(angle, translation, overlap) for overlap, angle, translation in results[:keep]]
+
+
+def coarse_search(source, reference, max_rotation_deg=180.0, angle_step=ANGLE_STEP_DEG,
+                  cell=COARSE_CELL_MM, keep=REFINE_CANDIDATES):
+    """Starting guesses from every rotation within +/-max_rotation_deg"""
+    angles = np.arange(-max_rotation_deg, max_rotation_deg, angle_step)
+    if max_rotation_deg < 180:
+        angles = np.append(angles, max_rotation_deg)
+    return correlation_search(source, reference, angles, cell, keep)
+
+
+def fine_search(source, reference, angle, cell=FINE_CELL_MM, angle_step=FINE_ANGLE_STEP_DEG,
+                window=ANGLE_STEP_DEG):
+    """A coarse guess re-searched on a finer grid within +/-window degrees"""
+    angles = angle + np.arange(-window, window + angle_step / 2, angle_step)
+    return correlation_search(source, reference, angles, cell)[0]
+
+
+def icp(source, reference, rotation, translation, index=None,
+        radius=MATCH_RADIUS_MM, max_iterations=MAX_ITERATIONS):
+    """
+    Refine a rigid transform with point-to-point ICP.
+
+    Pairs farther apart than the match radius are ignored (the maps need
+    only overlap); the radius shrinks to 3x the current RMS error as the
+    fit improves. Returns (rotation, translation, rmse, inlier fraction,
+    iterations).
+    """
+    if index is None or index.cell < radius:
+        index = GridIndex(reference, radius)
+    sample = source[::max(len(source) // ICP_POINTS, 1)]
+    rmse, inliers, iteration = np.inf, 0.0, 0
+    for iteration in range(1, max_iterations + 1):
+        # Smaller buckets once the radius has shrunk: fewer candidates per query
+        if radius < index.cell / 2:
+            index = GridIndex(reference, radius)
+        moved = sample @ rotation.T + translation
+        distance, match = index.query(moved)
+        ok = distance <= radius
+        if ok.sum() < 3:
+            break
+        rotation_new, translation_new = rigid_fit(sample[ok], reference[match[ok]])
+        shift = np.abs(sample[ok] @ (rotation_new - rotation).T
+                       + (translation_new - translation)).max()
+        rotation, translation = rotation_new, translation_new
+        rmse = float(np.sqrt(np.mean(distance[ok] ** 2)))
+        inliers = float(ok.mean())
+        radius = max(min(radius, 3 * rmse), MIN_RADIUS_MM)
+        if shift < CONVERGED_MM:
+            break
+
+    # Final fit on every source point, judged at a fixed tight radius so
+    # candidates are comparable
+    distance, _ = index.query(source @ rotation.T + translation)
+    ok = distance <= INLIER_MM
+    if ok.any():
+        rmse = float(np.sqrt(np.mean(distance[ok] ** 2)))
+        inliers = float(ok.mean())
+    return rotation, translation, rmse, inliers, iteration
+
+
+def register(source, reference, max_rotation_deg=180.0, radius=MATCH_RADIUS_MM):
+    """
+    Align source points (a new map) onto reference points (the stored map).
+
+    A coarse rotation/translation search finds a few starting guesses, a
+    finer search sharpens each, ICP refines them, and the refinement with the most inliers (source points
+    within INLIER_MM of the reference) wins. Returns a transform dict:
+    rotation_deg, translation, matrix (3x3 homogeneous), rmse_mm (over the
+    inliers), inliers (fraction), iterations and elapsed_ms.
+    """
+    started = time.perf_counter()
+    source = voxel_downsample(source)
+    reference = voxel_downsample(reference)
+    if len(source) < 3 or len(reference) < 3:
+        raise ValueError("Need at least 3 points in each map to register")
+
+    index = GridIndex(reference, radius)
+    best = None
+    candidates = coarse_search(source, reference, max_rotation_deg)
+    for angle, translation, overlap in candidates:
+        if overlap < REFINE_OVERLAP * candidates[0][2]:
+            continue
+        angle, translation, _ = fine_search(source, reference, angle)
+        result = icp(source, reference, _rotation(angle), translation, index, radius)
+        if best is None or (result[3], -result[2]) > (best[3], -best[2]):
+            best = result
+
+    rotation, translation, rmse, inliers, iterations = best
+    matrix = np.eye(3)
+    matrix[:2, :2] = rotation
+    matrix[:2, 2] = translation
+    return {
+        'rotation_deg': round(float(np.degrees(np.arctan2(rotation[1, 0], rotation[0, 0]))), 3),
+        'translation': [round(float(translation[0]), 1), round(float(translation[1]), 1)],
+        'matrix': matrix.tolist(),
+        'rmse_mm': round(rmse, 2),
+        'inliers': round(inliers, 3),
+        'iterations': iterations,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def apply_transform(points, transform):
+    """Map (N, 2) points with a transform from register()"""
+    matrix = np.asarray(transform['matrix'])
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points @ matrix[:2, :2].T + matrix[:2, 2]
+
+
+def transform_rooms(rooms, transform):
+    """Rooms moved into the reference frame: corners rotated, bounds re-fitted around them"""
+    moved = []
+    for room in rooms:
+        min_x, min_y, max_x, max_y = room_bounds(room)
+        corners = apply_transform([(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)],
+                                  transform)
+        low, high = corners.min(axis=0), corners.max(axis=0)
+        room = dict(room)
+        room['corners'] = [tuple(c) for c in np.round(corners).astype(int).tolist()]
+        room['bounds'] = {'min_x': int(round(low[0])), 'max_x': int(round(high[0])),
+                          'min_y': int(round(low[1])), 'max_y': int(round(high[1]))}
+        moved.append(room)
+    return moved
+
+
+# Usage: python map_registration.py reference.json new.json [-o aligned.json] [--max-rotation 20]
+#        (rooms_decoded.json, map_decoded.json or map_coords.json)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Align a new map onto a stored reference map")
+    parser.add_argument('reference', help="Reference map JSON")
+    parser.add_argument('new', help="Map JSON to align")
+    parser.add_argument('-o', '--output', help="Write the aligned rooms and path here")
+    parser.add_argument('--max-rotation', type=float, default=180.0,
+                        help="Largest rotation searched, degrees (default: 180, any)")
+    args = parser.parse_args()
+
+    ref_rooms, ref_path = load_map_json(args.reference)
+    new_rooms, new_path = load_map_json(args.new)
+    transform = register(map_points(new_rooms, new_path), map_points(ref_rooms, ref_path),
+                         args.max_rotation)
+    print(json.dumps({k: v for k, v in transform.items() if k != 'matrix'}))
+
+    if args.output:
+        aligned = {
+            'transform': transform,
+            'rooms': transform_rooms(new_rooms, transform),
+            'coordinates': np.round(apply_transform(new_path, transform)).astype(int).tolist()
+            if len(new_path) else [],
+        }
+        with open(args.output, 'w') as f:
+            json.dump(aligned, f, indent=2)
+        print(f"✓ Saved aligned map to {args.output}")
@@ -0,0 +1,329 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Next to this module, not the working directory: the store deletes
+# directories it owns, so it must never adopt someone else's maps/ folder
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'maps')
+# Disk budget for every stored map together; least recently used maps go first
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Decoded maps kept in memory for instant switching
+MEMORY_MAPS = 4
+
+META_FILE = 'meta.json'
+PAYLOAD_FILE = 'payload.bin'
+ROOMS_FILE = 'rooms.json'
+PATH_FILE = 'path.npy'
+ARTIFACT_DIR = 'artifacts'
+# Marks a root the store created; without it nothing under the root is deleted
+MARKER_FILE = '.map_store'
+# A map is written here and renamed into place once complete
+STAGING_SUFFIX = '.staging'
+
+
+def content_hash(payload):
+    """Version of a map payload (same scheme the dashboard uses)"""
+    return hashlib.sha1(payload).hexdigest()[:12]
+
+
+def _safe(name):
+    """
+    Directory name for a device or map id (both come from the device).
+
+    Anything but letters, digits, '-' and '_' is replaced, so '.', '..'
+    and separators can never name a parent directory; a short hash keeps
+    ids that differ only in replaced characters apart.
+    """
+    name = str(name)
+    cleaned = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+    if cleaned != name or not cleaned:
+        cleaned = f"{cleaned}_{hashlib.sha1(name.encode()).hexdigest()[:8]}"
+    return cleaned
+
+
+def _dir_size(directory):
+    total = 0
+    for base, _, files in os.walk(directory):
+        for name in files:
+            total += os.path.getsize(os.path.join(base, name))
+    return total
+
+
+class MapStore:
+    """
+    Decoded maps per (device, DPS 199 map id), kept on disk across runs.
+
+    Layout: root/<device>/<map_id>/ holds the raw payload, rooms.json,
+    path.npy, meta.json (content hash, size, last use) and artifacts/
+    (rendered PNGs and the like, written by callers).
+
+    put() stores a freshly decoded map; if the payload hash matches what is
+    already stored, nothing is rewritten. A new hash replaces the map and
+    drops its artifacts, so an artifact is never served for stale content.
+    switch() is what to call when DPS 199 changes: it returns the stored
+    map for the new id (from memory when recently used) so the floor
+    shows at once, or None when the map has to be fetched.
+
+    The store stays under max_bytes by evicting whole maps, least recently
+    used first; the map each device is currently on is never evicted.
+
+    Only maps the store wrote are ever deleted: a new map is built in a
+    '.staging' directory and renamed into place when complete, and a root
+    without the store's marker file is never cleaned up. Directories
+    without a valid meta.json are skipped, not removed.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=DEFAULT_MAX_BYTES, memory_maps=MEMORY_MAPS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.memory_maps = memory_maps
+        self.active = {}
+        self.lock = threading.RLock()
+        # (device, map_id) -> meta, least recently used first
+        self.index = OrderedDict()
+        self._loaded = OrderedDict()
+        self._scan()
+
+    def _dir(self, device, map_id):
+        directory = os.path.join(self.root, _safe(device), _safe(map_id))
+        # Never hand rmtree() anything outside the store
+        root = os.path.realpath(self.root)
+        if os.path.commonpath([root, os.path.realpath(directory)]) != root or \
+                os.path.realpath(directory) == root:
+            raise ValueError(f"Map directory escapes the store: {directory}")
+        return directory
+
+    def _scan(self):
+        owned = os.path.exists(os.path.join(self.root, MARKER_FILE))
+        if not owned:
+            if os.path.isdir(self.root) and os.listdir(self.root):
+                # Someone else's directory: use it, but never adopt it
+                print(f"⚠ {self.root} was not created by MapStore; "
+                      f"leaving its contents alone", file=sys.stderr)
+            else:
+                os.makedirs(self.root, exist_ok=True)
+                open(os.path.join(self.root, MARKER_FILE), 'w').close()
+                owned = True
+
+        found = []
+        for device in os.listdir(self.root):
+            device_dir = os.path.join(self.root, device)
+            if not os.path.isdir(device_dir):
+                continue
+            for map_id in os.listdir(device_dir):
+                map_dir = os.path.join(device_dir, map_id)
+                if map_id.endswith(STAGING_SUFFIX):
+                    # Map being written when a put() crashed
+                    if owned:
+                        shutil.rmtree(map_dir, ignore_errors=True)
+                    continue
+                try:
+                    with open(os.path.join(map_dir, META_FILE)) as f:
+                        meta = json.load(f)
+                    if self._dir(meta['device'], meta['map_id']) != map_dir:
+                        raise ValueError("meta.json doesn't match its directory")
+                    found.append(meta)
+                except (OSError, ValueError, KeyError, TypeError):
+                    if os.path.isdir(map_dir):
+                        print(f"⚠ Skipping {map_dir}: not a stored map", file=sys.stderr)
+        for meta in sorted(found, key=lambda meta: meta['last_used']):
+            self.index[(meta['device'], meta['map_id'])] = meta
+
+    @property
+    def total_bytes(self):
+        return sum(meta['size'] for meta in self.index.values())
+
+    def _write_meta(self, meta, directory=None):
+        path = os.path.join(directory or self._dir(meta['device'], meta['map_id']), META_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def _touch(self, key):
+        meta = self.index[key]
+        meta['last_used'] = time.time()
+        self.index.move_to_end(key)
+        self._write_meta(meta)
+
+    def put(self, device, map_id, payload, rooms, path):
+        """Store a decoded map; returns its entry (unchanged content is not rewritten)"""
+        device, map_id = str(device), str(map_id)
+        version = content_hash(payload)
+        key = (device, map_id)
+        with self.lock:
+            meta = self.index.get(key)
+            if meta is not None and meta['hash'] == version:
+                self._touch(key)
+                return self.get(device, map_id)
+
+            directory = self._dir(device, map_id)
+            if meta is None and os.path.exists(directory):
+                raise FileExistsError(f"{directory} exists but is not a stored map")
+            staging = directory + STAGING_SUFFIX
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(os.path.join(staging, ARTIFACT_DIR))
+            with open(os.path.join(staging, PAYLOAD_FILE), 'wb') as f:
+                f.write(payload)
+            with open(os.path.join(staging, ROOMS_FILE), 'w') as f:
+                json.dump(rooms, f)
+            np.save(os.path.join(staging, PATH_FILE),
+                    np.asarray(path, dtype=np.int32).reshape(-1, 2))
+
+            meta = {'device': device, 'map_id': map_id, 'hash': version,
+                    'rooms': len(rooms), 'points': len(path), 'updated': time.time(),
+                    'last_used': time.time(), 'size': 0}
+            meta['size'] = _dir_size(staging)
+            self._write_meta(meta, staging)
+            if os.path.exists(directory):
+                # Replacing a stored map: move it out of the way, then drop it
+                old = directory + '.old' + STAGING_SUFFIX
+                os.rename(directory, old)
+                os.rename(staging, directory)
+                shutil.rmtree(old, ignore_errors=True)
+            else:
+                os.rename(staging, directory)
+            self.index[key] = meta
+            self.index.move_to_end(key)
+            self._loaded.pop(key, None)
+            self._evict()
+            return self.get(device, map_id)
+
+    def get(self, device, map_id):
+        """Entry dict (device, map_id, hash, rooms, path) or None if not stored"""
+        key = (str(device), str(map_id))
+        with self.lock:
+            meta = self.index.get(key)
+            if meta is None:
+                return None
+            entry = self._loaded.get(key)
+            if entry is None or entry['hash'] != meta['hash']:
+                directory = self._dir(*key)
+                with open(os.path.join(directory, ROOMS_FILE)) as f:
+                    rooms = json.load(f)
+                entry = {'device': key[0], 'map_id': key[1], 'hash': meta['hash'],
+                         'rooms': rooms, 'path': np.load(os.path.join(directory, PATH_FILE))}
+                self._loaded[key] = entry
+            self._loaded.move_to_end(key)
+            while len(self._loaded) > self.memory_maps:
+                self._loaded.popitem(last=False)
+            return entry
+
+    def payload(self, device, map_id):
+        """Raw payload bytes of a stored map, or None"""
+        key = (str(device), str(map_id))
+        with self.lock:
+            if key not in self.index:
+                return None
+            with open(os.path.join(self._dir(*key), PAYLOAD_FILE), 'rb') as f:
+                return f.read()
+
+    def switch(self, device, map_id):
+        """Make map_id the device's current map; returns its entry or None if unknown"""
+        device, map_id = str(device), str(map_id)
+        with self.lock:
+            self.active[device] = map_id
+            if (device, map_id) not in self.index:
+                return None
+            self._touch((device, map_id))
+            return self.get(device, map_id)
+
+    def observe(self, device, dps):
+        """
+        Follow DPS 199 in a status or push; returns (switched, entry).
+
+        switched is True when the map id changed; entry is the stored map
+        for the new id, or None if it still has to be fetched.
+        """
+        if '199' not in dps:
+            return False, None
+        map_id = str(dps['199'])
+        if self.active.get(str(device)) == map_id:
+            return False, None
+        return True, self.switch(device, map_id)
+
+    def artifact_path(self, device, map_id, name):
+        return os.path.join(self._dir(device, map_id), ARTIFACT_DIR, _safe(name))
+
+    def put_artifact(self, device, map_id, name, data, version=None):
+        """
+        Save a rendered artifact for a stored map.
+
+        With version, the artifact is only kept if the stored map still has
+        that content hash (it may have been replaced while rendering).
+        """
+        key = (str(device), str(map_id))
+        with self.lock:
+            meta = self.index.get(key)
+            if meta is None or (version is not None and meta['hash'] != version):
+                return False
+            path = self.artifact_path(*key, name)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+            meta['size'] = _dir_size(self._dir(*key))
+            self._write_meta(meta)
+            self._evict()
+            return True
+
+    def get_artifact(self, device, map_id, name, version=None):
+        """Artifact bytes, or None if missing or the map's content hash differs from version"""
+        key = (str(device), str(map_id))
+        with self.lock:
+            meta = self.index.get(key)
+            if meta is None or (version is not None and meta['hash'] != version):
+                return None
+            try:
+                with open(self.artifact_path(*key, name), 'rb') as f:
+                    return f.read()
+            except OSError:
+                return None
+
+    def remove(self, device, map_id):
+        """Delete a stored map; returns False if no such map is stored"""
+        key = (str(device), str(map_id))
+        with self.lock:
+            if self.index.pop(key, None) is None:
+                return False
+            self._loaded.pop(key, None)
+            shutil.rmtree(self._dir(*key), ignore_errors=True)
+            return True
+
+    def _evict(self):
+        in_use = set(self.active.items())
+        for key in list(self.index):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key in in_use:
+                continue
+            self.remove(*key)
+
+    def maps(self, device=None):
+        """Stored map metadata, most recently used first"""
+        with self.lock:
+            return [dict(meta) for meta in reversed(self.index.values())
+                    if device is None or meta['device'] == str(device)]
+
+
+# Usage: python map_store.py [root]                  -> list stored maps (default: mapping/maps/)
+#        python map_store.py root remove <device> <map_id>
+if __name__ == "__main__":
+    store = MapStore(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ROOT)
+    if len(sys.argv) > 4 and sys.argv[2] == 'remove':
+        if store.remove(sys.argv[3], sys.argv[4]):
+            print(f"✓ Removed map {sys.argv[4]} of {sys.argv[3]}")
+        else:
+            print(f"No map {sys.argv[4]} stored for {sys.argv[3]}")
+    for meta in store.maps():
+        used = time.strftime('%Y-%m-%d %H:%M', time.localtime(meta['last_used']))
+        print(f"{meta['device']:<24} map {meta['map_id']:<6} {meta['hash']}  "
+              f"{meta['rooms']:>3} rooms {meta['points']:>7} points  "
+              f"{meta['size'] / 1024:8.1f} KB  last used {used}")
+    print(f"{len(store.index)} maps, {store.total_bytes / 1024:.1f} KB of "
+          f"{store.max_bytes / 1024 / 1024:.0f} MB")
@@ -0,0 +1,313 @@
+import binascii
+import sys
+import zlib
+
+import numpy as np
+
+# Refuse to inflate a single map beyond this (guards against zip bombs)
+DEFAULT_MAX_OUTPUT = 64 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# Rows per NumPy chunk from iter_points()/iter_rooms()
+DEFAULT_CHUNK_POINTS = 65536
+DEFAULT_CHUNK_ROOMS = 4096
+
+# Map payloads: uint16 magic + version byte, then int16 (x, y) records
+HEADER_SIZE = 3
+POINT_SIZE = 4
+# Rooms are four corner points
+ROOM_SIZE = 4 * POINT_SIZE
+
+# zlib wbits for each container format
+WBITS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'zlib': zlib.MAX_WBITS,
+    'deflate': -zlib.MAX_WBITS,
+}
+
+
+def detect_compression(data, allow_raw_deflate=False):
+    """
+    Identify the compression container from the first bytes of a payload.
+
+    Returns 'gzip', 'zlib', 'deflate' or None. Raw deflate has no magic, so
+    it is only reported when allow_raw_deflate is set and the head of the
+    payload actually inflates.
+    """
+    head = bytes(data[:2])
+    if head == b'\x1f\x8b':
+        return 'gzip'
+    if len(head) == 2 and head[0] & 0x0f == 8 and head[0] >> 4 <= 7 \
+            and (head[0] << 8 | head[1]) % 31 == 0:
+        return 'zlib'
+    if allow_raw_deflate and data:
+        try:
+            probe = zlib.decompressobj(WBITS['deflate'])
+            if probe.decompress(bytes(data[:DEFAULT_CHUNK_SIZE]), 1024):
+                return 'deflate'
+        except zlib.error:
+            pass
+    return None
+
+
+class StreamingDecompressor:
+    """
+    Incremental gzip/zlib/raw-deflate decompressor with an output cap.
+
+    Feed compressed chunks as they arrive; each feed() returns whatever
+    output is ready. Raises ValueError once the output would exceed
+    max_output, so a hostile or corrupt payload can't exhaust memory.
+    """
+
+    def __init__(self, fmt, max_output=DEFAULT_MAX_OUTPUT, chunk_size=DEFAULT_CHUNK_SIZE):
+        if fmt not in WBITS:
+            raise ValueError(f"Unknown compression format: {fmt}")
+        self.fmt = fmt
+        self.max_output = max_output
+        self.chunk_size = chunk_size
+        self.total_out = 0
+        self._inflater = zlib.decompressobj(WBITS[fmt])
+
+    @property
+    def eof(self):
+        return self._inflater.eof
+
+    def _take(self, out):
+        self.total_out += len(out)
+        if self.total_out > self.max_output:
+            raise ValueError(f"Decompressed map exceeds {self.max_output} bytes")
+        return out
+
+    def feed(self, chunk):
+        """Decompress one chunk, yielding output pieces of at most chunk_size"""
+        data = bytes(chunk)
+        while data and not self._inflater.eof:
+            # Bound each step so the cap is enforced before memory is spent
+            limit = min(self.chunk_size, self.max_output - self.total_out + 1)
+            out = self._inflater.decompress(data, limit)
+            data = self._inflater.unconsumed_tail
+            if out:
+                yield self._take(out)
+            elif not data:
+                break
+
+    def flush(self):
+        """Return any remaining output once all input has been fed"""
+        out = self._inflater.flush()
+        if out:
+            yield self._take(out)
+
+    @property
+    def unused_data(self):
+        """Bytes that followed the end of the compressed stream"""
+        return self._inflater.unused_data
+
+
+def iter_decompress(chunks, fmt=None, max_output=DEFAULT_MAX_OUTPUT, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Decompress an iterable of compressed chunks lazily.
+
+    The format is detected from the first chunk when fmt is None. Yields
+    decompressed pieces; never holds more than one piece in memory.
+    """
+    decompressor = None
+    for chunk in chunks:
+        if decompressor is None:
+            fmt = fmt or detect_compression(chunk, allow_raw_deflate=True)
+            if fmt is None:
+                raise ValueError("Payload is not gzip, zlib or raw deflate")
+            decompressor = StreamingDecompressor(fmt, max_output, chunk_size)
+        yield from decompressor.feed(chunk)
+
+    if decompressor is not None:
+        yield from decompressor.flush()
+        if not decompressor.eof:
+            raise ValueError("Compressed map is truncated")
+
+
+def decompress_payload(data, fmt=None, max_output=DEFAULT_MAX_OUTPUT, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Decompress a whole in-memory payload into bytes, chunk by chunk"""
+    view = memoryview(data)
+    chunks = (view[i:i + chunk_size] for i in range(0, len(view), chunk_size))
+    out = bytearray()
+    for piece in iter_decompress(chunks, fmt, max_output, chunk_size):
+        out += piece
+    return bytes(out)
+
+
+def _pieces(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Pieces of a str/bytes, a file object or an iterable of pieces"""
+    if isinstance(source, (str, bytes, bytearray, memoryview)):
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i + chunk_size]
+    elif hasattr(source, 'read'):
+        while True:
+            piece = source.read(chunk_size)
+            if not piece:
+                break
+            yield piece
+    else:
+        yield from source
+
+
+def iter_b64decode(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Decode base64 incrementally, yielding decoded bytes piece by piece.
+
+    source is base64 text (str or bytes), a file object or an iterable of
+    text pieces split anywhere (e.g. DPS pushes as they arrive). Only
+    complete 4-character groups are decoded; the rest waits for the next
+    piece. Raises ValueError on malformed input, like base64.b64decode.
+    """
+    carry = b''
+    for piece in _pieces(source, chunk_size):
+        if isinstance(piece, str):
+            piece = piece.encode('ascii')
+        piece = carry + b''.join(bytes(piece).split())
+        usable = len(piece) - len(piece) % 4
+        carry = piece[usable:]
+        if usable:
+            yield binascii.a2b_base64(piece[:usable])
+    if carry:
+        yield binascii.a2b_base64(carry)
+
+
+def iter_payload(source, max_output=DEFAULT_MAX_OUTPUT, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Decoded map bytes from base64 source, inflated on the fly if compressed"""
+    pieces = iter_b64decode(source, chunk_size)
+    head = b''
+    for piece in pieces:
+        head += piece
+        if len(head) >= 2:
+            break
+    fmt = detect_compression(head)
+    chained = _chain(head, pieces)
+    if fmt is None:
+        yield from chained
+    else:
+        yield from iter_decompress(chained, fmt, max_output, chunk_size)
+
+
+def _chain(first, rest):
+    if first:
+        yield first
+    yield from rest
+
+
+def iter_records(pieces, record_size, chunk_records, skip=0):
+    """
+    Regroup a byte stream into (chunk_records, record_size) uint8 arrays.
+
+    The first skip bytes (a header) are dropped, every chunk but the last
+    has exactly chunk_records rows, and a trailing partial record is
+    ignored, as the list-based decoders do. At most one chunk plus one
+    input piece is held at a time.
+    """
+    block = record_size * chunk_records
+    pending = bytearray()
+    for piece in pieces:
+        if skip:
+            dropped = min(skip, len(piece))
+            piece = piece[dropped:]
+            skip -= dropped
+        pending += piece
+        while len(pending) >= block:
+            yield np.frombuffer(bytes(pending[:block]), dtype=np.uint8).reshape(chunk_records, record_size)
+            del pending[:block]
+    whole = len(pending) - len(pending) % record_size
+    if whole:
+        yield np.frombuffer(bytes(pending[:whole]), dtype=np.uint8).reshape(-1, record_size)
+
+
+def rechunk(arrays, rows):
+    """Regroup arrays of varying length into chunks of exactly rows rows (last may be shorter)"""
+    parts, count = [], 0
+    for array in arrays:
+        while len(array):
+            take = array[:rows - count]
+            parts.append(take)
+            count += len(take)
+            array = array[len(take):]
+            if count == rows:
+                yield np.concatenate(parts)
+                parts, count = [], 0
+    if count:
+        yield np.concatenate(parts)
+
+
+def iter_points(source, chunk_points=DEFAULT_CHUNK_POINTS, max_output=DEFAULT_MAX_OUTPUT,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Path points of a base64 map payload as (chunk_points, 2) int32 arrays.
+
+    Same points as TuyaMapDecoder.decode() before simplification (every
+    int16 pair after the 3-byte header), but memory stays at one chunk no
+    matter how long the path is.
+    """
+    records = iter_records(iter_payload(source, max_output, chunk_size), POINT_SIZE,
+                           chunk_points, skip=HEADER_SIZE)
+    for block in records:
+        yield block.view('<i2').astype(np.int32)
+
+
+def iter_rooms(source, chunk_rooms=DEFAULT_CHUNK_ROOMS, max_output=DEFAULT_MAX_OUTPUT,
+               chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Rectangular rooms of a base64 map payload as (chunk_rooms, 5) int32 arrays.
+
+    Rows are id, min_x, min_y, max_x, max_y (the shared_arrays.rooms_to_array
+    layout). A record is a room when its four corners have exactly two
+    distinct x and two distinct y values, as in
+    TuyaRoomMapDecoder.decode_rooms(); ids count valid rooms only.
+    """
+    next_id = 0
+
+    def rooms(blocks):
+        nonlocal next_id
+        for block in blocks:
+            corners = block.view('<i2').reshape(-1, 4, 2)
+            xs = np.sort(corners[:, :, 0], axis=1)
+            ys = np.sort(corners[:, :, 1], axis=1)
+            valid = ((np.diff(xs, axis=1) != 0).sum(axis=1) == 1) & \
+                    ((np.diff(ys, axis=1) != 0).sum(axis=1) == 1)
+            count = int(valid.sum())
+            table = np.empty((count, 5), dtype=np.int32)
+            table[:, 0] = np.arange(next_id, next_id + count)
+            table[:, 1] = xs[valid, 0]
+            table[:, 2] = ys[valid, 0]
+            table[:, 3] = xs[valid, 3]
+            table[:, 4] = ys[valid, 3]
+            next_id += count
+            yield table
+
+    blocks = iter_records(iter_payload(source, max_output, chunk_size), ROOM_SIZE,
+                          chunk_rooms, skip=HEADER_SIZE)
+    return rechunk(rooms(blocks), chunk_rooms)
+
+
+# Usage: python map_stream.py map.b64 [--rooms]   -> point/room statistics in constant memory
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python map_stream.py <map.b64> [--rooms]")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'rb') as f:
+        if '--rooms' in sys.argv[2:]:
+            count = area = chunks = 0
+            for table in iter_rooms(f):
+                chunks += 1
+                count += len(table)
+                area += int(((table[:, 3] - table[:, 1]).astype(np.int64) *
+                             (table[:, 4] - table[:, 2])).sum())
+            print(f"{count} rooms in {chunks} chunks, summed area {area} sq units")
+        else:
+            count = chunks = 0
+            low = np.full(2, np.iinfo(np.int32).max)
+            high = np.full(2, np.iinfo(np.int32).min)
+            for points in iter_points(f):
+                chunks += 1
+                count += len(points)
+                low = np.minimum(low, points.min(axis=0))
+                high = np.maximum(high, points.max(axis=0))
+            print(f"{count} points in {chunks} chunks")
+            if count:
+                print(f"Bounds: ({low[0]}, {low[1]}) to ({high[0]}, {high[1]})")
@@ -0,0 +1,412 @@
+import contextlib
+import json
+import os
+import shutil
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from tracing import span
+except ImportError:
+    # utils/ isn't on the path (only entry scripts put it there): run untraced
+    if os.environ.get('VACUUM_TRACE'):
+        print("⚠ VACUUM_TRACE is set but utils/tracing.py can't be imported; "
+              f"{__name__} runs untraced", file=sys.stderr)
+    def span(name, **args):
+        return contextlib.nullcontext()
+
+TILE_SIZE = 256
+# The world is a square centred on the dock, at least this wide (mm)
+MIN_WORLD_MM = 8192
+# Deepest zoom level stops once a pixel is this fine (mm)
+FINEST_MM_PER_PX = 5.0
+# Encoded tiles kept in memory
+MEMORY_TILES = 512
+# Path stroke width in pixels (same at every zoom level)
+PATH_WIDTH = 2
+
+BACKGROUND = (255, 255, 255, 255)
+PATH_COLOR = (0, 0, 255)
+BORDER_COLOR = (0, 0, 0)
+COVERAGE_COLOR = (255, 80, 0)
+ROOM_ALPHA = 0.5
+COVERAGE_ALPHA = 0.6
+# Same pastel cycle visualize_rooms() gets from the Set3 colormap
+ROOM_COLORS = [
+    (141, 211, 199), (255, 255, 179), (190, 186, 218), (251, 128, 114),
+    (128, 177, 211), (253, 180, 98), (179, 222, 105), (252, 205, 229),
+    (217, 217, 217), (188, 128, 189), (204, 235, 197), (255, 237, 111),
+]
+
+
+def encode_png(rgba):
+    """Encode an (H, W, 4) uint8 array as PNG bytes (no matplotlib needed)"""
+    height, width = rgba.shape[:2]
+
+    def chunk(kind, body):
+        return (struct.pack('>I', len(body)) + kind + body
+                + struct.pack('>I', zlib.crc32(kind + body) & 0xffffffff))
+
+    # Filter type 0 (none) in front of every scanline
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, -1)
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+def world_size(*point_sets):
+    """Smallest power-of-two square (mm) centred on the dock that holds every point"""
+    extent = MIN_WORLD_MM / 2
+    for points in point_sets:
+        points = np.asarray(points, dtype=np.float64)
+        if points.size:
+            extent = max(extent, float(np.abs(points).max()) + 1)
+    return int(2 ** np.ceil(np.log2(extent * 2)))
+
+
+class TileCache:
+    """
+    Two-level cache of encoded tiles keyed by (version, z, x, y).
+
+    The memory level is an LRU of at most max_tiles entries; the optional
+    disk level lives under cache_dir/<version>/<z>/<x>/<y>.png and is used
+    to refill memory after eviction or a restart.
+    """
+
+    def __init__(self, cache_dir=None, max_tiles=MEMORY_TILES):
+        self.cache_dir = cache_dir
+        self.max_tiles = max_tiles
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _path(self, key):
+        version, z, x, y = key
+        return os.path.join(self.cache_dir, str(version), str(z), str(x), f"{y}.png")
+
+    def get(self, key):
+        with self.lock:
+            png = self.memory.get(key)
+            if png is not None:
+                self.memory.move_to_end(key)
+                self.stats['hits'] += 1
+                return png
+
+        if self.cache_dir and os.path.exists(self._path(key)):
+            with open(self._path(key), 'rb') as f:
+                png = f.read()
+            self._remember(key, png)
+            self.stats['disk_hits'] += 1
+            return png
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key, png):
+        self._remember(key, png)
+        if self.cache_dir:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see half a tile
+            with open(path + '.tmp', 'wb') as f:
+                f.write(png)
+            os.replace(path + '.tmp', path)
+
+    def _remember(self, key, png):
+        with self.lock:
+            self.memory[key] = png
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_tiles:
+                self.memory.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, keys):
+        """Drop specific tiles from memory and disk"""
+        with self.lock:
+            for key in keys:
+                self.memory.pop(key, None)
+        if self.cache_dir:
+            for key in keys:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+
+    def clear(self, version):
+        """Drop every tile of one map version"""
+        with self.lock:
+            for key in [k for k in self.memory if k[0] == version]:
+                del self.memory[key]
+        if self.cache_dir:
+            shutil.rmtree(os.path.join(self.cache_dir, str(version)), ignore_errors=True)
+
+
+class TileRenderer:
+    """
+    Render a decoded map as a pyramid of fixed-size PNG tiles.
+
+    Zoom 0 is one tile covering the whole world, a square centred on the
+    dock; each level doubles the tiles per side. Tile (x, y) counts from
+    the top-left corner, so y grows towards negative map Y, like the
+    images visualize_rooms() produces.
+
+    Tiles are rendered on first request with numpy (rooms, coverage, then
+    path on top) and kept in a TileCache under this map's version.
+    add_path() appends new path points and invalidates only the tiles its
+    new segments pass through.
+
+    Args:
+        version: Map version string (e.g. a content hash); part of every cache key.
+        rooms: Room dicts from TuyaRoomMapDecoder.decode_rooms().
+        path: (N, 2) path points in mm.
+        coverage: (grid, x0, y0, cell_mm) where grid[row, col] covers
+                  x0 + col * cell_mm, y0 + row * cell_mm.
+        cache: TileCache to use (memory-only by default).
+    """
+
+    def __init__(self, version, rooms=None, path=None, coverage=None, cache=None,
+                 tile_size=TILE_SIZE):
+        self.version = version
+        self.rooms = rooms or []
+        self.path = np.asarray(path if path is not None else [], dtype=np.float64).reshape(-1, 2)
+        self.coverage = coverage
+        self.cache = cache if cache is not None else TileCache()
+        self.tile_size = tile_size
+        self.lock = threading.Lock()
+
+        corners = [c for room in self.rooms for c in room['corners']]
+        self.world = world_size(corners, self.path, self._coverage_corners())
+        self.max_zoom = max(0, int(np.ceil(np.log2(self.world / (tile_size * FINEST_MM_PER_PX)))))
+        self._coverage_max = float(coverage[0].max()) if coverage is not None and coverage[0].size else 0.0
+
+    def _coverage_corners(self):
+        if self.coverage is None:
+            return []
+        grid, x0, y0, cell = self.coverage
+        return [(x0, y0), (x0 + grid.shape[1] * cell, y0 + grid.shape[0] * cell)]
+
+    def tile_span(self, z):
+        """Width of one tile at zoom z, in mm"""
+        return self.world / (1 << z)
+
+    def tile_origin(self, z, x, y):
+        """Map coordinates of a tile's top-left corner"""
+        span = self.tile_span(z)
+        return -self.world / 2 + x * span, self.world / 2 - y * span
+
+    def tile(self, z, x, y):
+        """PNG bytes for one tile, from cache or freshly rendered"""
+        if not (0 <= z <= self.max_zoom and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValueError(f"Tile {z}/{x}/{y} is outside the pyramid (max zoom {self.max_zoom})")
+
+        key = (self.version, z, x, y)
+        png = self.cache.get(key)
+        if png is None:
+            # Held through put() so add_path() can't invalidate a tile mid-render
+            with self.lock, span('tiles.render', z=z, x=x, y=y):
+                png = encode_png(self.render_tile(z, x, y))
+                self.cache.put(key, png)
+        return png
+
+    def render_tile(self, z, x, y):
+        """Rasterize one tile to an (H, W, 4) uint8 array"""
+        size = self.tile_size
+        left, top = self.tile_origin(z, x, y)
+        mm_per_px = self.tile_span(z) / size
+
+        image = np.empty((size, size, 4), dtype=np.float32)
+        image[:] = BACKGROUND
+
+        for i, room in enumerate(self.rooms):
+            self._draw_room(image, room, ROOM_COLORS[i % len(ROOM_COLORS)], left, top, mm_per_px)
+        if self._coverage_max > 0:
+            self._draw_coverage(image, left, top, mm_per_px)
+        if len(self.path) > 1:
+            self._draw_path(image, self.path, left, top, mm_per_px)
+
+        return image.round().astype(np.uint8)
+
+    def _draw_room(self, image, room, color, left, top, mm_per_px):
+        size = self.tile_size
+        bounds = room['bounds']
+        c0 = int(np.floor((bounds['min_x'] - left) / mm_per_px))
+        c1 = int(np.floor((bounds['max_x'] - left) / mm_per_px))
+        r0 = int(np.floor((top - bounds['max_y']) / mm_per_px))
+        r1 = int(np.floor((top - bounds['min_y']) / mm_per_px))
+        if c1 < 0 or r1 < 0 or c0 >= size or r0 >= size:
+            return
+
+        fill = image[max(r0, 0):min(r1, size - 1) + 1, max(c0, 0):min(c1, size - 1) + 1, :3]
+        fill *= 1 - ROOM_ALPHA
+        fill += ROOM_ALPHA * np.asarray(color, dtype=np.float32)
+
+        # Outline, where it falls inside this tile
+        rows = slice(max(r0, 0), min(r1, size - 1) + 1)
+        cols = slice(max(c0, 0), min(c1, size - 1) + 1)
+        for r in (r0, r1):
+            if 0 <= r < size:
+                image[r, cols, :3] = BORDER_COLOR
+        for c in (c0, c1):
+            if 0 <= c < size:
+                image[rows, c, :3] = BORDER_COLOR
+
+    def _draw_coverage(self, image, left, top, mm_per_px):
+        grid, x0, y0, cell = self.coverage
+        centres = (np.arange(self.tile_size) + 0.5) * mm_per_px
+        cols = np.floor((left + centres - x0) / cell).astype(np.int64)
+        rows = np.floor((top - centres - y0) / cell).astype(np.int64)
+        col_ok = (cols >= 0) & (cols < grid.shape[1])
+        row_ok = (rows >= 0) & (rows < grid.shape[0])
+        if not col_ok.any() or not row_ok.any():
+            return
+
+        values = np.zeros((self.tile_size, self.tile_size), dtype=np.float32)
+        values[np.ix_(row_ok, col_ok)] = grid[np.ix_(rows[row_ok], cols[col_ok])]
+        alpha = (COVERAGE_ALPHA * np.clip(values / self._coverage_max, 0, 1))[..., None]
+        image[..., :3] = image[..., :3] * (1 - alpha) + alpha * np.asarray(COVERAGE_COLOR, np.float32)
+
+    def _draw_path(self, image, path, left, top, mm_per_px):
+        size = self.tile_size
+        starts, ends = path[:-1], path[1:]
+        margin = PATH_WIDTH * mm_per_px
+        right, bottom = left + size * mm_per_px, top - size * mm_per_px
+
+        # Only segments whose bounding box reaches this tile
+        near = ((np.minimum(starts[:, 0], ends[:, 0]) <= right + margin)
+                & (np.maximum(starts[:, 0], ends[:, 0]) >= left - margin)
+                & (np.minimum(starts[:, 1], ends[:, 1]) <= top + margin)
+                & (np.maximum(starts[:, 1], ends[:, 1]) >= bottom - margin))
+        if not near.any():
+            return
+
+        # Sample every segment at half-pixel steps
+        points = sample_segments(starts[near], ends[near], mm_per_px / 2)
+        cols = np.floor((points[:, 0] - left) / mm_per_px).astype(np.int64)
+        rows = np.floor((top - points[:, 1]) / mm_per_px).astype(np.int64)
+        for dr in range(PATH_WIDTH):
+            for dc in range(PATH_WIDTH):
+                r, c = rows + dr - PATH_WIDTH // 2, cols + dc - PATH_WIDTH // 2
+                ok = (r >= 0) & (r < size) & (c >= 0) & (c < size)
+                image[r[ok], c[ok], :3] = PATH_COLOR
+
+    def tiles_for_segments(self, starts, ends):
+        """Every (z, x, y) a set of segments is drawn on, across all zoom levels"""
+        touched = set()
+        for z in range(self.max_zoom + 1):
+            span = self.tile_span(z)
+            margin = PATH_WIDTH * span / self.tile_size
+            points = sample_segments(starts, ends, span / 2)
+            for dx in (-margin, margin):
+                for dy in (-margin, margin):
+                    xs = np.floor((points[:, 0] + dx + self.world / 2) / span).astype(np.int64)
+                    ys = np.floor((self.world / 2 - points[:, 1] - dy) / span).astype(np.int64)
+                    ok = (xs >= 0) & (xs < (1 << z)) & (ys >= 0) & (ys < (1 << z))
+                    tiles = np.unique(np.stack([xs[ok], ys[ok]], axis=1), axis=0)
+                    touched.update((z, int(x), int(y)) for x, y in tiles)
+        return touched
+
+    def add_path(self, points):
+        """
+        Append new path points; returns the set of (z, x, y) tiles invalidated.
+
+        If the new points leave the world square, the pyramid is rebuilt at
+        a larger size and every tile of this version is invalidated (None).
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return self.update_path(np.concatenate([self.path, points]))
+
+    def update_path(self, path):
+        """
+        Replace the whole path, invalidating only the tiles where it changed.
+
+        Useful when each push carries the full (re-simplified) path so far:
+        tiles under the common prefix of the old and new path are kept.
+        Returns the invalidated (z, x, y) set, or None after a world resize.
+        """
+        path = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+        with self.lock:
+            old = self.path
+            self.path = path
+
+            if world_size(path) > self.world:
+                self.world = world_size(path, [c for r in self.rooms for c in r['corners']],
+                                        self._coverage_corners())
+                self.max_zoom = max(0, int(np.ceil(np.log2(
+                    self.world / (self.tile_size * FINEST_MM_PER_PX)))))
+                self.cache.clear(self.version)
+                return None
+
+            # First point where the paths differ; segments from there on changed
+            n = min(len(old), len(path))
+            differs = np.flatnonzero((old[:n] != path[:n]).any(axis=1))
+            common = differs[0] if len(differs) else n
+            touched = set()
+            for tail in (old[max(common - 1, 0):], path[max(common - 1, 0):]):
+                if len(tail) > 1:
+                    touched |= self.tiles_for_segments(tail[:-1], tail[1:])
+            self.cache.invalidate([(self.version,) + t for t in touched])
+        return touched
+
+    def render_pyramid(self, max_zoom=None):
+        """Render (or load from cache) every tile down to max_zoom; returns the count"""
+        max_zoom = self.max_zoom if max_zoom is None else min(max_zoom, self.max_zoom)
+        count = 0
+        for z in range(max_zoom + 1):
+            for x in range(1 << z):
+                for y in range(1 << z):
+                    self.tile(z, x, y)
+                    count += 1
+        return count
+
+
+def sample_segments(starts, ends, step, return_owner=False):
+    """
+    Points along each segment, no more than step apart (endpoints included).
+
+    With return_owner=True also returns the segment index of every point.
+    """
+    lengths = np.hypot(*(ends - starts).T)
+    counts = np.ceil(lengths / step).astype(np.int64) + 1
+    owner = np.repeat(np.arange(len(starts)), counts)
+    # Position of each sample within its own segment, 0..1
+    first = np.cumsum(counts) - counts
+    t = (np.arange(counts.sum()) - first[owner]) / np.maximum(counts[owner] - 1, 1)
+    points = starts[owner] + (ends[owner] - starts[owner]) * t[:, None]
+    if return_owner:
+        return points, owner
+    return points
+
+
+def load_map_json(filename):
+    """Rooms and path from rooms_decoded.json, map_decoded.json or map_coords.json"""
+    with open(filename) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return [], data
+    return data.get('rooms', []), data.get('coordinates', [])
+
+
+# Usage: python map_tiles.py rooms_decoded.json [tiles/] [max_zoom]
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python map_tiles.py <map.json> [output_dir] [max_zoom]")
+        sys.exit(1)
+
+    import hashlib
+    source = sys.argv[1]
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else 'tiles'
+    with open(source, 'rb') as f:
+        version = hashlib.sha1(f.read()).hexdigest()[:12]
+
+    rooms, path = load_map_json(source)
+    renderer = TileRenderer(version, rooms=rooms, path=path, cache=TileCache(output_dir))
+    count = renderer.render_pyramid(int(sys.argv[3]) if len(sys.argv) > 3 else None)
+    print(f"✓ {count} tiles ({renderer.world} mm world, zoom 0-{renderer.max_zoom}) "
+          f"in {os.path.join(output_dir, version)}")
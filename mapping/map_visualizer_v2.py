@@ -1,14 +1,49 @@
 import base64
+import os
 import struct
+import sys
 import json
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import numpy as np
 
+from map_export import export_npz
+from room_area import area_report
+from map_stream import iter_rooms, DEFAULT_CHUNK_ROOMS
+
+try:
+    from tracing import traced
+except ImportError:
+    # utils/ isn't on the path (only entry scripts put it there): run untraced
+    if os.environ.get('VACUUM_TRACE'):
+        print("⚠ VACUUM_TRACE is set but utils/tracing.py can't be imported; "
+              f"{__name__} runs untraced", file=sys.stderr)
+    def traced(name=None):
+        return lambda func: func
+
+
 class TuyaRoomMapDecoder:
     def __init__(self, base64_data):
         self.data = base64.b64decode(base64_data)
         self.offset = 0
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Build a decoder over an already-decoded binary payload"""
+        decoder = cls('')
+        decoder.data = bytes(data)
+        return decoder
+    
+    @staticmethod
+    def iter_rooms(base64_source, chunk_rooms=DEFAULT_CHUNK_ROOMS):
+        """
+        Rectangular rooms as (chunk_rooms, 5) int32 arrays of id, min_x,
+        min_y, max_x, max_y, decoded incrementally.
+
+        Same rooms and ids as decode_rooms(), without building a dict per
+        room or holding the decoded payload.
+        """
+        return iter_rooms(base64_source, chunk_rooms)
         
     def read_byte(self):
         val = self.data[self.offset]
@@ -25,6 +60,7 @@ class TuyaRoomMapDecoder:
         self.offset += 2
         return val
     
+    @traced()
     def decode_rooms(self):
         """Decode room boundary data"""
         print("="*60)
@@ -84,9 +120,13 @@ class TuyaRoomMapDecoder:
                         print(f"  Bounds: ({min_x}, {min_y}) to ({max_x}, {max_y})")
                         print(f"  Size: {abs(max_x - min_x)} x {abs(max_y - min_y)}")
                         print(f"  Area: {room['area']} sq units")
+            else:
+                # Trailing bytes too short for another room
+                break
         
         return rooms
     
+    @traced()
     def visualize_rooms(self, rooms, output_file='room_map_proper.png'):
         """Visualize the room map properly"""
         if not rooms:
@@ -124,6 +164,9 @@ class TuyaRoomMapDecoder:
                 ax.text(center_x, center_y, f"R{room['id'] + 1}", 
                        ha='center', va='center', fontsize=12, fontweight='bold')
         
+        # Patches don't update the data limits on their own
+        ax.autoscale_view()
+        
         # Set axis properties
         ax.set_aspect('equal')
         ax.grid(True, alpha=0.3)
@@ -141,34 +184,41 @@ class TuyaRoomMapDecoder:
         print(f"\n✓ Saved room map to {output_file}")
         plt.close()
 
-# Decode the map
-map_data_b64 = 'qgABFxeqAAMpAQAqqgBcGwUABAEWAzIDlQMyA5UB2AEWAdgABAW+ArAHIAKwByAAxAW+AMQABP4q/+UAQP/lAED+vf4q/r0ABP+1/KECivyhAor6Bf+1+gUABADk/vUBrv71Aa7+KgDk/iqQqgACEwATqgADFQEAFg=='
+if __name__ == "__main__":
+    # Decode the map
+    map_data_b64 = 'qgABFxeqAAMpAQAqqgBcGwUABAEWAzIDlQMyA5UB2AEWAdgABAW+ArAHIAKwByAAxAW+AMQABP4q/+UAQP/lAED+vf4q/r0ABP+1/KECivyhAor6Bf+1+gUABADk/vUBrv71Aa7+KgDk/iqQqgACEwATqgADFQEAFg=='
 
-decoder = TuyaRoomMapDecoder(map_data_b64)
-rooms = decoder.decode_rooms()
+    decoder = TuyaRoomMapDecoder(map_data_b64)
+    rooms = decoder.decode_rooms()
 
-# Save room data
-output_data = {
-    'total_rooms': len(rooms),
-    'rooms': rooms
-}
+    # Save room data
+    output_data = {
+        'total_rooms': len(rooms),
+        'rooms': rooms
+    }
 
-with open('rooms_decoded.json', 'w') as f:
-    json.dump(output_data, f, indent=2)
-print(f"\n✓ Saved room data to rooms_decoded.json")
+    with open('rooms_decoded.json', 'w') as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n✓ Saved room data to rooms_decoded.json")
+    export_npz('rooms_decoded.npz', rooms=rooms, metadata={'total_rooms': len(rooms)}, fmt='rooms')
 
-# Visualize
-if rooms:
-    decoder.visualize_rooms(rooms)
+    # Visualize
+    if rooms:
+        decoder.visualize_rooms(rooms)
 
-# Print summary
-print("\n" + "="*60)
-print("SUMMARY")
-print("="*60)
-print(f"Total rooms detected: {len(rooms)}")
-print(f"Total mapped area: {sum(r['area'] for r in rooms)} sq units")
+    # Print summary
+    print("\n" + "="*60)
+    print("SUMMARY")
+    print("="*60)
+    print(f"Total rooms detected: {len(rooms)}")
+    # Rectangles overlap, so the floor area is their union, not their sum
+    report = area_report(rooms)
+    print(f"Total mapped area: {report['union_area']} sq units")
+    if report['overlaps']:
+        print(f"  ({report['overlaps']} overlapping pairs; rooms sum to {report['summed_area']} sq units)")
 
-# Convert units (assuming millimeters)
-for room in rooms:
-    area_sqm = room['area'] / 1_000_000  # mm² to m²
-    print(f"Room {room['id'] + 1}: {area_sqm:.2f} m²")
\ No newline at end of file
+    # Convert units (assuming millimeters)
+    for room, areas in zip(rooms, report['rooms']):
+        area_sqm = room['area'] / 1_000_000  # mm² to m²
+        exclusive_sqm = areas['exclusive_area'] / 1_000_000
+        print(f"Room {room['id'] + 1}: {area_sqm:.2f} m² ({exclusive_sqm:.2f} m² not shared with other rooms)")
\ No newline at end of file
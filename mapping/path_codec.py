@@ -0,0 +1,243 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+# File layout:
+#   header      MAGIC, version, flags, block_size, point_count, block_count
+#   block index block_count x (file offset, byte length)
+#   blocks      zigzag delta varints of interleaved x/y, optionally zlib'd
+#
+# Every block starts its deltas from (0, 0), so any block can be decoded
+# on its own without touching the rest of the file.
+MAGIC = b'VPTH'
+VERSION = 1
+FLAG_ZLIB = 0x01
+DEFAULT_BLOCK_SIZE = 4096
+
+HEADER = struct.Struct('<4sBBHII')
+INDEX_ENTRY = struct.Struct('<II')
+
+
+def zigzag_encode(values):
+    """Map signed ints to unsigned so small magnitudes stay small"""
+    v = values.astype(np.int64)
+    return ((v << 1) ^ (v >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(values):
+    """Inverse of zigzag_encode()"""
+    v = values.astype(np.int64)
+    return (v >> 1) ^ -(v & 1)
+
+
+def varint_encode(values):
+    """Pack unsigned ints as LEB128 varints (vectorized)"""
+    v = np.asarray(values, dtype=np.uint64)
+    if len(v) == 0:
+        return b''
+
+    # Bytes needed per value (at least one, even for zero)
+    nbytes = np.ones(len(v), dtype=np.int64)
+    limit = np.uint64(0x80)
+    while True:
+        more = v >= limit
+        if not more.any():
+            break
+        nbytes += more
+        limit = limit << np.uint64(7)
+
+    # Byte k of each value, with the continuation bit on all but the last
+    owner = np.repeat(np.arange(len(v)), nbytes)
+    ends = np.cumsum(nbytes)
+    k = np.arange(ends[-1]) - np.repeat(ends - nbytes, nbytes)
+    out = (v[owner] >> (np.uint64(7) * k.astype(np.uint64))) & np.uint64(0x7f)
+    out |= np.where(k < nbytes[owner] - 1, 0x80, 0).astype(np.uint64)
+    return out.astype(np.uint8).tobytes()
+
+
+def varint_decode(data):
+    """Unpack a buffer of LEB128 varints (vectorized)"""
+    b = np.frombuffer(data, dtype=np.uint8)
+    if len(b) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    if b[-1] & 0x80:
+        raise ValueError("Truncated varint stream")
+
+    last = (b & 0x80) == 0
+    starts = np.r_[0, np.flatnonzero(last)[:-1] + 1]
+    k = np.arange(len(b)) - np.repeat(starts, np.diff(np.r_[starts, len(b)]))
+    parts = (b & 0x7f).astype(np.uint64) << (np.uint64(7) * k.astype(np.uint64))
+    return np.add.reduceat(parts, starts)
+
+
+def _as_int16_points(points):
+    pts = np.asarray(points).reshape(-1, 2)
+    if len(pts) and (pts.min() < -32768 or pts.max() > 32767):
+        raise ValueError("Coordinates out of int16 range")
+    return pts.astype(np.int16)
+
+
+def _encode_block(block, compress):
+    deltas = np.diff(block.astype(np.int32), axis=0, prepend=np.zeros((1, 2), np.int32))
+    payload = varint_encode(zigzag_encode(deltas.reshape(-1)))
+    return zlib.compress(payload) if compress else payload
+
+
+def _decode_block(payload, compressed):
+    if compressed:
+        payload = zlib.decompress(payload)
+    deltas = zigzag_decode(varint_decode(payload)).reshape(-1, 2)
+    return np.cumsum(deltas, axis=0).astype(np.int16)
+
+
+def encode_path(points, block_size=DEFAULT_BLOCK_SIZE, compress=True):
+    """
+    Encode a path into the compact binary format.
+
+    Args:
+        points: Sequence of (x, y) pairs or an (N, 2) array (int16 range).
+        block_size: Points per independently decodable block.
+        compress: zlib-compress each block.
+
+    Returns:
+        bytes
+    """
+    if not 0 < block_size <= 0xffff:
+        raise ValueError("block_size must be between 1 and 65535")
+
+    pts = _as_int16_points(points)
+    blocks = [_encode_block(pts[i:i + block_size], compress)
+              for i in range(0, len(pts), block_size)]
+
+    flags = FLAG_ZLIB if compress else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, block_size, len(pts), len(blocks))
+
+    offset = HEADER.size + INDEX_ENTRY.size * len(blocks)
+    index = bytearray()
+    for block in blocks:
+        index += INDEX_ENTRY.pack(offset, len(block))
+        offset += len(block)
+
+    return header + bytes(index) + b''.join(blocks)
+
+
+def decode_path(data):
+    """Decode a whole buffer produced by encode_path() into an (N, 2) int16 array"""
+    reader = PathReader(data)
+    return reader.read_all()
+
+
+class PathReader:
+    """Random-access reader over an encoded path buffer"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        if len(buffer) < HEADER.size:
+            raise ValueError("Buffer too small for path header")
+
+        magic, version, flags, block_size, count, blocks = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a path file (magic {magic!r})")
+        if version != VERSION:
+            raise ValueError(f"Unsupported path format version {version}")
+
+        self.compressed = bool(flags & FLAG_ZLIB)
+        self.block_size = block_size
+        self.point_count = count
+        self.block_count = blocks
+        self.index = [INDEX_ENTRY.unpack_from(buffer, HEADER.size + i * INDEX_ENTRY.size)
+                      for i in range(blocks)]
+
+    def __len__(self):
+        return self.point_count
+
+    def read_block(self, i):
+        """Decode a single block"""
+        offset, length = self.index[i]
+        return _decode_block(bytes(self.buffer[offset:offset + length]), self.compressed)
+
+    def read_slice(self, start, stop):
+        """Decode points[start:stop], touching only the blocks that cover it"""
+        start, stop, _ = slice(start, stop).indices(self.point_count)
+        if start >= stop:
+            return np.zeros((0, 2), dtype=np.int16)
+
+        first = start // self.block_size
+        last = (stop - 1) // self.block_size
+        chunk = np.concatenate([self.read_block(i) for i in range(first, last + 1)])
+        base = first * self.block_size
+        return chunk[start - base:stop - base]
+
+    def read_all(self):
+        """Decode every point"""
+        if self.block_count == 0:
+            return np.zeros((0, 2), dtype=np.int16)
+        return np.concatenate([self.read_block(i) for i in range(self.block_count)])
+
+
+class PathArchive(PathReader):
+    """PathReader over a memory-mapped file"""
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        try:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self.file.close()
+            raise ValueError(f"{filename} is empty")
+        super().__init__(self.mmap)
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_path(filename, points, block_size=DEFAULT_BLOCK_SIZE, compress=True):
+    """Encode a path and save it to filename, returns bytes written"""
+    data = encode_path(points, block_size, compress)
+    with open(filename, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def load_json_points(filename):
+    """Read coordinates from map_coords.json or map_decoded.json"""
+    with open(filename) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('coordinates', [])
+    return data
+
+
+# Usage: python path_codec.py map_coords.json [output.vpath]
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python path_codec.py <coords.json> [output.vpath]")
+        sys.exit(1)
+
+    source = sys.argv[1]
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0] + '.vpath'
+
+    points = load_json_points(source)
+    size = write_path(target, points)
+
+    json_size = os.path.getsize(source)
+    print(f"Points:      {len(points)}")
+    print(f"JSON size:   {json_size} bytes")
+    print(f"Binary size: {size} bytes ({size / max(len(points), 1):.2f} bytes/point)")
+
+    with PathArchive(target) as archive:
+        assert np.array_equal(archive.read_all(), np.asarray(points, dtype=np.int16).reshape(-1, 2))
+    print(f"✓ Saved to {target} (round trip verified)")
@@ -0,0 +1,104 @@
+import numpy as np
+
+# Default tolerance for path simplification, in millimetres
+DEFAULT_TOLERANCE_MM = 20.0
+
+
+def _segment_distances(points, start, end):
+    """Distance of points[start+1:end] to the segment points[start] -> points[end]"""
+    a = points[start]
+    b = points[end]
+    inner = points[start + 1:end]
+
+    ab = b - a
+    length_sq = float(ab @ ab)
+    if length_sq == 0.0:
+        # Closed loop (start == end): fall back to distance from the point
+        return np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+
+    # Project onto the segment and clamp so we measure to the segment, not the line
+    t = np.clip(((inner - a) @ ab) / length_sq, 0.0, 1.0)
+    closest = a + t[:, None] * ab
+    return np.hypot(inner[:, 0] - closest[:, 0], inner[:, 1] - closest[:, 1])
+
+
+def simplify_path(points, tolerance_mm=DEFAULT_TOLERANCE_MM):
+    """
+    Simplify a path with the Ramer-Douglas-Peucker algorithm.
+
+    Uses an explicit work stack instead of recursion, and measures every
+    candidate segment with one vectorized NumPy pass.
+
+    Args:
+        points: Sequence of (x, y) pairs or an (N, 2) array, in millimetres.
+        tolerance_mm: Maximum allowed deviation from the original path.
+
+    Returns:
+        (simplified, report) where simplified is an (M, 2) array of the kept
+        points and report is a dict with the reduction ratio and the maximum
+        deviation of any dropped point from the simplified path.
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(pts)
+
+    if n < 3:
+        return pts.copy(), {
+            'input_points': n,
+            'output_points': n,
+            'reduction_ratio': 0.0,
+            'max_deviation_mm': 0.0,
+            'tolerance_mm': tolerance_mm,
+        }
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        dists = _segment_distances(pts, start, end)
+        idx = int(np.argmax(dists))
+        if dists[idx] > tolerance_mm:
+            split = start + 1 + idx
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    kept = np.flatnonzero(keep)
+
+    # Measure how far the dropped points actually are from the result
+    max_dev = 0.0
+    for start, end in zip(kept[:-1], kept[1:]):
+        if end - start >= 2:
+            max_dev = max(max_dev, float(_segment_distances(pts, start, end).max()))
+
+    report = {
+        'input_points': n,
+        'output_points': len(kept),
+        'reduction_ratio': 1.0 - len(kept) / n,
+        'max_deviation_mm': round(max_dev, 2),
+        'tolerance_mm': tolerance_mm,
+    }
+    return pts[kept], report
+
+
+def format_report(report):
+    """One-line summary of a simplify_path() report"""
+    return (f"Simplified {report['input_points']} -> {report['output_points']} points "
+            f"({report['reduction_ratio'] * 100:.1f}% removed, "
+            f"max deviation {report['max_deviation_mm']} mm, "
+            f"tolerance {report['tolerance_mm']} mm)")
+
+
+if __name__ == "__main__":
+    # Quick demo on a noisy back-and-forth cleaning pattern
+    rng = np.random.default_rng(0)
+    xs = np.tile(np.r_[np.linspace(0, 3000, 300), np.linspace(3000, 0, 300)], 5)
+    ys = np.repeat(np.arange(10) * 250, 300).astype(float)
+    path = np.column_stack([xs, ys]) + rng.normal(0, 3, (len(xs), 2))
+
+    simplified, report = simplify_path(path, tolerance_mm=DEFAULT_TOLERANCE_MM)
+    print(format_report(report))
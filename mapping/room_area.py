@@ -0,0 +1,148 @@
+import json
+import sys
+
+from room_graph import room_bounds
+
+
+class CoverTree:
+    """
+    Segment tree over compressed y intervals for the area sweep.
+
+    count[node] is how many active rectangles cover the node's whole
+    interval; covered[node] is the length of its interval covered by at
+    least one. A covered node never needs pushing down, so add() stays
+    O(log n) without lazy propagation.
+    """
+
+    def __init__(self, ys):
+        self.ys = ys
+        size = max(len(ys) - 1, 1)
+        self.count = [0] * (4 * size)
+        self.covered = [0] * (4 * size)
+
+    @property
+    def length(self):
+        """Total y length covered right now"""
+        return self.covered[1]
+
+    def add(self, y0, y1, delta, node=1, lo=0, hi=None):
+        """Cover (delta=1) or uncover (delta=-1) the ys indices [y0, y1)"""
+        if hi is None:
+            hi = len(self.ys) - 1
+        if y1 <= lo or hi <= y0:
+            return
+        if y0 <= lo and hi <= y1:
+            self.count[node] += delta
+        else:
+            mid = (lo + hi) // 2
+            self.add(y0, y1, delta, 2 * node, lo, mid)
+            self.add(y0, y1, delta, 2 * node + 1, mid, hi)
+        if self.count[node]:
+            self.covered[node] = self.ys[hi] - self.ys[lo]
+        elif hi - lo == 1:
+            self.covered[node] = 0
+        else:
+            self.covered[node] = self.covered[2 * node] + self.covered[2 * node + 1]
+
+
+def union_area(rects):
+    """
+    Exact area covered by the union of (min_x, min_y, max_x, max_y) rectangles.
+
+    A sweep-line over x: each rectangle adds its y interval to a
+    CoverTree at min_x and removes it at max_x, and between consecutive
+    events the covered y length times the x step is added. O(n log n).
+    """
+    rects = [r for r in rects if r[2] > r[0] and r[3] > r[1]]
+    if not rects:
+        return 0
+    ys = sorted({y for r in rects for y in (r[1], r[3])})
+    index = {y: i for i, y in enumerate(ys)}
+    events = []
+    for min_x, min_y, max_x, max_y in rects:
+        events.append((min_x, 1, index[min_y], index[max_y]))
+        events.append((max_x, -1, index[min_y], index[max_y]))
+    events.sort()
+
+    tree = CoverTree(ys)
+    area = 0
+    last_x = events[0][0]
+    for x, delta, y0, y1 in events:
+        area += tree.length * (x - last_x)
+        tree.add(y0, y1, delta)
+        last_x = x
+    return area
+
+
+def overlapping_pairs(rects):
+    """(i, j) pairs (i < j) of rectangles whose interiors intersect, by a sweep over x"""
+    order = sorted(range(len(rects)), key=lambda i: rects[i][0])
+    active = []
+    pairs = []
+    for i in order:
+        min_x, min_y, max_x, max_y = rects[i]
+        active = [j for j in active if rects[j][2] > min_x]
+        for j in active:
+            if rects[j][1] < max_y and min_y < rects[j][3]:
+                pairs.append((min(i, j), max(i, j)))
+        active.append(i)
+    return pairs
+
+
+def exclusive_areas(rects):
+    """
+    Area of each rectangle not covered by any other.
+
+    Each rectangle's overlap is the union of its overlapping neighbours
+    clipped to it, so the cost follows the number of overlaps rather than
+    n squared.
+    """
+    neighbours = [[] for _ in rects]
+    for i, j in overlapping_pairs(rects):
+        neighbours[i].append(j)
+        neighbours[j].append(i)
+
+    areas = []
+    for i, (min_x, min_y, max_x, max_y) in enumerate(rects):
+        own = max(max_x - min_x, 0) * max(max_y - min_y, 0)
+        clipped = [(max(min_x, rects[j][0]), max(min_y, rects[j][1]),
+                    min(max_x, rects[j][2]), min(max_y, rects[j][3])) for j in neighbours[i]]
+        areas.append(own - union_area(clipped))
+    return areas
+
+
+def area_report(rooms):
+    """
+    Area summary for decoded rooms (nested 'bounds' or flat keys).
+
+    summed_area double-counts overlaps; union_area is the floor area
+    actually covered, and each room's exclusive_area is the part no other
+    room covers.
+    """
+    rects = [room_bounds(room) for room in rooms]
+    exclusive = exclusive_areas(rects)
+    return {
+        'summed_area': sum(max(r[2] - r[0], 0) * max(r[3] - r[1], 0) for r in rects),
+        'union_area': union_area(rects),
+        'overlaps': len(overlapping_pairs(rects)),
+        'rooms': [{'id': room.get('id', index), 'exclusive_area': area}
+                  for index, (room, area) in enumerate(zip(rooms, exclusive))],
+    }
+
+
+# Usage: python room_area.py rooms_decoded.json
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python room_area.py <rooms_decoded.json>")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        data = json.load(f)
+    rooms = data['rooms'] if isinstance(data, dict) else data
+
+    report = area_report(rooms)
+    print(f"{len(rooms)} rooms, {report['overlaps']} overlapping pairs")
+    print(f"Union area: {report['union_area'] / 1_000_000:.2f} m² "
+          f"(summed room area {report['summed_area'] / 1_000_000:.2f} m²)")
+    for room in report['rooms']:
+        print(f"  Room {room['id'] + 1}: {room['exclusive_area'] / 1_000_000:.2f} m² exclusive")
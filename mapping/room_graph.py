@@ -0,0 +1,248 @@
+import heapq
+import json
+import math
+import sys
+
+# Gap between two room edges still counted as one wall (wall thickness
+# plus decoder rounding), in map units (mm)
+DEFAULT_WALL_MM = 150
+# Shortest shared stretch of wall that can hold a doorway
+DEFAULT_MIN_DOOR_MM = 500
+# Where the robot starts and ends (docs/PROTOCOL.md: dock is the origin)
+DOCK = (0.0, 0.0)
+
+
+def room_bounds(room):
+    """(min_x, min_y, max_x, max_y) of a decoded room (nested 'bounds' or flat keys)"""
+    bounds = room.get('bounds', room)
+    return bounds['min_x'], bounds['min_y'], bounds['max_x'], bounds['max_y']
+
+
+def shared_edges(rects, wall=DEFAULT_WALL_MM, min_door=DEFAULT_MIN_DOOR_MM):
+    """
+    Pairs of rectangles that share a wall, found with a sweep-line.
+
+    rects is a list of (min_x, min_y, max_x, max_y). Returns
+    {(i, j): (door_x, door_y, length)} with i < j, where the door point is
+    the middle of the shared stretch of wall.
+
+    Vertical walls: every right edge and left edge becomes an event at its
+    x, and the sweep keeps only the edges within wall of the current x as
+    active, so each edge is compared with its few neighbours across the
+    wall instead of with every room. Horizontal walls are the same sweep
+    over y.
+    """
+    edges = {}
+    for axis in (0, 1):
+        other = 1 - axis
+        # (position, side, lo, hi, room); side 0 = far edge (right/top), 1 = near edge
+        events = []
+        for index, rect in enumerate(rects):
+            lo, hi = rect[other], rect[other + 2]
+            events.append((rect[axis + 2], 0, lo, hi, index))
+            events.append((rect[axis], 1, lo, hi, index))
+        events.sort()
+
+        active = []
+        for position, side, lo, hi, index in events:
+            active = [event for event in active if position - event[0] <= wall]
+            for a_position, a_side, a_lo, a_hi, a_index in active:
+                if a_side == side or a_index == index:
+                    continue
+                start, end = max(lo, a_lo), min(hi, a_hi)
+                if end - start < min_door:
+                    continue
+                wall_at = (position + a_position) / 2
+                door = ((wall_at, (start + end) / 2) if axis == 0
+                        else ((start + end) / 2, wall_at))
+                key = (min(index, a_index), max(index, a_index))
+                if key not in edges or edges[key][2] < end - start:
+                    edges[key] = (door[0], door[1], end - start)
+            active.append((position, side, lo, hi, index))
+    return edges
+
+
+class RoomGraph:
+    """
+    Which rooms connect to which, and how far apart they are.
+
+    Nodes are the decoded rooms; an edge joins two rooms whose rectangles
+    share a wall long enough for a doorway (shared_edges()). Travel
+    between neighbours goes centre -> middle of the shared wall -> centre;
+    travel between other rooms follows the shortest chain of doorways.
+    Rooms with no route between them fall back to straight-line distance.
+    """
+
+    def __init__(self, rooms, wall=DEFAULT_WALL_MM, min_door=DEFAULT_MIN_DOOR_MM):
+        self.rooms = rooms
+        self.ids = [room.get('id', index) for index, room in enumerate(rooms)]
+        self.rects = [room_bounds(room) for room in rooms]
+        self.centres = [((r[0] + r[2]) / 2, (r[1] + r[3]) / 2) for r in self.rects]
+        self.doors = shared_edges(self.rects, wall, min_door)
+
+        self.neighbours = [dict() for _ in rooms]
+        for (i, j), (x, y, _) in self.doors.items():
+            cost = math.dist(self.centres[i], (x, y)) + math.dist((x, y), self.centres[j])
+            self.neighbours[i][j] = cost
+            self.neighbours[j][i] = cost
+        self._distances = None
+
+    def edges(self):
+        """[(room_id, room_id, door_x, door_y, wall_length)]"""
+        return [(self.ids[i], self.ids[j], x, y, length)
+                for (i, j), (x, y, length) in sorted(self.doors.items())]
+
+    def _shortest_from(self, source):
+        distance = [math.inf] * len(self.rooms)
+        distance[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > distance[node]:
+                continue
+            for neighbour, cost in self.neighbours[node].items():
+                if d + cost < distance[neighbour]:
+                    distance[neighbour] = d + cost
+                    heapq.heappush(heap, (d + cost, neighbour))
+        return distance
+
+    def distances(self):
+        """Room-to-room travel distance matrix (list of lists, by room index)"""
+        if self._distances is None:
+            matrix = [self._shortest_from(i) for i in range(len(self.rooms))]
+            for i, row in enumerate(matrix):
+                for j, d in enumerate(row):
+                    if d == math.inf:
+                        row[j] = math.dist(self.centres[i], self.centres[j])
+            self._distances = matrix
+        return self._distances
+
+    def room_at(self, point):
+        """Index of the room containing point, else of the nearest room"""
+        def gap(rect):
+            dx = max(rect[0] - point[0], 0, point[0] - rect[2])
+            dy = max(rect[1] - point[1], 0, point[1] - rect[3])
+            return math.hypot(dx, dy)
+        return min(range(len(self.rects)), key=lambda i: gap(self.rects[i]))
+
+    def dock_distances(self, dock=DOCK):
+        """Travel distance from the dock to each room (via the room it sits in)"""
+        first = self.room_at(dock)
+        to_first = math.dist(dock, self.centres[first])
+        return [to_first + d for d in self.distances()[first]]
+
+
+def _tour_length(order, matrix, start, return_to_dock):
+    if not order:
+        return 0.0
+    length = start[order[0]] + sum(matrix[a][b] for a, b in zip(order, order[1:]))
+    return length + start[order[-1]] if return_to_dock else length
+
+
+def nearest_neighbour(matrix, start, rooms=None):
+    """Greedy order: always go to the closest room not yet visited"""
+    remaining = set(range(len(matrix)) if rooms is None else rooms)
+    order = []
+    while remaining:
+        here = start if not order else matrix[order[-1]]
+        nearest = min(remaining, key=lambda room: (here[room], room))
+        order.append(nearest)
+        remaining.discard(nearest)
+    return order
+
+
+def two_opt(order, matrix, start, return_to_dock=True):
+    """
+    Improve an order by reversing stretches of it while that shortens the tour.
+
+    The dock is a fixed endpoint: position -1 (and, with return_to_dock,
+    position len(order)) costs start[room] to reach.
+    """
+    order = list(order)
+
+    def cost(a, b):
+        # None stands for the dock
+        if a is None and b is None:
+            return 0.0
+        if a is None or b is None:
+            return start[b if a is None else a]
+        return matrix[a][b]
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            before = order[i - 1] if i > 0 else None
+            for k in range(i + 1, len(order)):
+                if k + 1 < len(order):
+                    after = order[k + 1]
+                elif return_to_dock:
+                    after = None
+                else:
+                    after = False
+                # Reversing order[i..k] replaces edges before->i and k->after
+                old = cost(before, order[i])
+                new = cost(before, order[k])
+                if after is not False:
+                    old += cost(order[k], after)
+                    new += cost(order[i], after)
+                if new < old - 1e-9:
+                    order[i:k + 1] = reversed(order[i:k + 1])
+                    improved = True
+    return order
+
+
+def plan_route(rooms, dock=DOCK, return_to_dock=True, selected=None,
+               wall=DEFAULT_WALL_MM, min_door=DEFAULT_MIN_DOOR_MM):
+    """
+    Short visiting order for a multi-room clean, starting at the dock.
+
+    selected limits the plan to those room ids (default: all rooms).
+    Returns a dict with the planned order (room ids), its estimated travel
+    distance, the distance of the rooms in their decoded order, and the
+    saving in mm and percent.
+    """
+    graph = RoomGraph(rooms, wall, min_door)
+    if not rooms:
+        return {'order': [], 'distance_mm': 0.0, 'baseline_mm': 0.0,
+                'saved_mm': 0.0, 'saved_pct': 0.0, 'doors': 0}
+    matrix = graph.distances()
+    start = graph.dock_distances(dock)
+
+    index_of = {room_id: index for index, room_id in enumerate(graph.ids)}
+    wanted = list(range(len(rooms))) if selected is None else [index_of[r] for r in selected]
+
+    order = two_opt(nearest_neighbour(matrix, start, wanted), matrix, start, return_to_dock)
+    distance = _tour_length(order, matrix, start, return_to_dock)
+    baseline = _tour_length(wanted, matrix, start, return_to_dock)
+    return {
+        'order': [graph.ids[i] for i in order],
+        'distance_mm': round(distance, 1),
+        'baseline_mm': round(baseline, 1),
+        'saved_mm': round(baseline - distance, 1),
+        'saved_pct': round(100 * (baseline - distance) / baseline, 1) if baseline else 0.0,
+        'doors': len(graph.doors),
+    }
+
+
+# Usage: python room_graph.py rooms_decoded.json [room_id ...]
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python room_graph.py <rooms_decoded.json> [room_id ...]")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        data = json.load(f)
+    rooms = data['rooms'] if isinstance(data, dict) else data
+    selected = [int(r) for r in sys.argv[2:]] or None
+
+    graph = RoomGraph(rooms)
+    print(f"{len(rooms)} rooms, {len(graph.doors)} shared walls")
+    for a, b, x, y, length in graph.edges():
+        print(f"  Room {a + 1} <-> Room {b + 1}: door near ({x:.0f}, {y:.0f}), wall {length:.0f} mm")
+
+    plan = plan_route(rooms, selected=selected)
+    print("\nVisit order: dock -> " + " -> ".join(f"Room {r + 1}" for r in plan['order']) + " -> dock")
+    print(f"Estimated travel: {plan['distance_mm'] / 1000:.1f} m "
+          f"(decoded order: {plan['baseline_mm'] / 1000:.1f} m, "
+          f"saved {plan['saved_mm'] / 1000:.1f} m / {plan['saved_pct']}%)")
@@ -0,0 +1,307 @@
+import json
+import os
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from room_graph import room_bounds
+
+DEFAULT_CHANNEL = 'vacuum_map'
+# Control block: sequence counter (odd while a publish is in progress),
+# directory length, then the JSON directory of the current version
+CONTROL = struct.Struct('<QI')
+CONTROL_SIZE = 64 * 1024
+# Versions kept alive after being replaced, so a reader that has just
+# read the directory can still attach
+KEEP_VERSIONS = 2
+# Arrays start on cache-line boundaries inside a segment
+ALIGN = 64
+ATTACH_RETRIES = 5
+
+
+class _Segment(shared_memory.SharedMemory):
+    def __del__(self):
+        try:
+            self.close()
+        except (OSError, BufferError):
+            # Arrays still view it; the mapping goes away with them
+            pass
+
+
+def _open(name, create=False, size=0):
+    """
+    A segment whose lifetime is managed here, not by the resource tracker.
+
+    The publisher unlinks its segments itself; left to the tracker, a
+    reader's exit would unlink them under the publisher. Python 3.13+
+    takes track=False; before that the segment is untracked by hand, which
+    pairs with the register the constructor just did (also when publisher
+    and reader share one tracker, in one process or parent and child).
+    """
+    try:
+        return _Segment(name=name, create=create, size=size, track=False)
+    except TypeError:
+        shm = _Segment(name=name, create=create, size=size)
+        if os.name == 'posix':
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _unlink(shm):
+    """Close and remove a segment opened with _open()"""
+    shm.close()
+    if os.name == 'posix' and getattr(shm, '_track', True):
+        # Before 3.13 unlink() always unregisters; give the tracker an entry to drop
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+def rooms_to_array(rooms):
+    """(N, 5) int32 array of id, min_x, min_y, max_x, max_y"""
+    table = np.empty((len(rooms), 5), dtype=np.int32)
+    for index, room in enumerate(rooms):
+        table[index, 0] = room.get('id', index)
+        table[index, 1:] = room_bounds(room)
+    return table
+
+
+def array_to_rooms(table):
+    """Decoded-room dicts (flat bounds keys) from rooms_to_array() output"""
+    return [{'id': int(room_id), 'min_x': int(min_x), 'min_y': int(min_y),
+             'max_x': int(max_x), 'max_y': int(max_y)}
+            for room_id, min_x, min_y, max_x, max_y in table.tolist()]
+
+
+class SharedArrayPublisher:
+    """
+    Hands decoded NumPy arrays to other processes through shared memory.
+
+    Each publish() copies the arrays once into a new segment and then
+    switches the channel's control block to it; a published version is
+    never written again, so readers can keep zero-copy views of it. The
+    control block holds a sequence counter (seqlock: odd while switching)
+    and a small JSON directory of names, dtypes, shapes and offsets, plus
+    any JSON-able meta (status, battery) that travels with the arrays.
+
+    Replaced segments are unlinked after KEEP_VERSIONS newer ones exist;
+    readers that still map them keep their views, only new attaches fail.
+    """
+
+    def __init__(self, channel=DEFAULT_CHANNEL):
+        self.channel = channel
+        try:
+            self.control = _open(channel, create=True, size=CONTROL_SIZE)
+        except FileExistsError:
+            # Left over from a publisher that crashed; take it over
+            self._remove_stale()
+            self.control = _open(channel, create=True, size=CONTROL_SIZE)
+        # Tells a restarted publisher's versions apart from the old one's
+        self.token = f'{os.getpid()}-{time.time_ns()}'
+        self.sequence = 0
+        self.segments = []
+        self.version = 0
+
+    def _remove_stale(self):
+        old = _open(self.channel)
+        sequence, length = CONTROL.unpack_from(old.buf, 0)
+        version = json.loads(bytes(old.buf[CONTROL.size:CONTROL.size + length]))['version'] if length else 0
+        _unlink(old)
+        for stale in range(max(version - KEEP_VERSIONS, 1), version + 1):
+            try:
+                _unlink(_open(f'{self.channel}_{stale}'))
+            except FileNotFoundError:
+                pass
+
+    def publish(self, meta=None, **arrays):
+        """Publish arrays by name as the next version; returns the version number"""
+        arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+        directory = {}
+        offset = 0
+        for name, array in arrays.items():
+            directory[name] = [array.dtype.str, list(array.shape), offset]
+            offset += -(-array.nbytes // ALIGN) * ALIGN
+
+        version = self.version + 1
+        segment = _open(f'{self.channel}_{version}', create=True, size=max(offset, 1))
+        for name, array in arrays.items():
+            dtype, shape, start = directory[name]
+            np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf, offset=start)[...] = array
+
+        header = json.dumps({'version': version, 'publisher': self.token, 'segment': segment.name,
+                             'arrays': directory, 'meta': meta or {}}).encode()
+        if CONTROL.size + len(header) > CONTROL_SIZE:
+            _unlink(segment)
+            raise ValueError(f"Directory too large ({len(header)} bytes); put bulk data in arrays")
+
+        # Seqlock write: readers retry while the counter is odd
+        self.sequence += 1
+        CONTROL.pack_into(self.control.buf, 0, self.sequence, len(header))
+        self.control.buf[CONTROL.size:CONTROL.size + len(header)] = header
+        self.sequence += 1
+        CONTROL.pack_into(self.control.buf, 0, self.sequence, len(header))
+
+        self.version = version
+        self.segments.append(segment)
+        while len(self.segments) > KEEP_VERSIONS + 1:
+            _unlink(self.segments.pop(0))
+        return version
+
+    def close(self):
+        """Remove the channel and every segment still held"""
+        for segment in self.segments:
+            _unlink(segment)
+        self.segments = []
+        _unlink(self.control)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SharedArrayReader:
+    """
+    Attaches to a SharedArrayPublisher's channel.
+
+    poll() returns the arrays of a version not seen yet, as read-only
+    views straight into shared memory, or None when nothing changed, so a
+    renderer can skip redraws for free. `meta` holds the version's meta.
+    """
+
+    def __init__(self, channel=DEFAULT_CHANNEL):
+        self.channel = channel
+        self.control = None
+        self.segment = None
+        self.version = 0
+        self.publisher = None
+        self.meta = {}
+        self.arrays = {}
+        # Segments replaced while views into them were still held
+        self._retired = []
+
+    def _read_directory(self):
+        if self.control is None:
+            try:
+                self.control = _open(self.channel)
+            except FileNotFoundError:
+                return None
+        buf = self.control.buf
+        for _ in range(ATTACH_RETRIES):
+            sequence, length = CONTROL.unpack_from(buf, 0)
+            if sequence % 2 == 0:
+                header = bytes(buf[CONTROL.size:CONTROL.size + length])
+                if CONTROL.unpack_from(buf, 0)[0] == sequence:
+                    return json.loads(header) if length else None
+            time.sleep(0.001)
+        return None
+
+    def poll(self):
+        """Dict of name -> array for a new version, or None if unchanged (or no publisher yet)"""
+        for _ in range(ATTACH_RETRIES):
+            directory = self._read_directory()
+            if directory is None or (directory['publisher'], directory['version']) == \
+                    (self.publisher, self.version):
+                return None
+            try:
+                segment = _open(directory['segment'])
+                break
+            except FileNotFoundError:
+                # Replaced (and unlinked) between reading the directory and attaching
+                continue
+        else:
+            return None
+
+        arrays = {}
+        for name, (dtype, shape, offset) in directory['arrays'].items():
+            # frombuffer holds an export on the segment, so it can't be
+            # unmapped (close() raises BufferError) while the view is alive
+            array = np.frombuffer(segment.buf, dtype=dtype, count=int(np.prod(shape)),
+                                  offset=offset).reshape(shape)
+            array.flags.writeable = False
+            arrays[name] = array
+
+        self._retire(self.segment)
+        self.segment = segment
+        self.version = directory['version']
+        self.publisher = directory['publisher']
+        self.meta = directory['meta']
+        self.arrays = arrays
+        return arrays
+
+    def _retire(self, segment):
+        if segment is not None:
+            self._retired.append(segment)
+        still_used = []
+        for old in self._retired:
+            try:
+                old.close()
+            except BufferError:
+                # The caller still holds views into it
+                still_used.append(old)
+        self._retired = still_used
+
+    def close(self):
+        self.arrays = {}
+        self._retire(self.segment)
+        self.segment = None
+        if self.control is not None:
+            self.control.close()
+            self.control = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Usage: python shared_arrays.py [channel]           -> follow a channel and print each new version
+#        python shared_arrays.py --bench [points]    -> publish/attach cost vs pickling
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--bench':
+        import pickle
+
+        points = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+        path = np.random.default_rng(0).integers(-10000, 10000, (points, 2), dtype=np.int32)
+        grid = np.zeros((2048, 2048), dtype=np.uint8)
+
+        started = time.perf_counter()
+        blob = pickle.dumps({'path': path, 'grid': grid}, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.loads(blob)
+        pickled = time.perf_counter() - started
+
+        with SharedArrayPublisher('shared_arrays_bench') as publisher, \
+                SharedArrayReader('shared_arrays_bench') as reader:
+            started = time.perf_counter()
+            publisher.publish(path=path, grid=grid)
+            published = time.perf_counter() - started
+            started = time.perf_counter()
+            arrays = reader.poll()
+            attached = time.perf_counter() - started
+            assert np.array_equal(arrays['path'], path)
+            unchanged = reader.poll() is None
+            del arrays
+        print(f"{points} points + 2048x2048 grid ({(path.nbytes + grid.nbytes) / 1e6:.1f} MB)")
+        print(f"  pickle round trip: {pickled * 1000:8.2f} ms")
+        print(f"  publish (one copy): {published * 1000:7.2f} ms")
+        print(f"  attach (zero-copy): {attached * 1000:7.2f} ms, unchanged poll skipped: {unchanged}")
+        sys.exit(0)
+
+    reader = SharedArrayReader(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CHANNEL)
+    print(f"Following '{reader.channel}' (Ctrl+C to stop)")
+    try:
+        while True:
+            arrays = reader.poll()
+            if arrays is not None:
+                shapes = ', '.join(f"{name} {array.dtype}{list(array.shape)}"
+                                   for name, array in arrays.items())
+                print(f"Version {reader.version}: {shapes} {reader.meta}")
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
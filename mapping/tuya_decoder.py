@@ -1,12 +1,50 @@
 import base64
+import os
 import struct
+import sys
 import json
 import zlib
 
+from map_export import export_npz
+from map_stream import detect_compression, decompress_payload, iter_points, DEFAULT_MAX_OUTPUT, DEFAULT_CHUNK_POINTS
+from path_simplify import simplify_path, format_report, DEFAULT_TOLERANCE_MM
+
+try:
+    from tracing import traced
+except ImportError:
+    # utils/ isn't on the path (only entry scripts put it there): run untraced
+    if os.environ.get('VACUUM_TRACE'):
+        print("⚠ VACUUM_TRACE is set but utils/tracing.py can't be imported; "
+              f"{__name__} runs untraced", file=sys.stderr)
+    def traced(name=None):
+        return lambda func: func
+
+
 class TuyaMapDecoder:
-    def __init__(self, base64_data):
+    def __init__(self, base64_data, tolerance_mm=DEFAULT_TOLERANCE_MM, max_output=DEFAULT_MAX_OUTPUT):
         self.data = base64.b64decode(base64_data)
         self.offset = 0
+        self.tolerance_mm = tolerance_mm
+        self.max_output = max_output
+    
+    @classmethod
+    def from_bytes(cls, data, **kwargs):
+        """Build a decoder over an already-decoded binary payload"""
+        decoder = cls('', **kwargs)
+        decoder.data = bytes(data)
+        return decoder
+    
+    @staticmethod
+    def iter_points(base64_source, chunk_points=DEFAULT_CHUNK_POINTS, max_output=DEFAULT_MAX_OUTPUT):
+        """
+        Raw path points as (chunk_points, 2) int32 arrays, decoded incrementally.
+
+        base64_source can be a string, a file object or an iterable of
+        pieces; compressed payloads are inflated on the fly. Unlike decode(),
+        nothing is simplified and no list of every point is built, so
+        memory stays at one chunk however large the map.
+        """
+        return iter_points(base64_source, chunk_points, max_output)
         
     def read_byte(self):
         val = self.data[self.offset]
@@ -28,6 +66,7 @@ class TuyaMapDecoder:
         self.offset += 4
         return val
     
+    @traced()
     def decode(self):
         print("="*60)
         print("TUYA MAP DECODER")
@@ -38,6 +77,24 @@ class TuyaMapDecoder:
             'hex_preview': self.data[:32].hex(),
         }
         
+        # Compressed maps are inflated in memory and parsed recursively
+        compression = detect_compression(self.data)
+        if compression:
+            result['type'] = 'compressed'
+            result['compression'] = compression
+            try:
+                decompressed = decompress_payload(self.data, compression, self.max_output)
+                result['decompressed_size'] = len(decompressed)
+                print(f"Compressed map ({compression}), decompressed to {len(decompressed)} bytes")
+                
+                inner = TuyaMapDecoder.from_bytes(decompressed, tolerance_mm=self.tolerance_mm,
+                                                  max_output=self.max_output)
+                result['payload'] = inner.decode()
+            except (ValueError, zlib.error) as e:
+                print(f"Decompression failed: {e}")
+                result['error'] = str(e)
+            return result
+        
         try:
             # Parse header
             magic = self.read_uint16()
@@ -60,22 +117,15 @@ class TuyaMapDecoder:
                     y = self.read_int16()
                     coords.append([x, y])
                 
-                result['coordinates'] = coords
-                result['point_count'] = len(coords)
                 print(f"Path with {len(coords)} points")
-            
-            # Pattern 2: Compressed map
-            elif magic == 0x1f8b:  # gzip magic
-                result['type'] = 'compressed'
-                try:
-                    decompressed = zlib.decompress(self.data)
-                    result['decompressed_size'] = len(decompressed)
-                    print(f"Compressed map, decompressed to {len(decompressed)} bytes")
-                    
-                    with open('map_decompressed.bin', 'wb') as f:
-                        f.write(decompressed)
-                except:
-                    print("Decompression failed")
+                
+                # Drop collinear points before export
+                simplified, report = simplify_path(coords, self.tolerance_mm)
+                result['coordinates'] = simplified.astype(int).tolist()
+                result['point_count'] = len(simplified)
+                result['raw_point_count'] = len(coords)
+                result['simplification'] = report
+                print(format_report(report))
             
             else:
                 result['type'] = 'unknown'
@@ -87,14 +137,19 @@ class TuyaMapDecoder:
         
         return result
 
-# Decode the actual data
-map_data_b64 = 'qgABFxeqAAMpAQAqqgBcGwUABAEWAzIDlQMyA5UB2AEWAdgABAW+ArAHIAKwByAAxAW+AMQABP4q/+UAQP/lAED+vf4q/r0ABP+1/KECivyhAor6Bf+1+gUABADk/vUBrv71Aa7+KgDk/iqQqgACEwATqgADFQEAFg=='
+if __name__ == "__main__":
+    # Decode the actual data
+    map_data_b64 = 'qgABFxeqAAMpAQAqqgBcGwUABAEWAzIDlQMyA5UB2AEWAdgABAW+ArAHIAKwByAAxAW+AMQABP4q/+UAQP/lAED+vf4q/r0ABP+1/KECivyhAor6Bf+1+gUABADk/vUBrv71Aa7+KgDk/iqQqgACEwATqgADFQEAFg=='
+
+    decoder = TuyaMapDecoder(map_data_b64)
+    result = decoder.decode()
 
-decoder = TuyaMapDecoder(map_data_b64)
-result = decoder.decode()
+    print("\n" + json.dumps(result, indent=2))
 
-print("\n" + json.dumps(result, indent=2))
+    with open('map_decoded.json', 'w') as f:
+        json.dump(result, f, indent=2)
+    print("\n✓ Saved to map_decoded.json")
 
-with open('map_decoded.json', 'w') as f:
-    json.dump(result, f, indent=2)
-print("\n✓ Saved to map_decoded.json")
\ No newline at end of file
+    # Columnar copy for analytics (load with map_export.load_columns)
+    metadata = {k: v for k, v in result.items() if k != 'coordinates'}
+    export_npz('map_decoded.npz', coordinates=result.get('coordinates'), metadata=metadata)
\ No newline at end of file
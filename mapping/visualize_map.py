@@ -1,7 +1,10 @@
 import base64
 import struct
 import matplotlib.pyplot as plt
-import numpy as np
+
+from bitmap_decoder import BitmapDecoder, write_png
+from coord_scan import CoordinateScanner
+from path_simplify import simplify_path, format_report, DEFAULT_TOLERANCE_MM
 
 map_data_b64 = 'qgABFxeqAAMpAQAqqgBcGwUABAEWAzIDlQMyA5UB2AEWAdgABAW+ArAHIAKwByAAxAW+AMQABP4q/+UAQP/lAED+vf4q/r0ABP+1/KECivyhAor6Bf+1+gUABADk/vUBrv71Aa7+KgDk/iqQqgACEwATqgADFQEAFg=='
 
@@ -11,30 +14,25 @@ print("Attempting to visualize map data...")
 
 # Method 1: Try as coordinate pairs (path)
 print("\n1. Parsing as path coordinates...")
-coords = []
-offset = 4  # Skip header
-
-while offset < len(decoded) - 3:
-    try:
-        x = struct.unpack('<h', decoded[offset:offset+2])[0]
-        y = struct.unpack('<h', decoded[offset+2:offset+4])[0]
-        
-        if -10000 < x < 10000 and -10000 < y < 10000:
-            coords.append((x, y))
-        offset += 2
-    except:
-        break
+# Only runs of plausible, continuous points; each run is its own shape
+runs = CoordinateScanner(decoded).runs()
+coords = [point for run in runs for point in run.points.tolist()]
 
-if coords:
-    print(f"Found {len(coords)} coordinates")
+if runs:
+    print(f"Found {len(coords)} coordinates in {len(runs)} runs")
     
-    # Plot the path
     plt.figure(figsize=(10, 10))
-    xs, ys = zip(*coords) if coords else ([], [])
-    plt.plot(xs, ys, 'b-', linewidth=1, label='Path')
-    plt.plot(xs[0], ys[0], 'go', markersize=10, label='Start')
-    if len(xs) > 1:
-        plt.plot(xs[-1], ys[-1], 'ro', markersize=10, label='End')
+    for index, run in enumerate(runs):
+        # Simplify before plotting; matplotlib doesn't need collinear points
+        simplified, report = simplify_path(run.points, DEFAULT_TOLERANCE_MM)
+        print(f"Run {index + 1}: {format_report(report)}")
+        
+        # Plot each run separately so no line joins unrelated shapes
+        xs, ys = simplified[:, 0], simplified[:, 1]
+        plt.plot(xs, ys, '-', linewidth=1, label=f'Run {index + 1}')
+        plt.plot(xs[0], ys[0], 'go', markersize=6)
+        if len(xs) > 1:
+            plt.plot(xs[-1], ys[-1], 'ro', markersize=6)
     
     plt.grid(True, alpha=0.3)
     plt.axis('equal')
@@ -48,30 +46,13 @@ if coords:
 
 # Method 2: Try as bitmap
 print("\n2. Trying bitmap interpretation...")
-# Skip possible header and try different sizes
-for header_size in [4, 8, 16]:
-    map_bytes = decoded[header_size:]
-    
-    # Try different dimensions
-    sizes = [
-        (50, 50), (100, 100), (128, 128), (200, 200),
-        (int(np.sqrt(len(map_bytes))), int(np.sqrt(len(map_bytes))))
-    ]
-    
-    for width, height in sizes:
-        if width * height <= len(map_bytes):
-            try:
-                img = np.frombuffer(map_bytes[:width*height], dtype=np.uint8)
-                img = img.reshape((height, width))
-                
-                plt.figure(figsize=(8, 8))
-                plt.imshow(img, cmap='gray')
-                plt.title(f'Map as {width}x{height} bitmap (header={header_size})')
-                plt.savefig(f'map_bitmap_{width}x{height}_h{header_size}.png')
-                print(f"  ✓ Saved map_bitmap_{width}x{height}_h{header_size}.png")
-                plt.close()
-            except:
-                pass
+# Score every header size x width at once and render only the winner
+grid, layout = BitmapDecoder(decoded).decode()
+if layout is not None:
+    print(f"  Best layout: {layout}")
+    write_png(grid, f'map_bitmap_{layout.width}x{layout.height}_h{layout.offset}.png')
+else:
+    print("  No plausible bitmap layout found")
 
 # Method 3: Analyze as structured data
 print("\n3. Analyzing structure...")
@@ -0,0 +1,165 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# Set to a file name to record spans, e.g. VACUUM_TRACE=trace.json
+TRACE_ENV = 'VACUUM_TRACE'
+# Rows in the slowest-stages report printed at exit
+REPORT_ROWS = 15
+
+_events = []
+_thread_names = {}
+_output = None
+_epoch = time.perf_counter()
+
+# Shared do-nothing context manager handed out while tracing is off
+_NO_SPAN = contextlib.nullcontext()
+
+
+def enabled():
+    return _output is not None
+
+
+def enable(filename):
+    """Start recording spans; the trace is written to filename at exit"""
+    global _output
+    if _output is None:
+        atexit.register(_write_at_exit)
+    _output = filename
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        thread = threading.current_thread()
+        tid = thread.native_id
+        if tid not in _thread_names:
+            _thread_names[tid] = thread.name
+        # list.append is atomic, so worker threads can record without a lock
+        _events.append((self.name, self.start, end - self.start, tid, self.args))
+        return False
+
+
+def span(name, **args):
+    """
+    Time a block: with span('decode_rooms', size=len(data)): ...
+
+    Returns a shared no-op context manager while tracing is off.
+    """
+    if _output is None:
+        return _NO_SPAN
+    return _Span(name, args or None)
+
+
+def traced(name=None):
+    """
+    Decorator version of span(); the span name defaults to Class.method.
+
+    Whether to record is checked on every call, so enable() also covers
+    functions decorated before it; while tracing is off a call costs one
+    extra check.
+    """
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _output is None:
+                return func(*args, **kwargs)
+            with _Span(label, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def chrome_trace():
+    """Recorded spans as a Chrome trace-event dict (open in Perfetto or chrome://tracing)"""
+    pid = os.getpid()
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+              for tid, name in _thread_names.items()]
+    for name, start, duration, tid, args in list(_events):
+        event = {'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                 'ts': round((start - _epoch) * 1e6, 3), 'dur': round(duration * 1e6, 3)}
+        if args:
+            event['args'] = {k: v if isinstance(v, (int, float, str, bool)) else str(v)
+                             for k, v in args.items()}
+        events.append(event)
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def export_chrome_trace(filename):
+    with open(filename, 'w') as f:
+        json.dump(chrome_trace(), f)
+    return filename
+
+
+def summarize():
+    """Per-stage totals, slowest (by total time) first"""
+    stages = {}
+    for name, _, duration, _, _ in list(_events):
+        stage = stages.setdefault(name, [])
+        stage.append(duration)
+
+    rows = []
+    for name, durations in stages.items():
+        durations.sort()
+        rows.append({
+            'name': name,
+            'count': len(durations),
+            'total_ms': sum(durations) * 1000,
+            'mean_ms': sum(durations) / len(durations) * 1000,
+            'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000,
+            'max_ms': durations[-1] * 1000,
+        })
+    rows.sort(key=lambda row: row['total_ms'], reverse=True)
+    return rows
+
+
+def report(rows=REPORT_ROWS):
+    """Text table of the slowest stages"""
+    lines = [f"{'stage':<40} {'count':>7} {'total ms':>10} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+    for row in summarize()[:rows]:
+        lines.append(f"{row['name'][:40]:<40} {row['count']:>7} {row['total_ms']:>10.1f} "
+                     f"{row['mean_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['max_ms']:>9.2f}")
+    return '\n'.join(lines)
+
+
+def _write_at_exit():
+    if not _events:
+        return
+    export_chrome_trace(_output)
+    print(f"\nTrace: {len(_events)} spans written to {_output}", file=sys.stderr)
+    print(report(), file=sys.stderr)
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
+
+
+# Usage: python tracing.py trace.json    -> slowest-stages report of a saved trace
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python tracing.py <trace.json>")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        trace = json.load(f)
+    for event in trace['traceEvents']:
+        if event.get('ph') == 'X':
+            _events.append((event['name'], event['ts'] / 1e6, event['dur'] / 1e6, event['tid'], None))
+    print(report())